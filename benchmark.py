@@ -0,0 +1,912 @@
+#!/usr/bin/python3
+"""
+==============================================================================
+ MASTER POWER SCRIPT - BENCHMARKS (Development Tool)
+==============================================================================
+ Context:   Run on a dev box or the Unraid server, never scheduled.
+ Usage:     python3 benchmark.py [name ...]      (no name = run all)
+            python3 benchmark.py --verify [name ...]   (correctness checks only, no timing)
+            python3 benchmark.py suite --save bench_baseline.json
+            python3 benchmark.py suite --check bench_baseline.json [--threshold 0.5]
+ Output:    Timings on stdout. Works in a temp dir, touches no live data.
+            The suite records one timing per case; --check fails (exit 1)
+            when a case is slower than baseline * (1 + threshold).
+            Baselines are machine specific, compare on the same box.
+==============================================================================
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import power_planner as planner
+import executor_15min as executor
+import fake_ckw_server
+
+# ==============================================================================
+# 1. HELPERS
+# ==============================================================================
+
+def best_of(func, repeat=5, number=20):
+    """Best average runtime (seconds) of func over several rounds."""
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number): func()
+        avg = (time.perf_counter() - t0) / number
+        if best is None or avg < best: best = avg
+    return best
+
+def quiet():
+    """Swallows the executor's log output while timing."""
+    return contextlib.redirect_stdout(io.StringIO())
+
+def get_zurich_tz():
+    try:
+        import zoneinfo
+        return zoneinfo.ZoneInfo("Europe/Zurich")
+    except Exception: return None
+
+def synthetic_ckw_payload(target_date, offset=None, seed=0, days=1, resolution_min=15):
+    """CKW shaped API answer for 'days' local days of slots. Without a fixed
+    offset the Europe/Zurich offsets are used (23 h / 25 h on DST days)."""
+    rnd = random.Random(seed)
+    tz = None if offset else get_zurich_tz()
+    start = datetime.datetime.combine(target_date, datetime.time())
+    end = start + datetime.timedelta(days=days)
+    if tz: # walk in UTC, label in local time
+        t = start.replace(tzinfo=tz).astimezone(datetime.timezone.utc)
+        end = end.replace(tzinfo=tz).astimezone(datetime.timezone.utc)
+    else: t = start
+    prices = []
+    while t < end:
+        if tz: stamp = t.astimezone(tz).isoformat()
+        else: stamp = t.strftime("%Y-%m-%dT%H:%M:%S") + (offset or "+01:00")
+        prices.append({
+            "start_timestamp": stamp,
+            "grid_usage": [{"value": round(rnd.uniform(0.01, 0.08), 5)}]
+        })
+        t += datetime.timedelta(minutes=resolution_min)
+    return {"prices": prices}
+
+def synthetic_fleet(count, seed=0):
+    """SCRIPTS_CONFIG shaped job list with groups, orders and profiles."""
+    rnd = random.Random(seed)
+    profiles = list(executor.TIME_PROFILES)
+    fleet = []
+    for i in range(count):
+        min_h = rnd.choice([4, 6, 12, 20, 24])
+        fleet.append({
+            "id": f"job_{i:03d}",
+            "command": "true",
+            "initial_runtime_min": rnd.choice([5, 15, 30, 60, 120, 360]),
+            "min_interval_hours": min_h,
+            "max_interval_hours": min_h + rnd.choice([4, 8, 24]),
+            "max_tier": rnd.randint(3, 20),
+            "profile_mode": rnd.choice(profiles),
+            "group": rnd.choice([None, None] + [f"grp_{g}" for g in range(max(1, count // 5))]),
+            "order": rnd.randint(1, 5)
+        })
+    return fleet
+
+def synthetic_state(fleet, now, seed=0):
+    """Executor state with last_run spread over the last two days."""
+    rnd = random.Random(seed)
+    state = {}
+    for job in fleet:
+        last = now - datetime.timedelta(minutes=rnd.randint(0, 48 * 60))
+        state[job['id']] = {"history": [], "avg_runtime_sec": job['initial_runtime_min'] * 60, "last_run": last.isoformat()}
+    return state
+
+def use_temp_storage(path):
+    """Points planner + executor at a scratch directory."""
+    planner.STORAGE_PATH = path
+    planner.FETCH_CACHE_DIR = os.path.join(path, "http_cache")
+    planner.PROVIDER_CACHE_DIR = os.path.join(path, "provider_cache")
+    planner.ARCHIVE_FILE = os.path.join(path, "price_archive.sqlite")
+    executor.PLANNER_PATH = path
+    executor.STATE_FILE = os.path.join(path, "executor_state_bench.json")
+    executor.TICK_CACHE_FILE = os.path.join(path, "executor_tick_cache.pickle")
+    executor.DECISION_TABLE_FILE = os.path.join(path, "executor_decision_table.json")
+    executor.RUN_DIR = os.path.join(path, "runs")
+    executor.USE_TICK_CACHE = False
+
+def write_plans(path, start_date, days, resolution_min=15):
+    """Writes JSON + binary plans like the planner's main() does."""
+    for i in range(days):
+        d = start_date + datetime.timedelta(days=i)
+        schedule = planner.process_schedule(synthetic_ckw_payload(d, seed=i, resolution_min=resolution_min), d)
+        with open(os.path.join(path, d.strftime(planner.FILENAME_FORMAT)), 'w') as f:
+            json.dump(schedule, f, indent=4)
+        planner.write_binary_timeline(schedule, os.path.join(path, d.strftime(planner.BINARY_FILENAME_FORMAT)))
+
+# ==============================================================================
+# 2. BENCHMARKS
+# ==============================================================================
+
+def bench_timeline_load():
+    """Binary vs JSON plan loading (3 days), incl. a round-trip equality check."""
+    today = datetime.date.today()
+    now = datetime.datetime.combine(today, datetime.time(12, 0))
+    with tempfile.TemporaryDirectory() as tmp:
+        use_temp_storage(tmp)
+        write_plans(tmp, today, 3)
+
+        def load_index():
+            entries = []
+            for d in executor.get_plan_dates(now):
+                plan = executor.load_day_plan(d)
+                if plan: entries.extend(plan['entries'])
+            return executor.build_price_index_from_entries(entries)
+
+        executor.USE_BINARY_TIMELINE = True
+        bin_index = load_index()
+        t_bin = best_of(load_index)
+        executor.USE_BINARY_TIMELINE = False
+        json_index = load_index()
+        t_json = best_of(load_index)
+        executor.USE_BINARY_TIMELINE = True
+
+        # Round trip: both paths must produce the same index
+        assert bin_index['epochs'] == json_index['epochs'], "epoch mismatch"
+        assert bin_index['offsets'] == json_index['offsets'], "offset mismatch"
+        assert bin_index['slots'] == json_index['slots'], "slot mismatch"
+        assert bin_index['scaled'] == json_index['scaled'], "price mismatch"
+
+    print(f"  slots:       {len(bin_index['epochs'])} (round trip OK)")
+    print(f"  json path:   {t_json * 1000:.3f} ms")
+    print(f"  binary path: {t_bin * 1000:.3f} ms  ({t_json / t_bin:.1f}x faster)")
+
+def bench_supervisor():
+    """Completion latency + wakeups of the SIGCHLD supervisor with dummy sleep jobs."""
+    durations = [0.2, 0.5, 0.8, 1.1]
+    jobs = [{"id": f"sleep_{d}", "command": f"sleep {d}", "group": None} for d in durations]
+    with tempfile.TemporaryDirectory() as tmp:
+        use_temp_storage(tmp)
+        executor.DRY_RUN = False
+        running = []
+        for job in jobs: executor.launch_job(job, running)
+        entries = list(running)
+        executor.SUPERVISOR_STATS.update(wakeups=0, child_events=0)
+        t0 = time.time()
+        executor.supervise(running, jobs)
+        elapsed = time.time() - t0
+        executor.DRY_RUN = True
+
+    # A child that exits before the supervisor waits (e.g. while other jobs are evaluated) must still
+    # wake it. Fresh interpreter: no SIGCHLD handler from the run above
+    with tempfile.TemporaryDirectory() as tmp:
+        code = (f"import sys, time; sys.path.insert(0, {os.path.dirname(os.path.abspath(__file__))!r}); "
+                f"import benchmark, executor_15min as e; benchmark.use_temp_storage({tmp!r}); e.DRY_RUN = False; "
+                f"early = []; e.launch_job({{'id': 'early', 'command': 'true', 'group': None}}, early); time.sleep(0.3); "
+                f"t0 = time.time(); woke = e.wait_for_child_event(3.0); print(woke, time.time() - t0)")
+        out = subprocess.run([sys.executable, "-c", code], stdout=subprocess.PIPE, check=True).stdout.decode().split()
+    woke, early_wait = out[-2] == "True", float(out[-1])
+    assert woke and early_wait < 0.1, f"early child exit missed (waited {early_wait:.2f}s)"
+
+    latencies = [p['finished_at'] - p['start'] - d for p, d in zip(entries, durations)]
+    print(f"  jobs:        {len(jobs)} (total {elapsed:.2f}s)")
+    print(f"  latency:     avg {sum(latencies) / len(latencies) * 1000:.1f} ms, max {max(latencies) * 1000:.1f} ms (incl. shell startup)")
+    print(f"  wakeups:     {executor.SUPERVISOR_STATS['wakeups']} (one per child exit + slot boundaries)")
+    print(f"  early exit:  woke after {early_wait * 1000:.1f} ms (child ended 300 ms before the wait)")
+    print(f"  1 s poll:    ~{int(elapsed) + 1} wakeups (one per second of runtime), ~500 ms avg latency")
+
+def bench_global_plan():
+    """Joint DP plan for 100+ jobs over a 48 h horizon."""
+    today = datetime.date.today()
+    now = datetime.datetime.combine(today, datetime.time(12, 0))
+    with tempfile.TemporaryDirectory() as tmp:
+        use_temp_storage(tmp)
+        write_plans(tmp, today, 3)
+        snapshot = executor.load_tick_snapshot(now)
+        for count in (10, 100, 250):
+            fleet = synthetic_fleet(count)
+            state = synthetic_state(fleet, now)
+            with quiet():
+                plan = executor.build_global_plan(fleet, state, snapshot)
+                t = best_of(lambda: executor.build_global_plan(fleet, state, snapshot), repeat=3, number=3)
+            planned = sum(1 for e in plan.values() if e['start'])
+            print(f"  {count:4d} jobs:   {t * 1000:8.1f} ms  ({planned} planned)")
+
+def bench_fetch():
+    """CKW fetch against the local fake server: latency, injected failures, cache."""
+    server, url = fake_ckw_server.start_server(latency=0.3, fail_first=1)
+    dates = [datetime.date.today(), datetime.date.today() + datetime.timedelta(days=1)]
+    planner.API_URL = url
+    planner.FETCH_BACKOFF_SEC = 0.05
+    with tempfile.TemporaryDirectory() as tmp, quiet():
+        use_temp_storage(tmp)
+        t0 = time.perf_counter()
+        for d in dates: planner.fetch_ckw_data(d)
+        t_seq = time.perf_counter() - t0
+
+        planner.FETCH_CACHE_DIR = os.path.join(tmp, "http_cache_2")
+        server.seen.clear()
+        t0 = time.perf_counter()
+        result = planner.fetch_price_days(dates)
+        t_conc = time.perf_counter() - t0
+
+        planner.FETCH_CACHE_FRESH_SEC, fresh = 0, planner.FETCH_CACHE_FRESH_SEC
+        t0 = time.perf_counter()
+        planner.fetch_price_days(dates)
+        t_revalidate = time.perf_counter() - t0
+        planner.FETCH_CACHE_FRESH_SEC = fresh
+        t0 = time.perf_counter()
+        planner.fetch_price_days(dates)
+        t_fresh = time.perf_counter() - t0
+    server.shutdown()
+
+    assert all(result.values()), "fetch failed"
+    print(f"  sequential (1 failure/date): {t_seq:.2f} s")
+    print(f"  concurrent (1 failure/date): {t_conc:.2f} s")
+    print(f"  rerun, ETag revalidation:    {t_revalidate:.2f} s")
+    print(f"  rerun, fresh cache:          {t_fresh * 1000:.1f} ms")
+    print(f"  server: {server.stats}")
+
+def write_feed_in_csv(fpath, start_date, days):
+    """Hourly feed-in tariff (Rp/kWh) as a local CSV drop, coarser than the 15 min grid prices."""
+    with open(fpath, 'w') as f:
+        f.write("start_timestamp;value\n")
+        for i in range(days):
+            d = start_date + datetime.timedelta(days=i)
+            for h in range(24): # same offset as the CKW request window
+                f.write(f"{d}T{h:02d}:00:00{planner.get_swiss_offset_str()};{6 + 4 * (10 <= h < 16):.2f}\n")
+
+def bench_providers():
+    """Composite price (grid + energy - feed-in): first fetch + parse vs. normalized cache hits, checked."""
+    server, url = fake_ckw_server.start_server(latency=0.05)
+    dates = [datetime.date.today(), datetime.date.today() + datetime.timedelta(days=1)]
+    saved = {name: getattr(planner, name) for name in ("API_URL", "PRICE_PROVIDERS", "PRICE_COMPONENTS", "FETCH_CACHE_FRESH_SEC")}
+    with tempfile.TemporaryDirectory() as tmp, quiet():
+        use_temp_storage(tmp)
+        write_feed_in_csv(os.path.join(tmp, "feed_in.csv"), dates[0], len(dates))
+        planner.API_URL = url
+        planner.PRICE_PROVIDERS = {
+            "ckw_grid": {"type": "ckw", "tariff_type": "grid_usage", "tariff_name": "home_dynamic"},
+            "ckw_energy": {"type": "ckw", "tariff_type": "electricity", "tariff_name": "home_dynamic"},
+            "feed_in": {"type": "file", "path": os.path.join(tmp, "feed_in.csv")},
+        }
+        planner.PRICE_COMPONENTS = [{"provider": "ckw_grid", "sign": 1}, {"provider": "ckw_energy", "sign": 1},
+                                    {"provider": "feed_in", "sign": -1}]
+        t0 = time.perf_counter()
+        first = planner.fetch_price_days(dates)
+        t_first = time.perf_counter() - t0
+        requests = server.stats['requests']
+        planner.FETCH_CACHE_FRESH_SEC = 0 # revalidate: 304 -> same hash -> no parse
+        t0 = time.perf_counter()
+        planner.fetch_price_days(dates)
+        t_revalidate = time.perf_counter() - t0
+        planner.FETCH_CACHE_FRESH_SEC = saved['FETCH_CACHE_FRESH_SEC']
+        planner.METRICS['counters'].clear()
+        t_cached = best_of(lambda: planner.fetch_price_days(dates), 3, 5)
+        hits = sum(v for (name, labels), v in planner.METRICS['counters'].items() if name == "provider_cache" and ("result", "hit") in labels)
+
+        # Check one slot by hand: grid + energy - feed-in of its hour
+        series = first[dates[0]]
+        grid = planner.get_provider_series("ckw_grid", dates[0])
+        energy = planner.get_provider_series("ckw_energy", dates[0])
+        i = len(series['epochs']) // 2
+        hour = datetime.datetime.fromisoformat(planner.format_slot_key(series['epochs'][i], series['offsets'][i])).hour
+        assert abs(series['values'][i] - (grid['values'][i] + energy['values'][i] - (6 + 4 * (10 <= hour < 16)))) < 1e-9, "composite"
+        schedule = planner.build_schedule(series, dates[0])
+        blocked = [slot['status'] == "BLOCKED" for slot in schedule['timeline'].values()]
+        assert blocked == [p > planner.HARD_CAP_RP for p in grid['values']], "hard cap not on the grid price" # HARD_CAP_COMPONENT
+    for name, value in saved.items(): setattr(planner, name, value)
+    server.shutdown()
+
+    print(f"  slots:            {len(series['epochs'])} per day, components {' '.join(series['components'])}")
+    print(f"  first run:        {t_first * 1000:8.1f} ms  ({requests} requests, {len(dates)} dates x 3 providers)")
+    print(f"  revalidated:      {t_revalidate * 1000:8.1f} ms  (304, nothing parsed again)")
+    print(f"  cached:           {t_cached * 1000:8.3f} ms  ({hits} normalized cache hits, no request)")
+    print(f"  plan:             {len(schedule['timeline'])} slots, composite OK, {sum(blocked)} blocked by the grid price")
+
+def legacy_update_runtime_stats(script_id, duration_sec):
+    """The old full read + rewrite per completion (reference for bench_state_store)."""
+    try: state = json.load(open(executor.STATE_FILE))
+    except: state = {}
+    executor.record_runtime_sample(state, script_id, duration_sec, datetime.datetime.now())
+    json.dump(state, open(executor.STATE_FILE, 'w'), indent=4)
+
+def state_store_worker(update, job_ids, count, path):
+    use_temp_storage(path)
+    with quiet():
+        for i in range(count): update(job_ids[i % len(job_ids)], 60 + i)
+
+def bench_state_store():
+    """Many simultaneous completions: journal store vs the old full rewrite (lost updates)."""
+    import multiprocessing
+    fleet = synthetic_fleet(100)
+    procs, per_proc = 8, 50
+    for name, update in (("legacy rewrite", legacy_update_runtime_stats), ("journal", executor.update_runtime_stats)):
+        with tempfile.TemporaryDirectory() as tmp:
+            use_temp_storage(tmp)
+            state = synthetic_state(fleet, datetime.datetime.now())
+            with open(executor.STATE_FILE, 'w') as f: json.dump(state, f)
+            executor._state_cache.update(key=None)
+            job_ids = [job['id'] for job in fleet]
+            workers = [multiprocessing.Process(target=state_store_worker, args=(update, job_ids[p::procs], per_proc, tmp))
+                       for p in range(procs)]
+            t0 = time.perf_counter()
+            for w in workers: w.start()
+            for w in workers: w.join()
+            elapsed = time.perf_counter() - t0
+            executor._state_cache.update(key=None)
+            try: final = executor.load_state()
+            except Exception: final = {}
+            recorded = sum(entry.get('runtime', {}).get('n', 0) for entry in final.values())
+        total = procs * per_proc
+        print(f"  {name:<15} {total / elapsed:8.0f} updates/s  ({procs} processes x {per_proc}, "
+              f"{recorded}/{total} recorded, {len(final)}/{len(fleet)} jobs left)")
+
+def find_dst_dates(year):
+    """(spring, autumn) DST transition dates of Europe/Zurich in 'year'."""
+    tz = get_zurich_tz()
+    found = []
+    d = datetime.date(year, 1, 1)
+    while tz and d.year == year:
+        a = datetime.datetime.combine(d, datetime.time()).replace(tzinfo=tz).utcoffset()
+        b = datetime.datetime.combine(d + datetime.timedelta(days=1), datetime.time()).replace(tzinfo=tz).utcoffset()
+        if a != b: found.append(d)
+        d += datetime.timedelta(days=1)
+    return found
+
+def bench_dst():
+    """DST days: the correctness checks of check_dst() + index build timing."""
+    days = check_dst()
+    if not days: return
+    with tempfile.TemporaryDirectory() as tmp:
+        use_temp_storage(tmp)
+        for d in days:
+            write_plans(tmp, d, 3)
+            now = datetime.datetime.combine(d, datetime.time())
+            entries = [e for d2 in executor.get_plan_dates(now) for e in executor.load_day_plan(d2)['entries']]
+            t = best_of(lambda: executor.build_price_index_from_entries(entries), 5, 20)
+            print(f"  {d}: index build {t * 1000:.3f} ms ({len(entries)} slots)")
+
+def bench_startup():
+    """Cold cron runs (subprocess wall time): full path vs. the fast path exit, all jobs in cooldown."""
+    now = executor.epoch_to_local(time.time())   # the subprocesses run on the real clock
+    fleet = [dict(job, profile_mode="IGNORE_TIME") for job in synthetic_fleet(100)]
+    last_run = executor.format_local_iso(now)
+    state = {job['id']: {"history": [], "avg_runtime_sec": job['initial_runtime_min'] * 60, "last_run": last_run} for job in fleet}
+    with tempfile.TemporaryDirectory() as tmp:
+        write_plans(tmp, now.date(), 3)
+        with open(os.path.join(tmp, "executor_state_dryrun.json"), 'w') as f: json.dump(state, f)
+        with open(os.path.join(tmp, "jobs.json"), 'w') as f: json.dump({"time_profiles": executor.TIME_PROFILES, "scripts": fleet}, f)
+        stamp = os.path.join(tmp, "next_action")
+        env = dict(os.environ, POWER_PLANNER_PATH=tmp, POWER_EXECUTOR_CONFIG=os.path.join(tmp, "jobs.json"),
+                   POWER_EXECUTOR_STAMP=stamp, POWER_EXECUTOR_LOCK=os.path.join(tmp, "executor.lock"))
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "executor_15min.py")
+        stub = os.path.join(os.path.dirname(script), "executor_cron.py")
+        run = lambda cmd: subprocess.run(cmd, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, check=True).stdout.decode()
+
+        def run_full():
+            if os.path.exists(stamp): os.remove(stamp)
+            run([sys.executable, script])
+        run_full()
+        assert "fast path" in run([sys.executable, script]), "fast path not taken"
+        assert "fast path" in run([sys.executable, "-S", stub]), "cron stub: fast path not taken"
+        os.remove(stamp)
+        assert "--- DONE ---" in run([sys.executable, "-S", stub]), "cron stub: full run failed" # slow path imports the executor
+        results = {"startup/python": best_of(lambda: run([sys.executable, "-S", "-c", "pass"]), 3, 5),
+                   "startup/full_path": best_of(run_full, 3, 3),
+                   "startup/fast_path": best_of(lambda: run([sys.executable, script]), 3, 5),
+                   "startup/cron_stub": best_of(lambda: run([sys.executable, "-S", stub]), 3, 5)}
+        import executor_cron
+        assert executor_cron.read_fast_path_stamp(stamp), "stamp not valid in-process"
+        results["startup/stamp_check"] = best_of(lambda: executor_cron.read_fast_path_stamp(stamp), 5, 100)
+    print(f"  python -S:       {results['startup/python'] * 1000:8.1f} ms  (interpreter startup, no site)")
+    print(f"  full path:       {results['startup/full_path'] * 1000:8.1f} ms  ({len(fleet)} jobs in cooldown)")
+    print(f"  fast path:       {results['startup/fast_path'] * 1000:8.1f} ms  (executor_15min.py: compiles the whole script)")
+    print(f"  cron stub:       {results['startup/cron_stub'] * 1000:8.1f} ms  "
+          f"(python3 -S executor_cron.py, +{(results['startup/cron_stub'] - results['startup/python']) * 1000:.1f} ms over the interpreter)")
+    print(f"  stamp check:     {results['startup/stamp_check'] * 1000:8.3f} ms  (the fast path's own work, in-process)")
+    return results
+
+def bench_disk_watch():
+    """Disk watcher against a real small filesystem: early trigger, one mover at a time, hysteresis."""
+    path = os.environ.get("POWER_DISK_TEST_PATH", "")
+    if not path:
+        print("  [SKIP] Set POWER_DISK_TEST_PATH to an empty small tmpfs/loopback mount")
+        print("         (e.g. mount -t tmpfs -o size=64m tmpfs /mnt/disktest).")
+        return
+    names = ("DISK_POOLS", "DISK_LEAD_TIME_SEC", "DISK_RELAUNCH_MIN_SEC", "DISK_WATCH_FILE", "DISK_SAMPLE_LOG", "DRY_RUN")
+    saved = {name: getattr(executor, name) for name in names}
+    fill_dir = os.path.join(path, "power_watch_test")
+    os.makedirs(fill_dir, exist_ok=True)
+    total = os.statvfs(path).f_blocks * os.statvfs(path).f_frsize
+    chunk = max(total // 40, 4096)
+    with tempfile.TemporaryDirectory() as tmp:
+        # The "mover" needs 1 s, then frees the pool
+        executor.DISK_POOLS = [{"id": "test", "path": path, "high_pct": 90, "low_pct": 30,
+                                "command": f"sleep 1; rm -f {fill_dir}/fill_*"}]
+        executor.DISK_LEAD_TIME_SEC = lead_sec = 1
+        executor.DISK_RELAUNCH_MIN_SEC = 0
+        executor.DISK_WATCH_FILE = os.path.join(tmp, "disk_watch.json")
+        executor.DRY_RUN = False
+        executor._disk_watch.update(pools=None, saved=0)
+        was_active, events, intervals, n = False, [], [], 0
+        t_end = time.time() + 10
+        with quiet():
+            while time.time() < t_end:
+                if not was_active and executor.read_disk_usage_pct(path) < 85:
+                    with open(os.path.join(fill_dir, f"fill_{n}"), 'wb') as f: f.write(b"\0" * chunk) # +2.5 % per 0.1 s
+                    n += 1
+                _, next_sample = executor.check_disk_pressure()
+                intervals.append(next_sample)
+                active = executor.load_disk_watch()["test"]["active"]
+                if active != was_active:
+                    events.append(("on" if active else "off", executor.read_disk_usage_pct(path)))
+                    was_active = active
+                    if not active: break
+                time.sleep(0.1)
+        launches = executor.METRICS['counters'].get(("emergency_runs", (("pool", "test"),)), 0)
+        for proc in executor._movers.values(): proc.wait()
+
+        # Cron: fast path runs (section 0) wake on the trend and leave their samples for the full run
+        import executor_cron
+        executor.DISK_LEAD_TIME_SEC = 1800
+        executor.DISK_SAMPLE_LOG = os.path.join(tmp, "stamp.disk")
+        executor._disk_watch.update(pools={}, saved=0)
+        stamp = os.path.join(tmp, "stamp")
+        with quiet(): executor.check_disk_pressure()
+        with open(stamp, 'w') as f: f.write("\n".join([f"{time.time() + 900}\tlater"] + executor.get_disk_wake_lines()) + "\n")
+        idle = [executor_cron.read_fast_path_stamp(stamp) for _ in range(3)]
+        with open(os.path.join(fill_dir, "fill_cron"), 'wb') as f: f.write(b"\0" * (chunk // 2)) # +1.25 %: below the wake margin
+        woke = executor_cron.read_fast_path_stamp(stamp) is None
+        with quiet(): executor._disk_watch.update(pools=None, saved=0); executor.check_disk_pressure()
+        cron_samples = len(executor.load_disk_watch()["test"]["samples"])
+    for name, value in saved.items(): setattr(executor, name, value)
+    executor._disk_watch.update(pools=None, saved=0)
+    executor.METRICS['counters'].clear()
+    for fname in os.listdir(fill_dir): os.remove(os.path.join(fill_dir, fname))
+    os.rmdir(fill_dir)
+
+    on = [pct for kind, pct in events if kind == "on"]
+    off = [pct for kind, pct in events if kind == "off"]
+    assert on and on[0] < 90, f"no early trigger before high water: {events}"
+    assert off and off[0] <= 30, f"emergency mode not left at low water: {events}"
+    assert launches == 1, f"{launches} movers started (expected one while it runs)"
+    assert idle == ["later"] * 3 and woke, f"cron fast path: idle {idle}, woke on the trend {woke}"
+    assert cron_samples == 5, f"{cron_samples} samples after the cron runs (expected 1 + 3 fast path + 1)"
+    print(f"  emergency on:  {on[0]:.1f}% used (predicted full within {lead_sec} s, high water 90%)")
+    print(f"  movers:        {launches} (not restarted while running)")
+    print(f"  emergency off: {off[0]:.1f}% used (low water 30%)")
+    print(f"  sampling:      {min(intervals):.0f}-{max(intervals):.0f} s (adaptive)")
+    print(f"  cron:          fast path woke on the trend below the wake margin, {cron_samples} samples kept")
+
+def bench_restart():
+    """Run registry: an executor is killed (SIGKILL) right after launching; a new one adopts the jobs."""
+    jobs = [{"id": "long_a", "command": "echo out-long_a; sleep 1.2", "group": "media"},
+            {"id": "long_b", "command": "echo out-long_b; sleep 0.6; exit 3", "group": None},
+            {"id": "quick", "command": "echo out-quick", "group": None}]
+    names = ("DRY_RUN", "JOB_LOG_MAX_BYTES")
+    saved = {name: getattr(executor, name) for name in names}
+    with tempfile.TemporaryDirectory() as tmp:
+        use_temp_storage(tmp)
+        # The first executor runs in its own process and dies without reaping anything
+        code = (f"import os, signal, sys; sys.path.insert(0, {os.path.dirname(os.path.abspath(__file__))!r}); "
+                f"import benchmark, executor_15min as e; benchmark.use_temp_storage({tmp!r}); e.DRY_RUN = False; "
+                f"running = []\nfor job in {jobs!r}: e.launch_job(job, running)\n"
+                f"os.kill(os.getpid(), signal.SIGKILL)")
+        subprocess.run([sys.executable, "-c", code], stdout=subprocess.DEVNULL)
+        time.sleep(0.3) # 'quick' ends while no executor runs
+        executor.DRY_RUN = False
+        running = []
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            executor.adopt_runs(running)
+            adopted = sorted(p['id'] for p in running)
+            busy = [p['group'] for p in running if p['group']]
+            executor.SUPERVISOR_STATS.update(wakeups=0, child_events=0)
+            executor.supervise(running, jobs)
+        state = executor.load_state()
+        logs = {job['id']: open(executor.get_run_file(job['id'], ".log")).read() for job in jobs}
+
+        # Rotation: a live log is copied + truncated, the job keeps appending
+        executor.JOB_LOG_MAX_BYTES = 1000
+        fpath = os.path.join(tmp, "runs", "rot.log")
+        with open(fpath, 'ab') as log:
+            proc = subprocess.Popen("for i in $(seq 200); do echo line-$i-padding-padding; done; sleep 0.2; echo tail",
+                                    shell=True, stdout=log)
+        time.sleep(0.1)
+        executor.rotate_job_log(fpath, live=True)
+        proc.wait()
+        rotated = [os.path.getsize(fpath)] + [os.path.getsize(f"{fpath}.{i}") for i in (1, 2) if os.path.exists(f"{fpath}.{i}")]
+        live_tail = open(fpath).read()
+        registry = executor.load_run_registry()
+    for name, value in saved.items(): setattr(executor, name, value)
+
+    assert adopted == ["long_a", "long_b"], f"adopted {adopted}"
+    assert busy == ["media"], "group exclusivity lost across the restart"
+    assert all(state.get(job['id'], {}).get('last_run') for job in jobs), "completions not recorded"
+    assert all(f"out-{job['id']}" in logs[job['id']] for job in jobs), "job output not in its log"
+    assert not registry, f"registry not emptied: {registry}"
+    assert "long_b finished" in out.getvalue() and "(exit status 3)" in out.getvalue(), "exit status not read"
+    assert live_tail.strip() == "tail" and len(rotated) == 2, f"live rotation: {rotated} {live_tail!r}"
+    print(f"  adopted:       {', '.join(adopted)} (quick ended meanwhile: recorded from its exit marker)")
+    print(f"  group:         'media' stays busy across the restart")
+    print(f"  supervisor:    {executor.SUPERVISOR_STATS['wakeups']} wakeups for 2 adopted jobs (pidfd exit events)")
+    print(f"  completions:   {len(state)}/{len(jobs)} recorded (runtime + last_run), registry empty")
+    print(f"  live rotation: {rotated[1]} bytes to .1, the job kept writing to the truncated log")
+
+def time_main_dry_run(fleet, now, repeat=5):
+    """Best time of one executor main() pass in dry run with a fresh state each time."""
+    state = synthetic_state(fleet, now)
+    executor.SCRIPTS_CONFIG = fleet
+    executor.OVERRIDE_NOW = now.strftime("%Y-%m-%d %H:%M")
+    best = None
+    for _ in range(repeat):
+        executor.save_state(json.loads(json.dumps(state)))
+        executor._state_cache.update(key=None)
+        with quiet():
+            t0 = time.perf_counter()
+            executor.main()
+            elapsed = time.perf_counter() - t0
+        if best is None or elapsed < best: best = elapsed
+    return best
+
+def calibration_workload():
+    """Fixed pure Python work; its timing scales the regression check to the box's current speed."""
+    rnd = random.Random(1)
+    data = [rnd.random() for _ in range(20000)]
+    index = {i: v for i, v in enumerate(sorted(data))}
+    return sum(index[i] for i in range(0, 20000, 7))
+
+def bench_suite():
+    """Scaling suite: planner parsing, timeline loading, window search, main() (recorded)."""
+    results = {"_calibration": best_of(calibration_workload, 7, 5)}
+    def record(case, seconds, note=""):
+        results[case] = seconds
+        print(f"  {case:<42} {seconds * 1000:10.3f} ms  {note}")
+
+    base = datetime.date(2026, 6, 1)
+    for res in (15, 5):
+        for days in (1, 7, 30):
+            payload = synthetic_ckw_payload(base, days=days, resolution_min=res)
+            record(f"process_schedule/{days}d/{res}min", best_of(lambda: planner.process_schedule(payload, base), 5, 3),
+                   f"({len(payload['prices'])} slots)")
+    for d in find_dst_dates(2026):
+        payload = synthetic_ckw_payload(d)
+        schedule = planner.process_schedule(payload, d)
+        kind = "spring" if d.month < 7 else "autumn"
+        record(f"process_schedule/dst_{kind}", best_of(lambda: planner.process_schedule(payload, d), 5, 10),
+               f"({len(schedule['timeline'])} slots, {d})")
+
+    now = datetime.datetime.combine(base, datetime.time(12, 0))
+    saved = {name: getattr(executor, name) for name in ("USE_BINARY_TIMELINE", "SCRIPTS_CONFIG", "OVERRIDE_NOW", "STATE_FSYNC", "LOCK_FILE_PATH",
+                                                  "TIME_PROFILES", "CONFIG_FILE", "CONFIG_CACHE_FILE")}
+    with tempfile.TemporaryDirectory() as tmp:
+        use_temp_storage(tmp)
+        executor.LOCK_FILE_PATH = os.path.join(tmp, "executor.lock")
+        for res in (15, 5):
+            res_dir = os.path.join(tmp, f"plans_{res}")
+            os.makedirs(res_dir)
+            write_plans(res_dir, base, 3, res)
+            executor.PLANNER_PATH = res_dir
+            timeline = executor.load_full_timeline(now) # JSON plans (already keyed), the binary ones feed the index
+            record(f"load_full_timeline/{res}min", best_of(lambda: executor.load_full_timeline(now), 5, 5), f"({len(timeline)} slots)")
+        executor.PLANNER_PATH = tmp
+        executor.USE_BINARY_TIMELINE = True
+
+        # Window search: old per-call scan vs the prefix-sum engine (20 starts, 2 h runtime)
+        for days in (1, 7, 30):
+            schedule = planner.process_schedule(synthetic_ckw_payload(base, days=days), base)
+            timeline = schedule['timeline']
+            index = executor.build_price_index(timeline)
+            starts = index['datetimes'][:20]
+            epochs = index['epochs'][:20]
+            record(f"get_avg_price_for_duration/{days}d",
+                   best_of(lambda: [executor.get_avg_price_for_duration(dt, 120, timeline) for dt in starts], 3, 1),
+                   f"(20 starts, {len(timeline)} slots)")
+            record(f"get_window_costs/{days}d", best_of(lambda: executor.get_window_costs(epochs, 120, index), 5, 20),
+                   f"(20 starts, {len(timeline)} slots)")
+
+        # Full executor pass in dry run (state fsync off: disk noise is not the subject here)
+        write_plans(tmp, base, 3)
+        executor.STATE_FSYNC = False
+        for count in (1, 10, 100, 500):
+            record(f"main_dry_run/{count}jobs", time_main_dry_run(synthetic_fleet(count), now))
+
+        # External job config: parse + validate + compile vs. an unchanged file (compiled cache)
+        executor.CONFIG_FILE = os.path.join(tmp, "jobs.json")
+        executor.CONFIG_CACHE_FILE = os.path.join(tmp, "executor_config_cache.pickle")
+        with open(executor.CONFIG_FILE, 'w') as f:
+            json.dump({"time_profiles": executor.TIME_PROFILES, "scripts": synthetic_fleet(500)}, f)
+        def load_config(cached):
+            executor._config_cache.clear()
+            if not cached and os.path.exists(executor.CONFIG_CACHE_FILE): os.remove(executor.CONFIG_CACHE_FILE)
+            executor.load_external_config()
+        with quiet():
+            cold, cached = best_of(lambda: load_config(False), 3, 3), best_of(lambda: load_config(True), 3, 10)
+        record("load_external_config/500jobs/validate", cold)
+        record("load_external_config/500jobs/cached", cached)
+        executor._config_cache.clear()
+    for name, value in saved.items(): setattr(executor, name, value)
+    return results
+
+BENCHMARKS = {
+    "timeline_load": bench_timeline_load,
+    "supervisor": bench_supervisor,
+    "global_plan": bench_global_plan,
+    "fetch": bench_fetch,
+    "providers": bench_providers,
+    "state_store": bench_state_store,
+    "dst": bench_dst,
+    "startup": bench_startup,
+    "disk_watch": bench_disk_watch,
+    "restart": bench_restart,
+    "suite": bench_suite,
+}
+
+# ==============================================================================
+# 2b. CORRECTNESS CHECKS (python3 benchmark.py --verify [name ...])
+# ==============================================================================
+# No timing, only asserts: the optimized paths against their references.
+
+def legacy_parse_iso_key(ts_str):
+    """parse_iso_key() before the UTC index (offset dropped). Frozen reference, do not change."""
+    try:
+        clean = ts_str.split('+')[0].replace('T', ' ')
+        if len(clean) == 16: clean += ":00"
+        return datetime.datetime.strptime(clean, "%Y-%m-%d %H:%M:%S")
+    except: return None
+
+def legacy_avg_price_for_duration(start_dt, duration_min, timeline):
+    """The original get_avg_price_for_duration() (naive local time, penalty 5 Rp). Frozen reference, do not change."""
+    total_price = 0
+    slots_count = 0
+    steps = int(math.ceil(duration_min / 15))
+    if steps < 1: steps = 1
+    for i in range(steps):
+        check_time = start_dt + datetime.timedelta(minutes=(i * 15))
+        found = False
+        for ts, data in timeline.items():
+            dt = legacy_parse_iso_key(ts)
+            if dt and abs((dt - check_time).total_seconds()) < 300: # 5 min tolerance
+                total_price += data['price_rp']
+                slots_count += 1
+                found = True
+                break
+        if not found:
+            total_price += 5.0 # Penalty/Average
+            slots_count += 1
+    return total_price / slots_count
+
+def corpus_timeline(start_date, hours, resolution_min, rnd, gap_rate=0.0, jitter=()):
+    """String keyed timeline (Europe/Zurich offsets): random prices, dropped slots, start jitter (sec)."""
+    tz = get_zurich_tz() or datetime.timezone(datetime.timedelta(hours=1))
+    t = datetime.datetime.combine(start_date, datetime.time()).replace(tzinfo=tz).timestamp()
+    epochs = []
+    for k in range(hours * 60 // resolution_min):
+        if rnd.random() >= gap_rate: epochs.append(t + k * resolution_min * 60 + (rnd.choice(jitter) if jitter else 0))
+    timeline = {}
+    for epoch in sorted(set(epochs)):
+        key = datetime.datetime.fromtimestamp(epoch, tz).isoformat()
+        timeline[key] = {"price_rp": round(rnd.uniform(0.5, 9.0), 4), "tier": 1, "status": "ALLOWED"}
+    return timeline
+
+def check_window_costs():
+    """get_window_costs() == the original get_avg_price_for_duration() on a corpus:
+    15/10/5 min data, gaps, unaligned starts, slots on the tolerance edges."""
+    saved = executor.MISSING_SLOT_PENALTY_RP
+    executor.MISSING_SLOT_PENALTY_RP = 5.0 # the original's penalty
+    rnd = random.Random(1)
+    d = datetime.date(2026, 6, 1) # no DST switch: the frozen original is exact here
+    tol = executor.MATCH_TOLERANCE_SEC
+    cases = [(res, gap, ()) for res in (15, 10, 5) for gap in (0.0, 0.2)]
+    cases += [(15, 0.1, (-tol, -tol + 1, 0, tol - 1, tol)), (15, 0.0, (-tol - 1, tol + 1))] # tolerance edges
+    compared = 0
+    for res, gap, jitter in cases:
+        timeline = corpus_timeline(d, 8, res, rnd, gap, jitter)
+        index = executor.build_price_index(timeline)
+        base = index['epochs'][0]
+        # Unaligned starts incl. exactly +-tolerance off the grid, before the first and past the last slot
+        starts = [base + k * 900 + off for k in range(-2, 8 * 4 + 2, 3) for off in (0, 1, tol - 1, tol, tol + 1, 450, 899)]
+        for duration in (1, 15, 16, 45, 120, 300):
+            fast = executor.get_window_costs(starts, duration, index)
+            for t, cost in zip(starts, fast):
+                local = executor.epoch_to_local(t)
+                expected = legacy_avg_price_for_duration(local, duration, timeline)
+                assert abs(cost - expected) < 1e-9, f"{res} min, gap {gap}, jitter {jitter}: {local} {duration} min {cost} != {expected}"
+                assert abs(executor.get_avg_price_for_duration(local, duration, timeline) - expected) < 1e-9, "reference drifted"
+                compared += 1
+    executor.MISSING_SLOT_PENALTY_RP = saved
+    print(f"  window costs:  {compared} windows match the original ({len(cases)} timelines: 15/10/5 min, gaps, tolerance edges)")
+
+def check_dst():
+    """DST days: distinct UTC slots, current-slot lookup, windows across the switch. -> checked dates."""
+    days = find_dst_dates(2026)
+    if not days:
+        print("  [SKIP] No tz database (zoneinfo) available.")
+        return []
+    saved = (executor.USE_BINARY_TIMELINE, executor.PLANNER_PATH)
+    with tempfile.TemporaryDirectory() as tmp:
+        use_temp_storage(tmp)
+        for d in days:
+            kind = "spring" if d.month < 7 else "autumn"
+            write_plans(tmp, d, 3)
+            now = datetime.datetime.combine(d, datetime.time())
+            indexes = []
+            for use_bin in (True, False):
+                executor.USE_BINARY_TIMELINE = use_bin
+                indexes.append(executor.load_tick_snapshot(now)['price_index'])
+            index = indexes[0]
+            assert index['epochs'] == indexes[1]['epochs'] and index['offsets'] == indexes[1]['offsets'], "bin/json mismatch"
+            assert len(set(index['epochs'])) == len(index['epochs']), "duplicate slots"
+            day_slots = [i for i, dt in enumerate(index['datetimes']) if dt.date() == d]
+            assert len(day_slots) == (92 if kind == "spring" else 100), f"{len(day_slots)} slots on {d}"
+            timeline = executor.load_full_timeline(now)
+            assert len([k for k in timeline if k.startswith(str(d))]) == len(day_slots), "timeline keys collide"
+
+            # Every slot of the day is found again from its local time (fold marks the repeated hour)
+            for i in day_slots:
+                local = executor.epoch_to_local(index['epochs'][i])
+                assert executor.build_snapshot(local, index, {})['current_idx'] == i, f"lookup failed at {local} (fold {local.fold})"
+
+            # A 2 h window from 01:00 local spans 8 real slots across the switch
+            start = executor.local_epoch(now.replace(hour=1))
+            first = executor.find_current_slot_index(index, start)
+            expected = sum(index['scaled'][first:first + 8]) / executor.PRICE_SCALE / 8
+            assert abs(executor.get_window_costs([start], 120, index)[0] - expected) < 1e-9, "window across the switch"
+
+            # Windows around the switch (unaligned starts too) == the string keyed reference
+            index = executor.build_price_index(timeline)
+            starts = [executor.local_epoch(now) + k * 300 + 7 * (k % 3) for k in range(60)]
+            for t, cost in zip(starts, executor.get_window_costs(starts, 90, index)):
+                reference = executor.get_avg_price_for_duration(executor.epoch_to_local(t), 90, timeline)
+                assert abs(cost - reference) < 1e-9, f"window at {executor.epoch_to_local(t)} differs from the reference"
+            print(f"  dst {kind} {d}: {len(day_slots)} slots, lookups + windows OK")
+    executor.USE_BINARY_TIMELINE, executor.PLANNER_PATH = saved
+    return days
+
+def check_forecast_fill():
+    """Windows running past the published horizon: the missing slots take the forecast of their
+    local weekday + quarter hour (hand computed with datetime), the published ones their price."""
+    rnd = random.Random(7)
+    d = datetime.date(2026, 6, 5) # Friday: windows run into Saturday
+    timeline = corpus_timeline(d, 24, 15, rnd)
+    index = executor.build_price_index(timeline)
+    forecast = [rnd.randint(1000, 90000) for _ in range(7 * executor.FORECAST_SLOTS_PER_DAY)]
+    index['forecast'] = forecast
+    tz = datetime.timezone(datetime.timedelta(minutes=index['offsets'][-1]))
+    prices = {round(t): index['scaled'][i] for i, t in enumerate(index['epochs'])}
+    last = index['epochs'][-1]
+    starts = [last + k * 900 + off for k in range(-12, 4) for off in (0, 1, 299, 300, 450)]
+    compared = 0
+    for duration in (15, 60, 240, 600):
+        steps = math.ceil(duration / 15)
+        for t, cost in zip(starts, executor.get_window_costs(starts, duration, index)):
+            total = 0
+            for k in range(steps):
+                step = t + k * 900
+                match = [p for e, p in prices.items() if abs(e - step) < executor.MATCH_TOLERANCE_SEC]
+                if match: total += match[0]
+                else:
+                    local = datetime.datetime.fromtimestamp(step, tz)
+                    total += forecast[local.weekday() * 96 + local.hour * 4 + local.minute // 15]
+            expected = total / executor.PRICE_SCALE / steps
+            assert abs(cost - expected) < 1e-9, f"window at {executor.epoch_to_local(t)}, {duration} min: {cost} != {expected}"
+            compared += 1
+    print(f"  forecast fill: {compared} windows past the horizon match the hand computed forecast sums")
+
+def check_decision_table():
+    """Decision table lookup == the full search, at slot starts and a few seconds into the slots."""
+    saved = executor.USE_DECISION_TABLE
+    fleet = synthetic_fleet(12, seed=3)
+    start = datetime.datetime(2026, 6, 1)
+    compared = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        use_temp_storage(tmp)
+        write_plans(tmp, start.date(), 2)
+        for seed in range(2):
+            state = synthetic_state(fleet, start + datetime.timedelta(days=1), seed=seed)
+            for k in range(2 * 96): # up to the last slot (no later candidate)
+                for sec in (0, 3):
+                    now = start + datetime.timedelta(minutes=15 * k, seconds=sec)
+                    for job in fleet:
+                        decisions = []
+                        for use_table in (True, False):
+                            executor.USE_DECISION_TABLE = use_table
+                            with quiet(): decisions.append(executor.check_optimization_logic(job, state, executor.load_tick_snapshot(now)))
+                        assert decisions[0] == decisions[1], f"{job['id']} at {now}: table {decisions[0]}, full search {decisions[1]}"
+                        compared += 1
+    executor.USE_DECISION_TABLE = saved
+    print(f"  decision table: {compared} ticks match the full search ({len(fleet)} jobs, 2 days, aligned + 3 s)")
+
+def check_naive_times():
+    """Source times without a UTC offset are local time: same slots, tiers and keys as the original planner."""
+    d = datetime.date(2026, 6, 1)
+    payload = synthetic_ckw_payload(d, offset="+02:00", seed=5)
+    naive = {"prices": [dict(item, start_timestamp=item['start_timestamp'][:-6]) for item in payload['prices']]}
+    with_offset, without = planner.process_schedule(payload, d), planner.process_schedule(naive, d)
+    assert without, "naive times dropped"
+    assert list(without['timeline']) == [item['start_timestamp'] for item in naive['prices']], "source spelling not kept"
+    assert list(without['timeline'].values()) == list(with_offset['timeline'].values()), "prices/tiers differ"
+    index = executor.build_price_index(without['timeline'])
+    assert index['epochs'] == executor.build_price_index(with_offset['timeline'])['epochs'], "naive keys not local time"
+    print(f"  naive times:   {len(without['timeline'])} slots, same plan as with +02:00")
+
+CHECKS = {
+    "window_costs": check_window_costs,
+    "dst": check_dst,
+    "forecast_fill": check_forecast_fill,
+    "decision_table": check_decision_table,
+    "naive_times": check_naive_times,
+}
+
+# ==============================================================================
+# 3. MAIN
+# ==============================================================================
+
+def check_regressions(results, baseline, threshold):
+    """Cases slower than baseline * (1 + threshold) -> [(case, base, now)].
+    Timings are first scaled by the calibration ratio (box busier/faster than at save time)."""
+    base_results = baseline.get('results', {})
+    scale = 1.0
+    if results.get('_calibration') and base_results.get('_calibration'):
+        scale = results['_calibration'] / base_results['_calibration']
+    slower = []
+    for case, seconds in sorted(results.items()):
+        base = base_results.get(case)
+        if case.startswith("_") or not base: continue
+        if seconds / scale > base * (1 + threshold): slower.append((case, base, seconds / scale))
+    return slower
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for planner and executor.")
+    parser.add_argument("names", nargs="*", help=f"Benchmarks to run (default: all): {', '.join(BENCHMARKS)}")
+    parser.add_argument("--save", help="Write recorded results as a JSON baseline")
+    parser.add_argument("--check", help="Compare recorded results against a JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.5, help="Allowed slowdown vs. baseline (0.5 = +50%%)")
+    parser.add_argument("--verify", action="store_true", help=f"Run the correctness checks instead: {', '.join(CHECKS)}")
+    args = parser.parse_args()
+
+    if args.verify:
+        for name in args.names or list(CHECKS):
+            if name not in CHECKS:
+                print(f"[ERROR] Unknown check '{name}'. Available: {', '.join(CHECKS)}")
+                sys.exit(1)
+            print(f"\n> {name}")
+            CHECKS[name]()
+        print("\n[OK] All checks passed.")
+        return
+
+    results = {}
+    for name in args.names or list(BENCHMARKS):
+        if name not in BENCHMARKS:
+            print(f"[ERROR] Unknown benchmark '{name}'. Available: {', '.join(BENCHMARKS)}")
+            sys.exit(1)
+        print(f"\n> {name}")
+        recorded = BENCHMARKS[name]()
+        if recorded: results.update(recorded)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({"created": datetime.datetime.now().isoformat(timespec='seconds'), "python": platform.python_version(),
+                       "machine": platform.node(), "results": results}, f, indent=2, sort_keys=True)
+        print(f"\n[INFO] Baseline with {len(results)} cases written to {args.save}")
+    if args.check:
+        try: baseline = json.load(open(args.check))
+        except Exception as e:
+            print(f"[ERROR] Could not read baseline: {e}")
+            sys.exit(1)
+        slower = check_regressions(results, baseline, args.threshold)
+        missing = sorted(set(baseline.get('results', {})) - set(results))
+        print(f"\n[CHECK] {len(results)} cases vs {args.check} (threshold +{args.threshold:.0%}, calibrated)")
+        for case, base, now in slower:
+            print(f"   [REGRESSION] {case}: {base * 1000:.3f} ms -> {now * 1000:.3f} ms ({now / base - 1:+.0%})")
+        if missing: print(f"   [WARN] Not measured: {', '.join(missing)}")
+        if slower: sys.exit(1)
+        print("   [OK] No regressions.")
+
+if __name__ == "__main__": main()
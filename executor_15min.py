@@ -2,35 +2,161 @@
 """
 ==============================================================================
  MASTER POWER SCRIPT - THE EXECUTOR (v9.0 - DURATION AWARE)
+==============================================================================
+ Modes:     One-Shot (default) via cron */15 * * * * (fast exit while idle, section 0;
+            the check lives in executor_cron.py, the cron entry that skips
+            compiling this script while idle)
+            Daemon (--daemon): long running, wakes only on decision events
+            --build-decision-table: run after the planner (see POST_PLAN_COMMAND)
 ==============================================================================
 """
 
+import os
+import sys
+import time
+
+# ==============================================================================
+# 0. FAST PATH (BEFORE THE HEAVY IMPORTS)
+# ==============================================================================
+# Most cron runs find every job in cooldown or a blocked hour. A full run
+# stores the earliest time any decision can change (cooldown end, deadline,
+# end of a blocked hour, next slot for waiting jobs, local midnight) plus
+# mtime/size of its inputs (this script, state, plans, forecast, config) and
+# a wake-up usage per disk pool (section 4c). Until then, and while no file
+# changed and no pool reached its wake-up usage or is filling fast enough to
+# be full within DISK_LEAD_TIME_SEC (trend since the last full run), a cron
+# run exits right here with only os/sys/time imported. It appends one disk
+# sample per pool to DISK_SAMPLE_LOG, so the next full run has a fill rate.
+# The check itself lives in executor_cron.py (the cron entry, which runs it
+# without compiling this script), so both entry points share one copy. This
+# script pasted alone (no executor_cron.py next to it) runs without fast path.
+
+USE_FAST_PATH = True
+try: from executor_cron import FAST_PATH_STAMP_FILE, get_file_key, read_fast_path_stamp
+except ImportError: USE_FAST_PATH, FAST_PATH_STAMP_FILE = False, None
+
+if __name__ == "__main__" and USE_FAST_PATH and not sys.argv[1:]:
+    _idle_until = read_fast_path_stamp()
+    if _idle_until:
+        print(f"--- EXECUTOR v9.0: nothing to do before {_idle_until} (fast path) ---")
+        sys.exit(0)
+
 import json
 import datetime
-import time
-import os
 import subprocess
-import sys
-import statistics
 import math
 import fcntl
+import bisect
+import pickle
+import struct
+import mmap
+import heapq
+import itertools
+import signal
+import threading
+import select
+import collections
+import contextlib
+import shutil
+import shlex
+import hashlib
+try: import tomllib     # Python 3.11+, only needed for TOML configs
+except ImportError: tomllib = None
 
 # ==============================================================================
 # 1. CONFIGURATION
 # ==============================================================================
 
 OVERRIDE_NOW = "" 
+SIMULATED_CLOCK = None          # Callable returning 'now' (set by simulator.py), wins over OVERRIDE_NOW
 DRY_RUN = True
-PLANNER_PATH = "/mnt/user/appdata/power_scheduler/"
-LOCK_FILE_PATH = "/tmp/power_executor.lock"
+PLANNER_PATH = os.environ.get("POWER_PLANNER_PATH", "/mnt/user/appdata/power_scheduler/")
+LOCK_FILE_PATH = os.environ.get("POWER_EXECUTOR_LOCK", "/tmp/power_executor.lock")
 
 if DRY_RUN: STATE_FILE = os.path.join(PLANNER_PATH, "executor_state_dryrun.json")
 else: STATE_FILE = os.path.join(PLANNER_PATH, "executor_state.json")
 
-# EMERGENCY
+# Read the planner's compact .bin timeline when present (JSON is the fallback)
+USE_BINARY_TIMELINE = True
+
+# PRICE FORECAST written by the planner: prices for slots past the published ones ("" = flat MISSING_SLOT_PENALTY_RP)
+FORECAST_FILE = os.path.join(PLANNER_PATH, "price_forecast.json")
+
+# TICK CACHE (parsed timeline, skipped while the planner files are unchanged)
+USE_TICK_CACHE = True
+TICK_CACHE_FILE = os.path.join(PLANNER_PATH, "executor_tick_cache.pickle")
+
+# STATE STORE (snapshot + append-only journal, see section 2a)
+STATE_JOURNAL_MAX_RECORDS = 200 # Fold the journal into a new snapshot after this many updates
+STATE_FSYNC = True              # fsync journal appends and snapshots (crash safe)
+
+# METRICS of the last run / daemon pass: node-exporter textfile and/or JSON lines ("" = off)
+METRICS_TEXTFILE = ""           # e.g. "/var/lib/node_exporter/textfile_collector/power_executor.prom"
+METRICS_JSON_LOG = ""           # e.g. os.path.join(PLANNER_PATH, "executor_metrics.jsonl")
+PROFILE_DUMP = os.environ.get("POWER_PROFILE", "")   # cProfile stats file (opt-in)
+
+# LOCAL TIME (profile hours, cooldowns, deadlines). The price index itself is keyed by UTC epochs.
+LOCAL_TIMEZONE = "Europe/Zurich"   # "" = system local time
+
+# START DECISION
+START_TOLERANCE_RP = 0.1        # Start now if avg cost is within this of the best future window
+
+# RUNTIME MODEL (streaming estimate per job: EWMA + P-square quantile sketches)
+RUNTIME_QUANTILES = (0.5, 0.9)  # Tracked per job (constant memory)
+RUNTIME_PLAN_QUANTILE = 0.9     # Windows are planned for this runtime quantile (None = EWMA mean)
+RUNTIME_EWMA_ALPHA = 0.2
+RUNTIME_BUCKETS = None          # Extra estimates per start context: None, "weekday", "hour" or "weekday_hour"
+RUNTIME_BUCKET_HOURS = 6        # Width of an "hour" bucket
+RUNTIME_BUCKET_MIN_SAMPLES = 5  # Below this a bucket falls back to the job-wide estimate
+
+# DECISION TABLE (precomputed start/wait per job and slot, rebuilt when plans/state change)
+USE_DECISION_TABLE = True
+DECISION_TABLE_FILE = os.path.join(PLANNER_PATH, "executor_decision_table.json")   # "" = keep in memory only
+
+# DAEMON MODE (--daemon)
+DAEMON_MAX_SLEEP_SEC = 900      # Safety net: wake at least every 15 min
+
+# GLOBAL PLAN (joint start plan for all jobs instead of greedy per-job decisions)
+USE_GLOBAL_PLAN = False
+GLOBAL_PLAN_HORIZON_HOURS = 48
+GLOBAL_PLAN_TIME_BUDGET_SEC = 0.5   # Groups not planned within budget fall back to greedy
+
+# ADMISSION CONTROL (parallel launches; jobs may declare "weights": {"cpu": .., "io": .., "watts": ..})
+USE_ADMISSION_CONTROL = True
+RESOURCE_BUDGET = {"cpu": 4.0, "io": 2.0, "watts": 600}     # Max. sum of the weights of our running jobs
+DEFAULT_JOB_WEIGHTS = {"cpu": 1.0, "io": 1.0, "watts": 100}
+LOAD_LIMITS = {"loadavg": 1.5, "cpu_psi": 50.0, "io_psi": 40.0, "disk_busy": 90.0}   # loadavg per CPU, others in %
+LOAD_DISK_DEVICE = ""           # e.g. "sdb" (/proc/diskstats name) for the disk busy signal, "" = off
+LOAD_SAMPLE_SEC = 0.2           # Disk busy sample length when there is no previous reading
+CHILD_NICE = None               # Niceness of launched jobs (job field "nice" overrides)
+CHILD_IONICE_CLASS = None       # 1=realtime 2=best-effort 3=idle (job fields "ionice_class" / "ionice_level")
+
+# EXTERNAL JOB CONFIG (JSON or TOML with "time_profiles" and "scripts", see section 2d; "" = the literals below)
+CONFIG_FILE = os.environ.get("POWER_EXECUTOR_CONFIG", "")
+CONFIG_CACHE_FILE = os.path.join(PLANNER_PATH, "executor_config_cache.pickle")
+
+# EMERGENCY (DISK PRESSURE WATCHER, see section 4c)
 DISK_PATH_CHECK = "/mnt/cache"
 DISK_FULL_THRESHOLD = 90
 EMERGENCY_COMMAND = ""
+DISK_POOLS = [                  # Emergency mode from high_pct (or predicted full) until usage <= low_pct
+    {"id": "cache", "path": DISK_PATH_CHECK, "high_pct": DISK_FULL_THRESHOLD, "low_pct": 80, "command": EMERGENCY_COMMAND},
+]
+DISK_LEAD_TIME_SEC = 1800       # Emergency mode early if the fill rate says full (100%) within this time
+DISK_TREND_WINDOW_SEC = 3600    # Samples used for the fill rate (least squares)
+DISK_SAMPLE_MIN_SEC = 10        # Adaptive sampling (daemon, supervisor): a quarter of the time
+DISK_SAMPLE_MAX_SEC = 300       # to the next threshold, clamped to this range
+DISK_RELAUNCH_MIN_SEC = 900     # Min. gap between two emergency commands of a pool (mover done, still above low water)
+DISK_WAKE_MARGIN_PCT = 2.0      # Cron fast path: full run once a pool grew by this much since the last one
+DISK_WATCH_FILE = os.path.join(PLANNER_PATH, "executor_disk_watch.json")
+DISK_SAMPLE_LOG = FAST_PATH_STAMP_FILE and FAST_PATH_STAMP_FILE + ".disk" # Cron fast path samples (tmpfs), merged by the next full run
+
+# RUN REGISTRY + JOB LOGS (launched jobs survive an executor restart, see section 4a)
+RUN_DIR = os.path.join(PLANNER_PATH, "runs")   # Registry, exit markers and per-job logs
+CAPTURE_JOB_OUTPUT = True       # Job stdout/stderr -> RUN_DIR/<id>.log (False = inherit the executor's stdout)
+JOB_LOG_MAX_BYTES = 5 * 1024 * 1024   # Rotate a job log above this size (checked at launch and on every wakeup)
+JOB_LOG_BACKUPS = 3             # Rotated logs kept per job (<id>.log.1 .. .N)
+ADOPTED_POLL_SEC = 60           # Exit check interval for adopted jobs when pidfd_open is unavailable
 
 # --- DYNAMIC TIME PROFILES ---
 TIME_PROFILES = {
@@ -74,43 +200,129 @@ def log_debug(msg):
     if DRY_RUN: print(f"[DEBUG] {msg}")
 
 def get_current_time():
+    if SIMULATED_CLOCK: return SIMULATED_CLOCK()
     if OVERRIDE_NOW:
         try: return datetime.datetime.strptime(OVERRIDE_NOW, "%Y-%m-%d %H:%M")
         except: pass
-    return datetime.datetime.now()
+    return epoch_to_local(time.time()) # fold is set inside the repeated autumn hour
+
+def update_runtime_stats(script_id, duration_sec, finished_at=None):
+    with metric_timer("phase", phase="state_update"), state_lock(fcntl.LOCK_EX):
+        state = read_state()
+        model = record_runtime_sample(state, script_id, duration_sec, finished_at or get_current_time())
+        append_state_journal(state, script_id)
+    if DRY_RUN: print(f"   [DRY-STATE] {script_id}: Stats updated.")
+    else:
+        p_text = ", ".join(f"P{int(float(q) * 100)}: {int(get_p2_value(sk) / 60)}m" for q, sk in model['quantiles'].items())
+        print(f"   [LEARN] {script_id}: Finished in {int(duration_sec/60)}m. New Avg: {int(model['ewma']/60)}m ({p_text}).")
+
+# ==============================================================================
+# 2a. STATE STORE (SNAPSHOT + WRITE-AHEAD JOURNAL)
+# ==============================================================================
+# STATE_FILE is a snapshot that is only ever replaced atomically (temp file,
+# fsync, rename). A job update appends its complete entry as one JSON line
+# to STATE_FILE.journal (fsync'd) instead of rewriting everything; loading
+# replays the journal over the snapshot, a torn last line from a crash is
+# ignored. Every STATE_JOURNAL_MAX_RECORDS updates the journal is folded
+# into a new snapshot. flock on STATE_FILE.lock serializes writers across
+# processes; readers keep the parsed state and only read new journal lines.
+
+_state_cache = {"key": None, "offset": 0, "records": 0, "state": {}}
+
+@contextlib.contextmanager
+def state_lock(mode):
+    try: f = open(STATE_FILE + ".lock", 'a')
+    except OSError: f = None # missing/read-only directory: unlocked, like before
+    try:
+        if f:
+            with metric_timer("lock_wait", lock="state"): fcntl.flock(f, mode)
+        yield
+    finally:
+        if f: f.close() # releases the lock
+
+def write_file_atomic(fpath, data):
+    tmp_path = f"{fpath}.tmp.{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        if STATE_FSYNC: os.fsync(f.fileno())
+    os.replace(tmp_path, fpath)
+    if STATE_FSYNC:
+        dir_fd = os.open(os.path.dirname(os.path.abspath(fpath)), os.O_RDONLY)
+        try: os.fsync(dir_fd)
+        finally: os.close(dir_fd)
+
+def get_state_snapshot_key():
+    try: st = os.stat(STATE_FILE)
+    except OSError: return (STATE_FILE, None)
+    return (STATE_FILE, st.st_ino, st.st_mtime_ns, st.st_size)
+
+def read_state():
+    """Snapshot + journal (caller holds the state lock). Incremental while the snapshot is unchanged."""
+    cache = _state_cache
+    key = get_state_snapshot_key()
+    if key != cache['key']:
+        state = {}
+        if key[1] is not None:
+            try:
+                with open(STATE_FILE) as f: state = json.load(f)
+            except Exception as e:
+                # Keep the broken file for inspection, the journal still has recent updates
+                print(f"   [ERROR] State file unreadable ({e}). Moved to {STATE_FILE}.corrupt")
+                try: os.replace(STATE_FILE, STATE_FILE + ".corrupt")
+                except OSError: pass
+                key = get_state_snapshot_key()
+        cache.update(key=key, offset=0, records=0, state=state)
+
+    try:
+        with open(STATE_FILE + ".journal", 'rb') as f:
+            f.seek(cache['offset'])
+            for line in f:
+                if not line.endswith(b"\n"): break # torn write (crash) -> ignored
+                cache['offset'] += len(line)
+                cache['records'] += 1
+                try: record = json.loads(line)
+                except ValueError: continue
+                cache['state'][record['id']] = record['entry']
+    except FileNotFoundError: pass
+    return cache['state']
 
 def load_state():
-    if os.path.exists(STATE_FILE):
-        try: return json.load(open(STATE_FILE))
-        except: return {}
-    return {}
+    with state_lock(fcntl.LOCK_SH): return read_state()
 
 def save_state(state):
-    try: json.dump(state, open(STATE_FILE, 'w'), indent=4)
-    except: pass
+    """Full checkpoint: new snapshot, empty journal."""
+    with state_lock(fcntl.LOCK_EX): write_state_snapshot(state)
 
-def update_runtime_stats(script_id, duration_sec):
-    state = load_state()
-    if script_id not in state: 
-        state[script_id] = {"history": [], "avg_runtime_sec": 0, "last_run": None}
-    history = state[script_id]["history"]
-    history.append(duration_sec)
-    if len(history) > 30: history = history[-30:]
-    avg_sec = statistics.mean(history) if history else duration_sec
-    state[script_id]["history"] = history
-    state[script_id]["avg_runtime_sec"] = round(avg_sec, 2)
-    state[script_id]["last_run"] = get_current_time().isoformat()
-    save_state(state)
-    if DRY_RUN: print(f"   [DRY-STATE] {script_id}: Stats updated.")
-    else: print(f"   [LEARN] {script_id}: Finished in {int(duration_sec/60)}m. New Avg: {int(avg_sec/60)}m.")
+def write_state_snapshot(state):
+    try:
+        write_file_atomic(STATE_FILE, json.dumps(state, indent=4).encode())
+        with open(STATE_FILE + ".journal", 'wb'): pass
+        _state_cache.update(key=get_state_snapshot_key(), offset=0, records=0, state=state)
+    except Exception as e: print(f"   [ERROR] State snapshot failed: {e}")
 
-def is_disk_full():
+def append_state_journal(state, script_id):
+    """Persists one job entry (caller holds the exclusive state lock)."""
+    line = json.dumps({"id": script_id, "entry": state[script_id]}).encode() + b"\n"
     try:
-        usage = os.statvfs(DISK_PATH_CHECK)
-        return ((1 - (usage.f_bavail / usage.f_blocks)) * 100) > DISK_FULL_THRESHOLD
-    except: return False
+        with open(STATE_FILE + ".journal", 'ab') as f:
+            if f.tell() > _state_cache['offset']: # a torn line from a crash: start a fresh line
+                f.write(b"\n")
+            f.write(line)
+            f.flush()
+            if STATE_FSYNC: os.fsync(f.fileno())
+            end = f.tell()
+    except Exception as e:
+        print(f"   [ERROR] State journal write failed: {e}")
+        return
+    _state_cache['offset'] = end
+    _state_cache['records'] += 1
+    if _state_cache['records'] >= STATE_JOURNAL_MAX_RECORDS: write_state_snapshot(state)
 
-def get_day_type(now):
+def get_day_type(now, snapshot=None):
+    if snapshot:
+        day_type = snapshot['day_types'].get(now.date().isoformat())
+        if day_type: return day_type
     fpath = os.path.join(PLANNER_PATH, f"{now.strftime('%Y-%m-%d')}.json")
     if os.path.exists(fpath):
         try:
@@ -119,153 +331,755 @@ def get_day_type(now):
         except: pass
     return 'STANDARD'
 
-def check_profile_blocker(script_conf, now):
-    mode_name = script_conf.get("profile_mode", "IGNORE_TIME")
-    day_type = get_day_type(now)
-    profile_def = TIME_PROFILES.get(mode_name)
-    if not profile_def: return False
-    blocked_hours = profile_def.get(day_type, [])
-    if now.hour in blocked_hours:
-        log_debug(f"Profile '{mode_name}' blocks hour {now.hour} ({day_type}).")
+def is_hour_blocked(script_conf, now, snapshot=None):
+    masks = get_compiled_config()['masks'].get(script_conf.get("profile_mode", "IGNORE_TIME"))
+    if not masks: return False
+    return bool(masks.get(get_day_type(now, snapshot), 0) >> now.hour & 1)
+
+def check_profile_blocker(script_conf, now, snapshot=None):
+    if is_hour_blocked(script_conf, now, snapshot):
+        mode_name = script_conf.get("profile_mode", "IGNORE_TIME")
+        log_debug(f"Profile '{mode_name}' blocks hour {now.hour} ({get_day_type(now, snapshot)}).")
         return True
     return False
 
+# ==============================================================================
+# 2b. RUNTIME MODEL (STREAMING, CONSTANT MEMORY)
+# ==============================================================================
+# Per job: sample count, EWMA and one P-square sketch per quantile in
+# RUNTIME_QUANTILES (Jain & Chlamtac: 5 markers, no samples kept). With
+# RUNTIME_BUCKETS the same model is kept per start context as well. Every
+# completion is an O(1) update. Old state files (30 entry 'history' list) are
+# migrated by replaying the list once.
+
+def new_p2_sketch(p):
+    return {"p": p, "n": 0, "q": [], "pos": [1, 2, 3, 4, 5], "want": [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]}
+
+def add_p2_sample(sketch, x):
+    q, pos, want, p = sketch['q'], sketch['pos'], sketch['want'], sketch['p']
+    sketch['n'] += 1
+    if sketch['n'] <= 5: # warm-up: the first 5 samples are the markers
+        bisect.insort(q, x)
+        return
+    if x < q[0]: q[0], k = x, 0
+    elif x >= q[4]: q[4], k = x, 3
+    else: k = bisect.bisect_right(q, x) - 1
+    for i in range(k + 1, 5): pos[i] += 1
+    for i, dn in enumerate((0, p / 2, p, (1 + p) / 2, 1)): want[i] += dn
+
+    # Move the middle markers towards their desired positions (parabolic, else linear)
+    for i in (1, 2, 3):
+        d = want[i] - pos[i]
+        if (d >= 1 and pos[i + 1] - pos[i] > 1) or (d <= -1 and pos[i - 1] - pos[i] < -1):
+            d = 1 if d > 0 else -1
+            qp = q[i] + d / (pos[i + 1] - pos[i - 1]) * (
+                (pos[i] - pos[i - 1] + d) * (q[i + 1] - q[i]) / (pos[i + 1] - pos[i]) +
+                (pos[i + 1] - pos[i] - d) * (q[i] - q[i - 1]) / (pos[i] - pos[i - 1]))
+            if not q[i - 1] < qp < q[i + 1]: qp = q[i] + d * (q[i + d] - q[i]) / (pos[i + d] - pos[i])
+            q[i] = qp
+            pos[i] += d
+
+def get_p2_value(sketch):
+    q = sketch['q']
+    if not q: return None
+    if sketch['n'] > 5: return q[2]
+    return q[min(len(q) - 1, int(round(sketch['p'] * (len(q) - 1))))]
+
+def new_runtime_model():
+    return {"n": 0, "ewma": 0.0, "quantiles": {str(p): new_p2_sketch(p) for p in RUNTIME_QUANTILES}}
+
+def add_runtime_sample(model, duration_sec):
+    model['n'] += 1
+    if model['n'] == 1: model['ewma'] = float(duration_sec)
+    else: model['ewma'] += RUNTIME_EWMA_ALPHA * (duration_sec - model['ewma'])
+    for sketch in model['quantiles'].values(): add_p2_sample(sketch, duration_sec)
+
+def get_model_estimate_sec(model):
+    """Planned runtime of one model: the RUNTIME_PLAN_QUANTILE estimate (else the EWMA)."""
+    if not model or not model['n']: return None
+    sketch = model['quantiles'].get(str(RUNTIME_PLAN_QUANTILE)) if RUNTIME_PLAN_QUANTILE is not None else None
+    value = get_p2_value(sketch) if sketch else None
+    return value if value is not None else model['ewma']
+
+def get_runtime_bucket(start_dt):
+    if not RUNTIME_BUCKETS or start_dt is None: return None
+    hour = f"h{start_dt.hour // RUNTIME_BUCKET_HOURS * RUNTIME_BUCKET_HOURS:02d}"
+    return {"weekday": f"wd{start_dt.weekday()}", "hour": hour,
+            "weekday_hour": f"wd{start_dt.weekday()}_{hour}"}.get(RUNTIME_BUCKETS)
+
+def get_runtime_model(entry):
+    """The job's model; builds it from a legacy 'history' list once."""
+    if 'runtime' not in entry:
+        entry['runtime'] = new_runtime_model()
+        for duration_sec in entry.pop('history', None) or []: add_runtime_sample(entry['runtime'], duration_sec)
+    return entry['runtime']
+
+def record_runtime_sample(state, script_id, duration_sec, finished_at, started_at=None):
+    """O(1) update of the job's runtime model in 'state' (no I/O). Returns the job-wide model."""
+    if script_id not in state: 
+        state[script_id] = {"avg_runtime_sec": 0, "last_run": None}
+    entry = state[script_id]
+    model = get_runtime_model(entry)
+    add_runtime_sample(model, duration_sec)
+    bucket = get_runtime_bucket(started_at or epoch_to_local(local_epoch(finished_at) - duration_sec))
+    if bucket:
+        buckets = model.setdefault('buckets', {})
+        if bucket not in buckets: buckets[bucket] = new_runtime_model()
+        add_runtime_sample(buckets[bucket], duration_sec)
+    entry["avg_runtime_sec"] = round(model['ewma'], 2)
+    entry["last_run"] = format_local_iso(finished_at)
+    return model
+
+def get_last_run_epoch(entry):
+    """UTC epoch of the job's last finish, None if it never ran. Entries written
+    by older versions have no UTC offset and are read as local time."""
+    if not entry or not entry.get('last_run'): return None
+    return local_epoch(datetime.datetime.fromisoformat(entry['last_run']))
+
+def get_runtime_estimate_sec(entry, start_dt=None):
+    """Planned runtime (s) for a start at start_dt, None without any data."""
+    if not entry: return None
+    if 'runtime' not in entry and not entry.get('history'):
+        return entry.get('avg_runtime_sec') or None # state written by older versions
+    model = get_runtime_model(entry)
+    bucket = model.get('buckets', {}).get(get_runtime_bucket(start_dt))
+    if bucket and bucket['n'] >= RUNTIME_BUCKET_MIN_SAMPLES: return get_model_estimate_sec(bucket)
+    return get_model_estimate_sec(model)
+
+# ==============================================================================
+# 2c. METRICS (TEXTFILE / JSON LINE / CPROFILE)
+# ==============================================================================
+# Phase timers, counters and gauges, keyed by (name, labels). Reset after
+# every export, so each file/line describes one run (or one daemon pass):
+# timers are exported as power_executor_<name>_seconds, counters as
+# power_executor_<name>_per_run, both typed gauge (a per-run count that
+# repeats is not a Prometheus counter, rate() over it would be 0).
+# The same block lives in power_planner.py; keep both copies in sync.
+
+METRICS_PREFIX = "power_executor"
+METRICS = {"timers": {}, "counters": {}, "gauges": {}}
+_metrics_lock = threading.Lock() # the planner records from its fetch threads
+
+def metric_add(kind, name, value, labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _metrics_lock: METRICS[kind][key] = METRICS[kind].get(key, 0) + value
+
+@contextlib.contextmanager
+def metric_timer(name, **labels):
+    t0 = time.perf_counter()
+    try: yield
+    finally: metric_add("timers", name, time.perf_counter() - t0, labels)
+
+def metric_count(name, value=1, **labels): metric_add("counters", name, value, labels)
+
+def metric_gauge(name, value, **labels):
+    with _metrics_lock: METRICS["gauges"][(name, tuple(sorted(labels.items())))] = value
+
+def format_metric_name(name, labels):
+    escape = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return name + ("{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels) + "}" if labels else "")
+
+def write_metrics():
+    """Exports and resets the collected metrics (textfile atomically via rename, JSON appended)."""
+    metric_gauge("last_run_timestamp_seconds", round(time.time(), 3))
+    if METRICS_TEXTFILE:
+        lines, typed = [], set()
+        for kind, suffix, prom_type in (("timers", "_seconds", "gauge"), ("counters", "_per_run", "gauge"), ("gauges", "", "gauge")):
+            for (name, labels), value in sorted(METRICS[kind].items()):
+                full = f"{METRICS_PREFIX}_{name}{suffix}"
+                if full not in typed:
+                    typed.add(full)
+                    lines.append(f"# TYPE {full} {prom_type}")
+                lines.append(f"{format_metric_name(full, labels)} {round(value, 6)}")
+        try:
+            tmp_path = METRICS_TEXTFILE + ".tmp"
+            with open(tmp_path, 'w') as f: f.write("\n".join(lines) + "\n")
+            os.replace(tmp_path, METRICS_TEXTFILE)
+        except Exception as e: print(f"   [ERROR] Could not write metrics: {e}")
+    if METRICS_JSON_LOG:
+        record = {"ts": get_current_time().isoformat(timespec='seconds'), "script": METRICS_PREFIX}
+        for kind in ("timers", "counters", "gauges"):
+            record[kind] = {format_metric_name(name, labels): round(value, 6) for (name, labels), value in sorted(METRICS[kind].items())}
+        try:
+            with open(METRICS_JSON_LOG, 'a') as f: f.write(json.dumps(record) + "\n")
+        except Exception as e: print(f"   [ERROR] Could not write metrics log: {e}")
+    with _metrics_lock:
+        for kind in METRICS.values(): kind.clear()
+
+def run_profiled(func, *args):
+    """Runs func under cProfile when PROFILE_DUMP is set (view: python3 -m pstats FILE)."""
+    if not PROFILE_DUMP: return func(*args)
+    import cProfile
+    profiler = cProfile.Profile()
+    try: return profiler.runcall(func, *args)
+    finally:
+        profiler.dump_stats(PROFILE_DUMP)
+        print(f"[PROFILE] Stats written to {PROFILE_DUMP}")
+
+# ==============================================================================
+# 2d. EXTERNAL JOB CONFIG (VALIDATED, COMPILED, CACHED)
+# ==============================================================================
+# CONFIG_FILE replaces TIME_PROFILES / SCRIPTS_CONFIG. It is validated once and
+# compiled into 24-bit blocked-hour masks per profile and day type plus group
+# member lists (by "order") and successor lists. The compiled form is cached
+# per file (mtime/size, then content hash): unchanged configs skip parsing and
+# validation. An invalid config keeps the last valid one (or exits).
+
+JOB_FIELDS = {      # field: (types, required)
+    "id": (str, True), "command": (str, True),
+    "initial_runtime_min": ((int, float), True), "min_interval_hours": ((int, float), True),
+    "max_interval_hours": ((int, float), True), "max_tier": (int, True),
+    "profile_mode": (str, False), "group": ((str, type(None)), False), "order": ((int, float), False),
+    "weights": (dict, False), "after": (list, False),
+    "nice": (int, False), "ionice_class": (int, False), "ionice_level": (int, False)
+}
+
+_compiled = None
+_config_cache = {}
+_script_profiles = TIME_PROFILES    # in-script defaults for configs without 'time_profiles' (TIME_PROFILES is replaced)
+
+def compile_config(profiles, scripts):
+    """-> {'profiles', 'scripts', 'masks' {mode: {day_type: bits} | None}, 'groups' {group: [ids]}, 'successors'}."""
+    masks = {}
+    for mode, day_types in profiles.items():
+        bits = {day_type: sum(1 << h for h in set(hours)) for day_type, hours in day_types.items()}
+        masks[mode] = bits if any(bits.values()) else None
+    groups, successors = {}, {}
+    for job in sorted(scripts, key=lambda x: x.get('order', 99)):
+        if job.get('group'): groups.setdefault(job['group'], []).append(job['id'])
+        for p in job.get('after') or []: successors.setdefault(p, []).append(job['id'])
+    return {"profiles": profiles, "scripts": scripts, "masks": masks, "groups": groups, "successors": successors}
+
+def get_compiled_config():
+    """Compiled form of the active TIME_PROFILES / SCRIPTS_CONFIG (recompiled when they are replaced)."""
+    global _compiled
+    if _compiled is None or _compiled['profiles'] is not TIME_PROFILES or _compiled['scripts'] is not SCRIPTS_CONFIG:
+        _compiled = compile_config(TIME_PROFILES, SCRIPTS_CONFIG)
+    return _compiled
+
+def is_number(value, types):
+    return isinstance(value, types) and not isinstance(value, bool)
+
+def validate_config(data):
+    """-> (profiles, scripts, errors). Collects all problems instead of stopping at the first."""
+    errors = []
+    if not isinstance(data, dict): return None, None, ["top level must be a table/object"]
+    profiles = data.get("time_profiles", _script_profiles)
+    scripts = data.get("scripts")
+    if not isinstance(profiles, dict): errors.append("'time_profiles' must be a table/object"); profiles = {}
+    for mode, day_types in profiles.items():
+        if not isinstance(day_types, dict): errors.append(f"time_profiles.{mode}: must map day types to hour lists"); continue
+        for day_type, hours in day_types.items():
+            if not isinstance(hours, list) or not all(is_number(h, int) and 0 <= h <= 23 for h in hours):
+                errors.append(f"time_profiles.{mode}.{day_type}: must be a list of hours 0-23")
+    if not isinstance(scripts, list) or not scripts: return profiles, scripts, errors + ["'scripts' must be a non-empty list"]
+
+    seen = set()
+    for n, job in enumerate(scripts):
+        if not isinstance(job, dict): errors.append(f"scripts[{n}]: must be a table/object"); continue
+        name = f"scripts[{n}] ({job.get('id', '?')})"
+        for field, (types, required) in JOB_FIELDS.items():
+            if field not in job:
+                if required: errors.append(f"{name}: missing '{field}'")
+            elif not is_number(job[field], types): errors.append(f"{name}: '{field}' has the wrong type")
+        unknown = [f for f in job if f not in JOB_FIELDS and not f.startswith("sim_")]
+        if unknown: errors.append(f"{name}: unknown field(s) {', '.join(sorted(unknown))}")
+        if job.get('id') in seen: errors.append(f"{name}: duplicate id")
+        seen.add(job.get('id'))
+        if is_number(job.get('min_interval_hours'), (int, float)) and is_number(job.get('max_interval_hours'), (int, float)):
+            if job['max_interval_hours'] < job['min_interval_hours']: errors.append(f"{name}: max_interval_hours < min_interval_hours")
+        if job.get('profile_mode', "IGNORE_TIME") not in profiles: errors.append(f"{name}: unknown profile_mode '{job.get('profile_mode', 'IGNORE_TIME')}'")
+        if isinstance(job.get('after'), list) and not all(isinstance(p, str) for p in job['after']): errors.append(f"{name}: 'after' must list job ids")
+        if isinstance(job.get('weights'), dict) and not all(is_number(w, (int, float)) and w >= 0 for w in job['weights'].values()):
+            errors.append(f"{name}: 'weights' must be numbers >= 0")
+        if job.get('ionice_class', 2) not in (1, 2, 3): errors.append(f"{name}: 'ionice_class' must be 1, 2 or 3")
+        for field, low in (("initial_runtime_min", 0), ("min_interval_hours", 0), ("max_interval_hours", 0), ("max_tier", 0)):
+            if is_number(job.get(field), (int, float)) and job[field] <= low: errors.append(f"{name}: '{field}' must be > {low}")
+        if is_number(job.get('nice'), int) and not -20 <= job['nice'] <= 19: errors.append(f"{name}: 'nice' must be -20..19")
+        if is_number(job.get('ionice_level'), int) and not 0 <= job['ionice_level'] <= 7: errors.append(f"{name}: 'ionice_level' must be 0..7")
+
+    # Dependencies: known ids, no cycles (section 3f)
+    preds = {}
+    for n, job in enumerate(scripts):
+        if not isinstance(job, dict) or not isinstance(job.get('id'), str): continue
+        name = f"scripts[{n}] ({job['id']})"
+        after = [p for p in job.get('after') or [] if isinstance(p, str)] if isinstance(job.get('after'), list) else []
+        unknown = sorted(p for p in after if p not in seen)
+        if unknown: errors.append(f"{name}: 'after' names unknown job(s) {', '.join(unknown)}")
+        if job['id'] in after: errors.append(f"{name}: 'after' names the job itself")
+        preds[job['id']] = [p for p in after if p in seen and p != job['id']]
+    cyclic = topological_order(preds)[1]
+    if cyclic: errors.append(f"'after' forms a cycle through {', '.join(cyclic)}")
+    return profiles, scripts, errors
+
+def parse_config(raw, fpath):
+    if fpath.endswith(".toml"):
+        if tomllib is None: raise ValueError("TOML needs Python 3.11+ (tomllib)")
+        return tomllib.loads(raw.decode())
+    return json.loads(raw)
+
+def read_config_cache():
+    try:
+        with open(CONFIG_CACHE_FILE, 'rb') as f: return pickle.load(f)
+    except: return {}
+
+def apply_config(compiled):
+    global TIME_PROFILES, SCRIPTS_CONFIG, _compiled
+    TIME_PROFILES, SCRIPTS_CONFIG, _compiled = compiled['profiles'], compiled['scripts'], compiled
+    return compiled
+
+def load_external_config():
+    """Activates CONFIG_FILE (no-op without one). -> compiled config (same object while unchanged), None if unusable."""
+    if not CONFIG_FILE: return get_compiled_config()
+    if not _config_cache: _config_cache.update(read_config_cache())
+    if _config_cache.get('path') != CONFIG_FILE: _config_cache.clear()
+    errors = []
+    try:
+        st = os.stat(CONFIG_FILE)
+        # This script is part of the key: its TIME_PROFILES defaults and the compiled layout can change with it
+        script_st = os.stat(os.path.abspath(__file__))
+        script_key = f"{script_st.st_mtime_ns}:{script_st.st_size}"
+        stat_key = (st.st_mtime_ns, st.st_size, script_key)
+        if stat_key not in (_config_cache.get('stat_key'), _config_cache.get('failed_key')):
+            with open(CONFIG_FILE, 'rb') as f: raw = f.read()
+            digest = hashlib.sha256(script_key.encode() + b"\0" + raw).hexdigest()
+            if _config_cache.get('hash') != digest:
+                try: profiles, scripts, errors = validate_config(parse_config(raw, CONFIG_FILE))
+                except Exception as e: errors = [f"unreadable: {e}"]
+                if not errors:
+                    _config_cache.update(path=CONFIG_FILE, hash=digest, compiled=compile_config(profiles, scripts))
+                    print(f"[CONFIG] Loaded {len(scripts)} job(s) from {CONFIG_FILE}")
+            if errors: _config_cache['failed_key'] = stat_key # report once per version (daemon)
+            else:
+                _config_cache['stat_key'] = stat_key
+                try: write_file_atomic(CONFIG_CACHE_FILE, pickle.dumps(dict(_config_cache), protocol=pickle.HIGHEST_PROTOCOL))
+                except Exception as e: log_debug(f"Config cache not written: {e}")
+    except Exception as e: errors = [str(e)]
+    for e in errors: print(f"[CONFIG] {CONFIG_FILE}: {e}")
+    if 'compiled' not in _config_cache: return None
+    if errors: print("[CONFIG] Keeping the last valid config.")
+    return apply_config(_config_cache['compiled'])
+
 # ==============================================================================
 # 3. CORE LOGIC (DURATION AWARE)
 # ==============================================================================
 
+def get_plan_dates(current_time):
+    d = current_time.date()
+    return [d, d + datetime.timedelta(days=1), d + datetime.timedelta(days=2)]
+
+def get_plan_file(d):
+    return os.path.join(PLANNER_PATH, f"{d.strftime('%Y-%m-%d')}.json")
+
+def get_plan_bin_file(d):
+    return os.path.join(PLANNER_PATH, f"{d.strftime('%Y-%m-%d')}.bin")
+
+# Binary timeline layout (must match power_planner.py)
+BIN_MAGIC = b"PSTL"
+BIN_VERSION = 1
+BIN_HEADER_FMT = "<4sHHI16s"
+BIN_RECORD_FMT = "<qhdBB"
+BIN_STATUS_NAMES = {0: "ALLOWED", 1: "BLOCKED"}
+
+def read_binary_timeline(fpath):
+    """Reads a planner .bin file via mmap. No per-slot string parsing.
+    Returns (profile_mode, [(utc_epoch, offset_min, price_rp, tier, status_code), ...]) or None."""
+    try:
+        with open(fpath, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            header_size = struct.calcsize(BIN_HEADER_FMT)
+            rec_size = struct.calcsize(BIN_RECORD_FMT)
+            magic, version, file_rec_size, count, profile = struct.unpack_from(BIN_HEADER_FMT, mm, 0)
+            if magic != BIN_MAGIC or version != BIN_VERSION or file_rec_size != rec_size: return None
+            if len(mm) < header_size + count * rec_size: return None
+            records = list(struct.iter_unpack(BIN_RECORD_FMT, mm[header_size:header_size + count * rec_size]))
+        return profile.rstrip(b'\0').decode('ascii') or 'STANDARD', records
+    except: return None
+
+def entries_from_records(records):
+    """(utc_epoch, offset_min, price, tier, status_code) records -> timeline entries."""
+    entries = []
+    for utc_epoch, offset_min, price, tier, status in records:
+        entries.append((utc_epoch, EPOCH_NAIVE + datetime.timedelta(seconds=utc_epoch + offset_min * 60),
+                        {"price_rp": price, "tier": tier, "status": BIN_STATUS_NAMES.get(status, "BLOCKED")}, offset_min))
+    return entries
+
+def is_binary_plan_current(d):
+    """True if the .bin of a day exists and is not older than its JSON (a hand edited JSON wins)."""
+    try: bin_mtime = os.path.getmtime(get_plan_bin_file(d))
+    except OSError: return False
+    try: return bin_mtime >= os.path.getmtime(get_plan_file(d))
+    except OSError: return True
+
+def load_day_plan(d):
+    """Loads one plan day as {'day_type', 'entries': [(utc_epoch, local_dt, slot, offset_min), ...]}.
+    Prefers the .bin file unless the JSON is newer. None if nothing readable."""
+    json_path = get_plan_file(d)
+    if USE_BINARY_TIMELINE and is_binary_plan_current(d):
+        loaded = read_binary_timeline(get_plan_bin_file(d))
+        if loaded:
+            metric_count("plan_files_read", kind="bin")
+            day_type, records = loaded
+            return {"day_type": day_type, "entries": entries_from_records(records)}
+    if not os.path.exists(json_path): return None
+    try: data = json.load(open(json_path))
+    except: return None
+    metric_count("plan_files_read", kind="json")
+    return {
+        "day_type": data.get('metadata', {}).get('profile_mode', 'STANDARD'),
+        "entries": parse_timeline_entries(data.get('timeline', {}))
+    }
+
+def format_iso_key(utc_epoch, offset_min):
+    """Timeline key with its UTC offset (both passes of the repeated autumn hour stay distinct)."""
+    sign = '+' if offset_min >= 0 else '-'
+    dt = EPOCH_NAIVE + datetime.timedelta(seconds=utc_epoch + offset_min * 60)
+    return dt.strftime("%Y-%m-%dT%H:%M:%S") + f"{sign}{abs(offset_min) // 60:02d}:{abs(offset_min) % 60:02d}"
+
 def load_full_timeline(current_time):
+    """All plan days as one ISO-keyed timeline dict (keys keep their UTC offset).
+    Reads the JSON plans, which are already keyed; the binary plans feed the price
+    index (load_day_plan) and are used here only for a day without a readable JSON."""
     combined = {}
-    dates = [current_time.date(), current_time.date() + datetime.timedelta(days=1), current_time.date() + datetime.timedelta(days=2)]
-    for d in dates:
-        fpath = os.path.join(PLANNER_PATH, f"{d.strftime('%Y-%m-%d')}.json")
-        if os.path.exists(fpath):
-            try: combined.update(json.load(open(fpath)).get('timeline', {}))
-            except: continue
+    for d in get_plan_dates(current_time):
+        try:
+            with open(get_plan_file(d)) as f: combined.update(json.load(f).get('timeline', {}))
+            continue
+        except: pass
+        loaded = read_binary_timeline(get_plan_bin_file(d)) if USE_BINARY_TIMELINE and os.path.exists(get_plan_bin_file(d)) else None
+        for utc_epoch, offset_min, price, tier, status in (loaded[1] if loaded else ()):
+            combined[format_iso_key(utc_epoch, offset_min)] = {
+                "price_rp": price, "tier": tier, "status": BIN_STATUS_NAMES.get(status, "BLOCKED")}
     return combined
 
 def parse_iso_key(ts_str):
-    try:
-        clean = ts_str.split('+')[0].replace('T', ' ')
-        if len(clean) == 16: clean += ":00"
-        return datetime.datetime.strptime(clean, "%Y-%m-%d %H:%M:%S")
+    """ISO timeline key -> (utc_epoch, local_dt, offset_min), None if unreadable.
+    Keys without an offset are local time (LOCAL_TIMEZONE)."""
+    try: dt = datetime.datetime.fromisoformat(ts_str)
     except: return None
+    if dt.tzinfo is None:
+        utc_epoch = local_epoch(dt)
+        return utc_epoch, dt, int(round((wallclock_epoch(dt) - utc_epoch) / 60))
+    return dt.timestamp(), dt.replace(tzinfo=None), int(dt.utcoffset().total_seconds() // 60)
 
 def get_avg_price_for_duration(start_dt, duration_min, timeline):
-    """Calculates average price from start_dt over duration."""
+    """Calculates average price from start_dt (local time) over duration.
+    Reference implementation (scans the string keyed timeline per step, no forecast):
+    the hot path uses get_window_costs(), benchmark.py --verify compares the two."""
+    start_epoch = local_epoch(start_dt)
     total_price = 0
     slots_count = 0
-    
-    # We check every 15 min slot
+
+    # We check every 15 min slot (real time: a step across a DST switch is still 15 min)
     steps = int(math.ceil(duration_min / 15))
     if steps < 1: steps = 1
 
     for i in range(steps):
-        check_time = start_dt + datetime.timedelta(minutes=(i * 15))
-        # Find closest slot in timeline (exact match)
-        # Format matching the JSON keys
-        # Note: Timeline keys are ISO strings. We need to find the matching one.
-        # Efficient way: Assume timeline is dense or handle missing.
-        
-        # Simple lookup:
-        # We need to construct the key or iterate.
-        # Since exact ISO string matching is hard with seconds, we use the parsed timeline logic
-        # passed into this function would be inefficient to parse every time.
-        # -> Optimized: The timeline passed to this function should be a Dict of DT objects?
-        # No, for simplicity we iterate or fuzzy match.
-        
-        # Let's find the slot in the timeline dict
-        # Key format in timeline: "2024-05-20T13:00:00+02:00"
-        
+        check_epoch = start_epoch + i * SLOT_SEC
         found = False
         for ts, data in timeline.items():
-            dt = parse_iso_key(ts)
-            if dt and abs((dt - check_time).total_seconds()) < 300: # 5 min tolerance
+            parsed = parse_iso_key(ts)
+            if parsed and abs(parsed[0] - check_epoch) < MATCH_TOLERANCE_SEC: # 5 min tolerance
                 total_price += data['price_rp']
                 slots_count += 1
                 found = True
                 break
-        
+
         if not found:
-            # If we run out of data (e.g. tomorrow night), we assume a "neutral" price (e.g. 4 Rp)
-            # or the last known price. Let's take a penalty to prefer known data.
-            total_price += 5.0 # Penalty/Average
+            # No data (e.g. tomorrow night): penalty price to prefer known data
+            total_price += MISSING_SLOT_PENALTY_RP
             slots_count += 1
 
     return total_price / slots_count
 
-def check_optimization_logic(script_conf, state):
+# ==============================================================================
+# 3b. WINDOW COST ENGINE (PREFIX SUMS)
+# ==============================================================================
+# Every 15 min step is matched against the first slot within the 5 min
+# tolerance. Missing slots (past the published horizon, gaps) take the
+# planner's weekday x slot forecast, without one the flat penalty price. The timeline is parsed
+# ONCE into arrays sorted by UTC epoch and all candidate windows are answered
+# from one prefix-sum pass. UTC epochs keep both passes of the repeated autumn
+# hour apart and make windows across a DST switch as long as the job really
+# runs; 'datetimes' (local wall clock) are only used for profile hours/display.
+
+SLOT_SEC = 900
+MATCH_TOLERANCE_SEC = 300
+MISSING_SLOT_PENALTY_RP = 5.0
+PRICE_SCALE = 10000 # price_rp has 4 decimals -> exact integer sums (no float drift on ties)
+EPOCH_NAIVE = datetime.datetime(1970, 1, 1)
+
+try:
+    import zoneinfo
+    LOCAL_TZ = zoneinfo.ZoneInfo(LOCAL_TIMEZONE) if LOCAL_TIMEZONE else None
+except Exception: LOCAL_TZ = None # no tz database -> system local time
+
+def wallclock_epoch(dt):
+    """Seconds since 1970 on the naive wall clock (no timezone applied)."""
+    return (dt - EPOCH_NAIVE).total_seconds()
+
+def local_epoch(dt):
+    """UTC epoch of a local time. Naive times are LOCAL_TIMEZONE; fold=1 selects
+    the second pass of the repeated autumn hour."""
+    if dt.tzinfo is None and LOCAL_TZ: dt = dt.replace(tzinfo=LOCAL_TZ)
+    return dt.timestamp()
+
+def epoch_to_local(epoch):
+    """Naive local time of a UTC epoch (fold kept, so local_epoch() round-trips)."""
+    return datetime.datetime.fromtimestamp(epoch, LOCAL_TZ).replace(tzinfo=None)
+
+def format_local_iso(dt):
+    """ISO string of a local time with its UTC offset."""
+    return datetime.datetime.fromtimestamp(local_epoch(dt), LOCAL_TZ).astimezone(LOCAL_TZ).isoformat()
+
+def parse_timeline_entries(timeline):
+    """ISO-keyed timeline dict -> [(utc_epoch, local_dt, slot, offset_min), ...] (keys parsed once)."""
+    entries = []
+    for ts, data in timeline.items():
+        parsed = parse_iso_key(ts)
+        if parsed: entries.append((parsed[0], parsed[1], data, parsed[2]))
+    return entries
+
+def build_price_index(timeline):
+    """Parses the timeline once into arrays sorted by UTC epoch."""
+    return build_price_index_from_entries(parse_timeline_entries(timeline))
+
+def build_price_index_from_entries(entries):
+    entries = sorted(entries, key=lambda e: e[0]) # stable: keeps dict order for duplicate keys
+    return {
+        "epochs": [e[0] for e in entries],
+        "datetimes": [e[1] for e in entries],
+        "offsets": [e[3] for e in entries],
+        "slots": [e[2] for e in entries],
+        "scaled": [int(round(e[2]['price_rp'] * PRICE_SCALE)) for e in entries]
+    }
+
+FORECAST_SLOTS_PER_DAY = 96
+
+def load_forecast():
+    """Planner forecast as scaled prices [get_forecast_slot(local seconds)], None if unavailable."""
+    if not FORECAST_FILE or not os.path.exists(FORECAST_FILE): return None
+    try:
+        prices = json.load(open(FORECAST_FILE))['prices']
+        if len(prices) != 7 or any(len(day) != FORECAST_SLOTS_PER_DAY for day in prices): return None
+        return [int(round(p * PRICE_SCALE)) for day in prices for p in day]
+    except: return None
+
+def get_forecast_slot(local_sec):
+    """Forecast position (weekday * FORECAST_SLOTS_PER_DAY + 15 min slot of the day) of local
+    seconds since 1970; works on ints and numpy arrays (simulator)."""
+    return (local_sec // 86400 + 3) % 7 * FORECAST_SLOTS_PER_DAY + local_sec % 86400 // SLOT_SEC # 1970-01-01 = Thursday
+
+def get_forecast_value(forecast, utc_epoch, offset_min):
+    """Scaled forecast price of the slot at utc_epoch (local time via offset_min)."""
+    return forecast[get_forecast_slot(int(utc_epoch) + offset_min * 60)]
+
+def find_slot_index(price_index, epoch):
+    """Index of the first slot within the match tolerance of epoch, else None."""
+    epochs = price_index['epochs']
+    i = bisect.bisect_right(epochs, epoch - MATCH_TOLERANCE_SEC)
+    if i < len(epochs) and epochs[i] < epoch + MATCH_TOLERANCE_SEC: return i
+    return None
+
+def find_current_slot_index(price_index, epoch):
+    """Index of the first slot starting in [epoch, epoch + 15 min), else None."""
+    epochs = price_index['epochs']
+    i = bisect.bisect_left(epochs, epoch)
+    if i < len(epochs) and epochs[i] < epoch + SLOT_SEC: return i
+    return None
+
+def get_window_costs(start_epochs, duration_min, price_index):
+    """Average price (Rp/slot) for each start epoch over duration_min.
+    Starts are grouped by their phase on the 15 min grid; each group is walked
+    once against the sorted slots and answered via prefix sums."""
+    steps = int(math.ceil(duration_min / 15))
+    if steps < 1: steps = 1
+    epochs = price_index['epochs']
+    scaled = price_index['scaled']
+    n = len(epochs)
+    penalty = int(round(MISSING_SLOT_PENALTY_RP * PRICE_SCALE))
+    forecast = price_index.get('forecast') if n else None
+    offsets = price_index.get('offsets')
+    results = [None] * len(start_epochs)
+
+    phases = {}
+    for pos, t in enumerate(start_epochs):
+        phases.setdefault(t % SLOT_SEC, []).append(pos)
+
+    for positions in phases.values():
+        base = min(start_epochs[p] for p in positions)
+        span = int(round((max(start_epochs[p] for p in positions) - base) / SLOT_SEC))
+        grid_len = span + steps
+        prefix = [0] * (grid_len + 1)
+        i = bisect.bisect_right(epochs, base - MATCH_TOLERANCE_SEC)
+        for g in range(grid_len):
+            t = base + g * SLOT_SEC
+            while i < n and epochs[i] <= t - MATCH_TOLERANCE_SEC: i += 1
+            if i < n and epochs[i] < t + MATCH_TOLERANCE_SEC: val = scaled[i]
+            elif forecast: val = get_forecast_value(forecast, t, offsets[min(i, n - 1)]) # offset of the nearest later slot
+            else: val = penalty
+            prefix[g + 1] = prefix[g] + val
+        for pos in positions:
+            g = int(round((start_epochs[pos] - base) / SLOT_SEC))
+            results[pos] = (prefix[g + steps] - prefix[g]) / PRICE_SCALE / steps
+    return results
+
+# ==============================================================================
+# 3c. TICK SNAPSHOT (LOADED ONCE PER RUN, SHARED BY ALL JOBS)
+# ==============================================================================
+
+INDEX_VERSION = 3 # 2: UTC epochs, 3: tier check without later candidates. Cached indexes and decision tables of other versions are rebuilt
+
+def get_plan_files_key(dates):
+    """(file, mtime_ns, size) per plan file (+ forecast). Changes whenever the planner rewrites one."""
+    key = []
+    for fpath in [f(d) for d in dates for f in (get_plan_file, get_plan_bin_file)] + ([FORECAST_FILE] if FORECAST_FILE else []):
+        try:
+            st = os.stat(fpath)
+            key.append((fpath, st.st_mtime_ns, st.st_size))
+        except OSError: key.append((fpath, None, None))
+    return key
+
+def load_tick_cache(files_key):
+    if not USE_TICK_CACHE or not os.path.exists(TICK_CACHE_FILE): return None
+    try:
+        with open(TICK_CACHE_FILE, 'rb') as f: cached = pickle.load(f)
+        if cached.get('files_key') == files_key and cached.get('version') == INDEX_VERSION: return cached
+    except: pass
+    return None
+
+def save_tick_cache(cached):
+    if not USE_TICK_CACHE: return
+    tmp_path = TICK_CACHE_FILE + ".tmp"
+    try:
+        with open(tmp_path, 'wb') as f: pickle.dump(cached, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, TICK_CACHE_FILE)
+    except: pass
+
+def load_tick_snapshot(now):
+    """Reads the plan files ONCE: price index and profile_mode per date.
+    Served from the pickle cache while no plan file changed since the last run."""
+    dates = get_plan_dates(now)
+    files_key = get_plan_files_key(dates)
+    cached = load_tick_cache(files_key)
+    metric_count("tick_cache", result="hit" if cached else "miss")
+    if cached:
+        log_debug("Tick cache hit (plans unchanged).")
+    else:
+        entries = []
+        day_types = {}
+        for d in dates:
+            plan = load_day_plan(d)
+            day_types[d.strftime('%Y-%m-%d')] = plan['day_type'] if plan else 'STANDARD'
+            if plan: entries.extend(plan['entries'])
+        price_index = build_price_index_from_entries(entries)
+        price_index['forecast'] = load_forecast()
+        cached = {'version': INDEX_VERSION, 'files_key': files_key, 'day_types': day_types, 'price_index': price_index}
+        save_tick_cache(cached)
+    return build_snapshot(now, cached['price_index'], cached['day_types'], files_key)
+
+def build_snapshot(now, price_index, day_types, files_key=None):
+    """Tick snapshot from an already built price index (also used by simulator.py)."""
+    now_epoch = local_epoch(now)
+    return {
+        "files_key": files_key,
+        "now": now,
+        "now_epoch": now_epoch,
+        "day_types": day_types,
+        "price_index": price_index,
+        "current_idx": find_current_slot_index(price_index, now_epoch)
+    }
+
+def get_runtime_estimate_min(script_conf, state, start_dt=None):
+    runtime_min = script_conf['initial_runtime_min']
+    estimate_sec = get_runtime_estimate_sec(state.get(script_conf['id']), start_dt)
+    if estimate_sec and estimate_sec > 0:
+        runtime_min = int(estimate_sec / 60)
+        # Minimum sanity check: 5 min
+        if runtime_min < 5: runtime_min = 5
+    return runtime_min
+
+def check_optimization_logic(script_conf, state, snapshot=None):
     s_id = script_conf['id']
-    now = get_current_time()
+    if snapshot is None: snapshot = load_tick_snapshot(get_current_time())
+    now = snapshot['now']
+    chain = snapshot.get('chains', {}).get(s_id) # job with successors: the whole chain is fitted
+
+    # FAST PATH: precomputed decision for the current slot
+    if USE_DECISION_TABLE and not chain:
+        decision = lookup_decision(script_conf, state, snapshot)
+        if decision is not None: return decision
     
     # 0. PROFILE CHECK
-    if check_profile_blocker(script_conf, now):
+    if check_profile_blocker(script_conf, now, snapshot):
         return False
     
-    # 1. LOAD DATA
-    timeline = load_full_timeline(now)
-    if not timeline: return True 
+    # 1. LOAD DATA (from the tick snapshot)
+    price_index = snapshot['price_index']
+    if not price_index['epochs']: return True 
+    now_epoch = snapshot['now_epoch']
 
     # Find CURRENT status
-    current_slot = None
-    for ts, data in timeline.items():
-        dt = parse_iso_key(ts)
-        if dt and 0 <= (dt - now).total_seconds() < 900: 
-            current_slot = data; break
-    
-    if not current_slot: return True 
+    cur_idx = snapshot['current_idx']
+    if cur_idx is None: return True 
+    current_slot = price_index['slots'][cur_idx]
 
     # 2. DETERMINE ESTIMATED RUNTIME
-    runtime_min = script_conf['initial_runtime_min']
-    if s_id in state and state[s_id]['avg_runtime_sec'] > 0:
-        runtime_min = int(state[s_id]['avg_runtime_sec'] / 60)
-        # Minimum sanity check: 5 min
-        if runtime_min < 5: runtime_min = 5
-    
-    log_debug(f"Optimizing for runtime: {runtime_min} min")
+    if chain:
+        runtime_min = chain['runtime_min']
+        log_debug(f"Optimizing for chain runtime: {runtime_min} min ({' -> '.join(chain['path'])})")
+    else:
+        runtime_min = get_runtime_estimate_min(script_conf, state, now)
+        log_debug(f"Optimizing for runtime: {runtime_min} min")
 
-    # 3. CHECK DEADLINE
-    last_run = None
-    if s_id in state and state[s_id].get("last_run"):
-        last_run = datetime.datetime.fromisoformat(state[s_id]["last_run"])
+    # 3. CHECK DEADLINE (elapsed real time, also across a DST switch)
+    last_run = get_last_run_epoch(state.get(s_id))
     
     search_deadline = None
-    if not last_run:
+    if last_run is None:
         log_debug("First run. Scan Global.")
-        search_deadline = now + datetime.timedelta(hours=48)
+        search_deadline = now_epoch + 48 * 3600
     else:
-        mins_since = (now - last_run).total_seconds() / 60
+        mins_since = (now_epoch - last_run) / 60
         min_inter = script_conf['min_interval_hours'] * 60
         if mins_since < min_inter:
             log_debug(f"Cooldown active ({int(min_inter - mins_since)}m left).")
             return False
-        search_deadline = last_run + datetime.timedelta(hours=script_conf['max_interval_hours'])
-        if now >= search_deadline:
-            print("   [FORCE] Deadline exceeded!")
-            return True
+        search_deadline = last_run + script_conf['max_interval_hours'] * 3600
+    if chain and chain['latest_start'] is not None and chain['latest_start'] < search_deadline:
+        search_deadline = chain['latest_start'] # a downstream job's deadline comes first
+    if now_epoch >= search_deadline and (last_run is not None or chain):
+        print("   [FORCE] Deadline exceeded!")
+        return True
 
     # 4. FIND BEST WINDOW (Average Cost over Duration)
+    candidates = []
+    first = bisect.bisect_left(price_index['epochs'], now_epoch)
+    last = bisect.bisect_right(price_index['epochs'], search_deadline)
+    for idx in range(first, last):
+        # Only consider start times that are not blocked
+        if not check_profile_blocker(script_conf, price_index['datetimes'][idx], snapshot):
+            candidates.append(idx)
+
+    # All windows (current one first) in a single prefix-sum pass
+    metric_count("candidates_evaluated", len(candidates) + 1, job=s_id)
+    costs = get_window_costs([now_epoch] + [price_index['epochs'][i] for i in candidates], runtime_min, price_index)
+    current_avg_cost = costs[0]
+
     future_starts = []
-    
-    # Calculate current Avg Cost first
-    current_avg_cost = get_avg_price_for_duration(now, runtime_min, timeline)
-    
-    for ts, data in timeline.items():
-        dt = parse_iso_key(ts)
-        if dt and now <= dt <= search_deadline:
-            # Only consider start times that are not blocked
-            if not check_profile_blocker(script_conf, dt):
-                avg_cost = get_avg_price_for_duration(dt, runtime_min, timeline)
-                future_starts.append({'dt': dt, 'avg_cost': avg_cost, 'start_price': data['price_rp'], 'tier': data['tier']})
+    for idx, avg_cost in zip(candidates, costs[1:]):
+        data = price_index['slots'][idx]
+        future_starts.append({'dt': price_index['datetimes'][idx], 'avg_cost': avg_cost, 'start_price': data['price_rp'], 'tier': data['tier']})
 
     if not future_starts: return True
     
     best_option = min(future_starts, key=lambda x: x['avg_cost'])
+    metric_gauge("window_cost_rp", round(current_avg_cost, 4), job=s_id, window="now")
+    metric_gauge("window_cost_rp", round(best_option['avg_cost'], 4), job=s_id, window="best")
     
     log_debug(f"Compare: Now (Avg {current_avg_cost:.2f} Rp) vs Best Future ({best_option['dt'].strftime('%H:%M')} Avg {best_option['avg_cost']:.2f} Rp)")
     
     # Decision: Run if current avg cost is close enough to best possible avg cost
-    if current_avg_cost <= (best_option['avg_cost'] + 0.1):
+    if current_avg_cost <= (best_option['avg_cost'] + START_TOLERANCE_RP):
         if current_slot['tier'] > script_conf['max_tier']:
              log_debug(f"Best price, but Start-Tier {current_slot['tier']} too high.")
              return False
@@ -275,57 +1089,1093 @@ def check_optimization_logic(script_conf, state):
         print(f"   [WAIT] Better window at {best_option['dt'].strftime('%H:%M')} (Avg {best_option['avg_cost']:.2f} Rp).")
         return False
 
+# ==============================================================================
+# 3c2. DECISION TABLE (O(1) LOOKUP PER TICK)
+# ==============================================================================
+# Prices only change when the planner runs, so the result of
+# check_optimization_logic() for every future slot is computed once per job
+# (one window-cost pass + sliding minimum) and stored as a string with one
+# code per 15 min slot. A tick then is a single index lookup. The row is
+# rebuilt when the plans, the job config, its runtime estimate or last_run
+# change. Slots where cooldown or deadline end inside the slot, or that are
+# not on the 15 min grid, are '?' and use the full search.
+#
+# Codes: S=start  F=force (deadline)  W=wait  T=start tier too high
+#        B=profile blocked  C=cooldown  ?=full search
+
+DECISION_CODES_START = ("S", "F")
+
+def get_decision_key(script_conf, state, snapshot):
+    # The runtime is the estimate for a start 'now' (with RUNTIME_BUCKETS a new
+    # bucket with another estimate changes the key -> row rebuilt)
+    return {
+        "config": json.dumps(script_conf, sort_keys=True),
+        "profile": TIME_PROFILES.get(script_conf.get("profile_mode", "IGNORE_TIME")),
+        "runtime_min": get_runtime_estimate_min(script_conf, state, snapshot['now']),
+        "last_run": state.get(script_conf['id'], {}).get('last_run'),
+        "tolerance": START_TOLERANCE_RP
+    }
+
+def build_decision_row(script_conf, state, snapshot):
+    """Decision code for every slot from 'now' to the end of the known timeline."""
+    price_index = snapshot['price_index']
+    epochs, tiers = price_index['epochs'], [slot['tier'] for slot in price_index['slots']]
+    n = len(epochs)
+    if not n: return None
+    costs = get_window_costs(epochs, get_runtime_estimate_min(script_conf, state, snapshot['now']), price_index)
+    blocked = [is_hour_blocked(script_conf, dt, snapshot) for dt in price_index['datetimes']]
+
+    cooldown_end = deadline = None
+    last_run = get_last_run_epoch(state.get(script_conf['id']))
+    if last_run is not None:
+        cooldown_end = last_run + script_conf['min_interval_hours'] * 3600
+        deadline = last_run + script_conf['max_interval_hours'] * 3600
+
+    k0 = max(0, bisect.bisect_right(epochs, snapshot['now_epoch']) - 1)
+    start = epochs[k0]
+    row = ["?"] * (int((epochs[-1] - start) // SLOT_SEC) + 1)
+
+    window = collections.deque() # candidate indices with increasing cost (sliding minimum)
+    j = k0 + 1
+    for k in range(k0, n):
+        t = epochs[k]
+        g, rem = divmod(t - start, SLOT_SEC)
+        if rem or row[int(g)] != "?": continue # off-grid or duplicate slot -> full search
+
+        # Future candidates: later slots up to the search deadline, not profile blocked
+        end = deadline if deadline is not None else t + 48 * 3600
+        if j <= k: j = k + 1
+        while j < n and epochs[j] <= end:
+            if not blocked[j]:
+                while window and costs[window[-1]] >= costs[j]: window.pop()
+                window.append(j)
+            j += 1
+        while window and window[0] <= k: window.popleft()
+
+        if blocked[k]: code = "B"
+        elif cooldown_end is not None and t < cooldown_end: code = "C" if t + SLOT_SEC <= cooldown_end else "?"
+        elif deadline is not None and t >= deadline: code = "F"
+        elif deadline is not None and t + SLOT_SEC > deadline: code = "?"
+        elif not window:
+            # No later candidate: exactly at the slot start the live check still has slot k
+            # itself as a candidate (and checks its tier), a few seconds later it just starts
+            code = "?" if tiers[k] > script_conf['max_tier'] else "S"
+        elif costs[k] <= costs[window[0]] + START_TOLERANCE_RP:
+            # The live check reads the tier of the first slot starting at/after 'now'
+            # (slot k exactly at the boundary, slot k+1 a few seconds later)
+            too_high = [tiers[i] > script_conf['max_tier'] for i in (k, k + 1) if i < n]
+            if len(set(too_high)) > 1: code = "?"
+            else: code = "T" if too_high[0] else "S"
+        else: code = "W"
+        row[int(g)] = code
+    return {"start": start, "row": "".join(row)}
+
+def load_decision_table(snapshot):
+    files_key = json.loads(json.dumps(snapshot['files_key']))
+    if os.path.exists(DECISION_TABLE_FILE):
+        try:
+            table = json.load(open(DECISION_TABLE_FILE))
+            if table.get('files_key') == files_key and table.get('version') == INDEX_VERSION: return table
+        except: pass
+    return {"version": INDEX_VERSION, "files_key": files_key, "jobs": {}}
+
+def save_decision_table(table):
+    if not DECISION_TABLE_FILE: return True # in-memory only (simulator.py)
+    tmp_path = DECISION_TABLE_FILE + ".tmp"
+    try:
+        with open(tmp_path, 'w') as f: json.dump(table, f)
+        os.replace(tmp_path, DECISION_TABLE_FILE)
+        return True
+    except: return False
+
+def build_decision_table(jobs, state, snapshot):
+    """(Re)builds the rows of all given jobs. Used after the planner ran."""
+    table = load_decision_table(snapshot)
+    for job in jobs:
+        row = build_decision_row(job, state, snapshot)
+        if row: table['jobs'][job['id']] = dict(row, key=get_decision_key(job, state, snapshot))
+    snapshot['decision_table'] = table
+    return table if save_decision_table(table) else None
+
+def lookup_decision(script_conf, state, snapshot):
+    """True/False from the decision table, None if the full search is needed."""
+    if 'decision_table' not in snapshot: snapshot['decision_table'] = load_decision_table(snapshot)
+    table = snapshot['decision_table']
+    s_id = script_conf['id']
+    key = get_decision_key(script_conf, state, snapshot)
+    entry = table['jobs'].get(s_id)
+    if not entry or entry.get('key') != key:
+        row = build_decision_row(script_conf, state, snapshot)
+        if not row: return None
+        entry = table['jobs'][s_id] = dict(row, key=key)
+        save_decision_table(table)
+        metric_count("decision_table", result="rebuild")
+        log_debug(f"Decision table rebuilt for {s_id}.")
+
+    g, offset = divmod(snapshot['now_epoch'] - entry['start'], SLOT_SEC)
+    g = int(g)
+    # Rows hold the decision at the slot start (as seen by a cron tick); a 'now'
+    # further into the slot matches other slots -> full search
+    if offset >= MATCH_TOLERANCE_SEC or g < 0 or g >= len(entry['row']) or entry['row'][g] == "?":
+        metric_count("decision_table", result="full_search")
+        return None
+    code = entry['row'][g]
+    metric_count("decision_table", result="hit")
+    log_debug(f"Decision table: '{code}' (runtime {key['runtime_min']} min).")
+    if code == "F": print("   [FORCE] Deadline exceeded!")
+    elif code == "S": print(f"   [OPTIMAL] Starting now (decision table).")
+    elif code == "W": print(f"   [WAIT] Better window ahead (decision table).")
+    return code in DECISION_CODES_START
+
+# ==============================================================================
+# 3d. GLOBAL MULTI-JOB PLAN
+# ==============================================================================
+# Greedy decisions let two jobs of one group wait for the same cheap window,
+# the second one then overruns its deadline. The global plan places ALL jobs
+# at once: jobs of a group run one after another (overdue first, then by
+# 'order'), every job starts inside [cooldown end, deadline] on a free profile
+# hour with an allowed start tier, and the sum of (avg price x runtime) is
+# minimised per group by a DP over the start slots (O(jobs x slots)).
+
+def plan_group(seq, pos_epochs, free_from):
+    """DP over one group. seq: [(job_id, duration_sec, {pos: cost})] in run order.
+    Returns {job_id: pos} (jobs that cannot be fitted are left out)."""
+    layers = []
+    prev = None
+    for job_id, duration, options in seq:
+        layer = {}
+        if prev is None:
+            for p in sorted(options):
+                if pos_epochs[p] >= free_from: layer[p] = (options[p], None)
+        else:
+            prev_id, prev_duration, prev_layer = prev
+            prev_positions = sorted(prev_layer)
+            ptr, best = 0, None
+            for p in sorted(options):
+                # best predecessor that has finished before p starts
+                while ptr < len(prev_positions) and pos_epochs[prev_positions[ptr]] + prev_duration <= pos_epochs[p]:
+                    q = prev_positions[ptr]
+                    if best is None or prev_layer[q][0] < prev_layer[best][0]: best = q
+                    ptr += 1
+                if best is not None: layer[p] = (prev_layer[best][0] + options[p], best)
+        if not layer: continue # does not fit behind its predecessors -> left out
+        layers.append((job_id, layer))
+        prev = (job_id, duration, layer)
+
+    result = {}
+    if not layers: return result
+    job_id, layer = layers[-1]
+    pos = min(layer, key=lambda p: (layer[p][0], p))
+    for job_id, layer in reversed(layers):
+        result[job_id] = pos
+        pos = layer[pos][1]
+    return result
+
+def build_global_plan(jobs, state, snapshot, running_processes=None):
+    """Joint start plan -> {job_id: {'start': dt|None, 'avg_cost': float|None, 'reason': str}}.
+    Empty when there is no price data (callers fall back to the greedy logic)."""
+    t0 = time.time()
+    now, now_epoch = snapshot['now'], snapshot['now_epoch']
+    price_index = snapshot['price_index']
+    cur_idx = snapshot['current_idx']
+    if not price_index['epochs'] or cur_idx is None: return {}
+
+    # Start positions: 0 = now, then every slot start up to the horizon
+    horizon = now_epoch + GLOBAL_PLAN_HORIZON_HOURS * 3600
+    first = bisect.bisect_right(price_index['epochs'], now_epoch)
+    last = bisect.bisect_right(price_index['epochs'], horizon)
+    pos_epochs = [now_epoch] + price_index['epochs'][first:last]
+    pos_dts = [now] + price_index['datetimes'][first:last]
+    pos_tiers = [price_index['slots'][cur_idx]['tier']] + [slot['tier'] for slot in price_index['slots'][first:last]]
+
+    blocked_cache = {}   # profile_mode -> [blocked per position]
+    cost_cache = {}      # runtime_min -> [avg cost per position]
+    running = running_processes or []
+    running_ids = [p['id'] for p in running]
+    jobs_by_id = {job['id']: job for job in jobs}
+
+    # Groups stay busy until their running job is expected to finish
+    free_from = {}
+    for p in running:
+        if not p.get('group') or p['id'] not in jobs_by_id: continue
+        remaining = get_runtime_estimate_min(jobs_by_id[p['id']], state) * 60 - (time.time() - p['start'])
+        free_from[p['group']] = max(free_from.get(p['group'], now_epoch), now_epoch + max(remaining, 0))
+
+    plan = {}
+    groups = {}
+    for job in jobs:
+        s_id = job['id']
+        if s_id in running_ids: continue
+        runtime_min = get_runtime_estimate_min(job, state, now)
+        steps = max(1, int(math.ceil(runtime_min / 15)))
+
+        mode = job.get("profile_mode", "IGNORE_TIME")
+        if mode not in blocked_cache:
+            blocked_cache[mode] = [is_hour_blocked(job, dt, snapshot) for dt in pos_dts]
+        if runtime_min not in cost_cache:
+            cost_cache[runtime_min] = get_window_costs(pos_epochs, runtime_min, price_index)
+        blocked, costs = blocked_cache[mode], cost_cache[runtime_min]
+
+        last_run = get_last_run_epoch(state.get(s_id))
+        if last_run is not None:
+            earliest = last_run + job['min_interval_hours'] * 3600
+            deadline = last_run + job['max_interval_hours'] * 3600
+        else:
+            earliest, deadline = now_epoch, now_epoch + 48 * 3600 # First run: scan global
+        overdue = last_run is not None and now_epoch >= deadline
+
+        if overdue:
+            options = {} if blocked[0] else {0: costs[0] * steps}
+        else:
+            options = {p: costs[p] * steps for p, t in enumerate(pos_epochs)
+                       if earliest <= t <= deadline and not blocked[p] and pos_tiers[p] <= job['max_tier']}
+        plan[s_id] = {'start': None, 'avg_cost': None, 'reason': "no admissible start slot in horizon"}
+        if options:
+            key = job.get('group') or f"__job__{s_id}"
+            groups.setdefault(key, []).append(((not overdue, job.get('order', 99)), s_id, steps * SLOT_SEC, options))
+
+    for key, members in groups.items():
+        if time.time() - t0 > GLOBAL_PLAN_TIME_BUDGET_SEC:
+            for _, s_id, _, _ in members: plan.pop(s_id, None) # -> greedy fallback
+            continue
+        members.sort(key=lambda m: m[0])
+        placed = plan_group([(s_id, dur, opts) for _, s_id, dur, opts in members], pos_epochs, free_from.get(key, now_epoch))
+        for _, s_id, dur, opts in members:
+            if s_id in placed:
+                pos = placed[s_id]
+                plan[s_id] = {'start': pos_dts[pos], 'avg_cost': opts[pos] / (dur / SLOT_SEC), 'reason': "planned"}
+            else:
+                plan[s_id]['reason'] = "does not fit behind its group"
+
+    log_debug(f"Global plan for {len(plan)} jobs in {(time.time() - t0) * 1000:.1f} ms.")
+    return plan
+
+def follow_global_plan(job, entry, snapshot):
+    """Executor side: start exactly when the plan says 'now'."""
+    if entry['start'] is None:
+        print(f"   [PLAN] Not planned ({entry['reason']}).")
+        return False
+    if entry['start'] == snapshot['now']:
+        print(f"   [OPTIMAL] Plan says now. Est. Cost: {entry['avg_cost']:.2f} Rp/slot.")
+        return True
+    print(f"   [WAIT] Planned for {entry['start'].strftime('%Y-%m-%d %H:%M')} (Avg {entry['avg_cost']:.2f} Rp).")
+    return False
+
+# ==============================================================================
+# 3e. ADMISSION CONTROL (RESOURCE BUDGET + LIVE HOST LOAD)
+# ==============================================================================
+# Several I/O heavy jobs started together slow each other down and spill into
+# pricier slots. Jobs that decided to start are admitted by urgency (overdue
+# first, then by the Rp lost if they wait one more slot) while the weights of
+# our running jobs fit RESOURCE_BUDGET and the host is not already under
+# pressure on a resource the job uses. Queued jobs are re-checked on the next
+# completion or tick. Overdue jobs are always admitted; a job that exceeds the
+# budget on its own is admitted when nothing else of ours runs.
+
+ADMISSION_QUEUE = set()         # job ids held back by admission control
+LOAD_SIGNAL_RESOURCES = {"loadavg": "cpu", "cpu_psi": "cpu", "io_psi": "io", "disk_busy": "io"}
+_disk_sample = None             # (time, io_ticks ms) of LOAD_DISK_DEVICE
+
+def get_job_weights(job):
+    return dict(DEFAULT_JOB_WEIGHTS, **job.get('weights', {}))
+
+def read_psi(resource):
+    """'some avg10' of /proc/pressure/<resource> in %, None without PSI support."""
+    try:
+        with open(f"/proc/pressure/{resource}") as f:
+            for line in f:
+                if line.startswith("some"): return float(line.split()[1].split("=")[1])
+    except: pass
+    return None
+
+def read_disk_ticks():
+    try:
+        with open("/proc/diskstats") as f:
+            for line in f:
+                parts = line.split()
+                if parts[2] == LOAD_DISK_DEVICE: return time.time(), int(parts[12])
+    except: pass
+    return None
+
+def read_disk_busy():
+    """Busy % of LOAD_DISK_DEVICE since the previous reading (a short sample on the first call)."""
+    global _disk_sample
+    if not LOAD_DISK_DEVICE: return None
+    if _disk_sample is None:
+        _disk_sample = read_disk_ticks()
+        if _disk_sample is None: return None
+        time.sleep(LOAD_SAMPLE_SEC)
+    current = read_disk_ticks()
+    if not current or current[0] <= _disk_sample[0]: return None
+    busy = (current[1] - _disk_sample[1]) / ((current[0] - _disk_sample[0]) * 1000) * 100
+    _disk_sample = current
+    return min(busy, 100.0)
+
+def read_load_signal():
+    """Live host load: {'loadavg' (per CPU), 'cpu_psi', 'io_psi', 'disk_busy'}, None = not available."""
+    try: loadavg = os.getloadavg()[0] / (os.cpu_count() or 1)
+    except OSError: loadavg = None
+    load = {"loadavg": loadavg, "cpu_psi": read_psi("cpu"), "io_psi": read_psi("io"), "disk_busy": read_disk_busy()}
+    for name, value in load.items():
+        if value is not None: metric_gauge("load_signal", round(value, 3), signal=name)
+    return load
+
+def get_saturated_resources(load):
+    return {LOAD_SIGNAL_RESOURCES[name] for name, value in load.items()
+            if value is not None and name in LOAD_LIMITS and value > LOAD_LIMITS[name]}
+
+def is_overdue(job, state, now_epoch):
+    last_run = get_last_run_epoch(state.get(job['id']))
+    return last_run is not None and now_epoch >= last_run + job['max_interval_hours'] * 3600
+
+def get_delay_cost_rp(job, state, snapshot):
+    """Rp lost when the job starts one slot later (negative = waiting would be cheaper)."""
+    price_index = snapshot['price_index']
+    if not price_index['epochs']: return 0.0
+    runtime_min = get_runtime_estimate_min(job, state, snapshot['now'])
+    now_cost, next_cost = get_window_costs([snapshot['now_epoch'], snapshot['now_epoch'] + SLOT_SEC], runtime_min, price_index)
+    return (next_cost - now_cost) * get_job_weights(job)['watts'] / 1000 * runtime_min / 60
+
+def admit_jobs(candidates, state, snapshot, running_processes):
+    """Splits the jobs that want to start into (admitted, queued) lists, most urgent first."""
+    if not USE_ADMISSION_CONTROL or not candidates: return candidates, []
+    urgency = {job['id']: (not is_overdue(job, state, snapshot['now_epoch']), -get_delay_cost_rp(job, state, snapshot),
+                           job.get('order', 99)) for job in candidates}
+    used = collections.Counter()
+    for p in running_processes: used.update(p.get('weights', {}))
+    saturated = get_saturated_resources(read_load_signal())
+    busy = bool(running_processes)
+
+    admitted, queued = [], []
+    for job in sorted(candidates, key=lambda j: urgency[j['id']]):
+        weights = get_job_weights(job)
+        over = [r for r, w in weights.items() if w and used[r] + w > RESOURCE_BUDGET.get(r, float('inf'))]
+        pressure = sorted(r for r in saturated if weights.get(r))
+        if urgency[job['id']][0] and busy and over:
+            print(f"   [QUEUE] {job['id']}: budget exhausted ({', '.join(f'{r} {used[r]:g}+{weights[r]:g}/{RESOURCE_BUDGET[r]:g}' for r in over)}).")
+        elif urgency[job['id']][0] and pressure:
+            print(f"   [QUEUE] {job['id']}: host under {'/'.join(pressure)} pressure.")
+        else:
+            admitted.append(job)
+            used.update(weights)
+            busy = True
+            continue
+        queued.append(job)
+    return admitted, queued
+
+# ==============================================================================
+# 3f. JOB DEPENDENCIES (DAG)
+# ==============================================================================
+# "after": [ids] makes a job wait until all its predecessors have finished
+# since its own last run; it then starts right away (its chain was placed as
+# a whole), only its own cooldown and profile blocks still hold it back. Price
+# and tier are owned by the chain head: a successor's max_tier is not checked
+# again. Jobs with successors plan the critical path of their chain (learned
+# runtimes) into the cheapest contiguous window that still lets every
+# downstream job start before its deadline (backward pass: latest start =
+# min(own deadline, successor's latest start - own runtime)). A predecessor
+# that never ran blocks only until the successor's own deadline. The graph is
+# built once per compiled config; an external config with unknown ids or a
+# cycle is rejected (section 2d), for SCRIPTS_CONFIG they are reported once
+# and ignored.
+
+def topological_order(preds):
+    """Kahn's algorithm (keeps the given order among independent ids) -> (order, ids on or below a cycle)."""
+    indegree = {i: len(ps) for i, ps in preds.items()}
+    succs = {i: [] for i in preds}
+    for i, ps in preds.items():
+        for p in ps: succs[p].append(i)
+    order = [i for i in preds if not indegree[i]]
+    for i in order:
+        for s in succs[i]:
+            indegree[s] -= 1
+            if not indegree[s]: order.append(s)
+    return order, [i for i in preds if indegree[i]]
+
+def build_dag(jobs):
+    """-> (predecessors {id: [ids]}, successors {id: [ids]}, topological order)."""
+    ids = [job['id'] for job in jobs]
+    preds = {}
+    for job in jobs:
+        after = job.get('after') or []
+        unknown = sorted(set(after) - set(ids))
+        if unknown: print(f"   [DAG] {job['id']}: unknown predecessor(s) {', '.join(unknown)} ignored.")
+        preds[job['id']] = [p for p in after if p in ids and p != job['id']]
+
+    order, cyclic = topological_order(preds)
+    succs = {i: [] for i in ids}
+    for i in ids:
+        for p in preds[i]: succs[p].append(i)
+    if cyclic:
+        print(f"   [DAG] Cycle in 'after' ({', '.join(cyclic)}, incl. jobs below it): edges between them are ignored.")
+        for i in ids:
+            if i in cyclic: preds[i] = [p for p in preds[i] if p not in cyclic]
+            succs[i] = [s for s in succs[i] if s not in cyclic or i not in cyclic]
+        order += cyclic
+    return preds, succs, order
+
+def get_chain_plans(jobs, state, snapshot, dag=None):
+    """Critical path per job with successors -> {id: {'runtime_min', 'latest_start' (epoch|None), 'path'}}."""
+    preds, succs, order = dag or build_dag(jobs)
+    if not any(preds.values()): return {}
+    jobs_by_id = {job['id']: job for job in jobs}
+    tail, latest, path = {}, {}, {}
+    for i in reversed(order):
+        job = jobs_by_id[i]
+        runtime_min = get_runtime_estimate_min(job, state, snapshot['now'])
+        longest = max(succs[i], key=lambda s: tail[s], default=None)
+        tail[i] = runtime_min + (tail[longest] if longest else 0)
+        path[i] = [i] + (path[longest] if longest else [])
+        last_run = get_last_run_epoch(state.get(i))
+        bounds = [last_run + job['max_interval_hours'] * 3600] if last_run is not None else []
+        bounds += [latest[s] - runtime_min * 60 for s in succs[i] if latest[s] is not None]
+        latest[i] = min(bounds) if bounds else None
+    return {i: {"runtime_min": tail[i], "latest_start": latest[i], "path": path[i]} for i in order if succs[i]}
+
+def get_waiting_predecessors(job_id, preds, state, running_ids):
+    """Predecessors that have not finished since the job's own last run."""
+    last_run = get_last_run_epoch(state.get(job_id))
+    waiting = []
+    for p in preds:
+        p_last = get_last_run_epoch(state.get(p))
+        if p in running_ids or p_last is None or (last_run is not None and p_last <= last_run): waiting.append(p)
+    return waiting
+
+def prepare_dag(snapshot, state):
+    """Dependency data of SCRIPTS_CONFIG for this pass (kept in the snapshot)."""
+    config = get_compiled_config()
+    if 'dag' not in config: config['dag'] = build_dag(config['scripts']) # once per config version
+    dag = config['dag']
+    snapshot['dag_preds'] = dag[0]
+    snapshot['chains'] = get_chain_plans(SCRIPTS_CONFIG, state, snapshot, dag)
+
+def decide_start(job, state, snapshot, plan, running_ids):
+    """Start decision for one job: dependencies, then global plan or greedy window search."""
+    preds = snapshot.get('dag_preds', {}).get(job['id'])
+    if preds:
+        now_epoch = snapshot['now_epoch']
+        waiting = get_waiting_predecessors(job['id'], preds, state, running_ids)
+        never_run = [p for p in waiting if p not in running_ids and get_last_run_epoch(state.get(p)) is None]
+        if waiting and never_run == waiting and is_overdue(job, state, now_epoch):
+            print(f"   [FORCE] Deadline exceeded! Not waiting for {', '.join(never_run)} (never ran).")
+        elif waiting:
+            print(f"   [BLOCK] Waiting for {', '.join(waiting)}.")
+            return False
+        last_run = get_last_run_epoch(state.get(job['id']))
+        if last_run is not None and now_epoch < last_run + job['min_interval_hours'] * 3600:
+            log_debug(f"Cooldown active ({int((last_run + job['min_interval_hours'] * 3600 - now_epoch) / 60)}m left).")
+            return False
+        if check_profile_blocker(job, snapshot['now'], snapshot): return False
+        if not waiting: print(f"   [CHAIN] Predecessors done. Starting now.")
+        return True
+    if job['id'] in plan and job['id'] not in snapshot.get('chains', {}):
+        return follow_global_plan(job, plan[job['id']], snapshot)
+    return check_optimization_logic(job, state, snapshot)
+
 # ==============================================================================
 # 4. MAIN LOOP
 # ==============================================================================
 
+def get_child_command(job, exit_file=None):
+    """The job's shell command; with an I/O class the shell ionices itself first (inherited by the job).
+    With exit_file the shell writes '<exit status> <epoch>' there when the job ends (section 4a)."""
+    command = job['command']
+    if exit_file:
+        marker = shlex.quote(exit_file)
+        command = f'( {command}\n); rc=$?; echo "$rc $(date +%s)" > {marker}.tmp && mv {marker}.tmp {marker}; exit $rc'
+    io_class = job.get('ionice_class', CHILD_IONICE_CLASS)
+    ionice = shutil.which("ionice") if io_class is not None else None
+    if not ionice: return command
+    level = f" -n {job['ionice_level']}" if job.get('ionice_level') is not None and io_class in (1, 2) else ""
+    return f"{ionice} -c {io_class}{level} -p $$ 2>/dev/null; {command}"
+
+def launch_job(job, running_processes):
+    if not DRY_RUN:
+        print(f"   >>> LAUNCHING {job['id']}...")
+        niceness = job.get('nice', CHILD_NICE)
+        log, exit_file = prepare_run_files(job)
+        try:
+            try: install_sigchld_wakeup() # before the child exists: an early exit must reach the pipe
+            except ValueError: pass # not in the main thread (wait_for_child_event sleeps instead)
+            # Own session: killing the executor (or its cron process group) leaves the job running
+            proc = subprocess.Popen(get_child_command(job, exit_file), shell=True, start_new_session=True,
+                                    stdout=log, stderr=subprocess.STDOUT if log else None,
+                                    preexec_fn=(lambda: os.nice(niceness)) if niceness else None)
+            running_processes.append({'id': job['id'], 'group': job.get('group'), 'proc': proc, 'start': time.time(),
+                                      'weights': get_job_weights(job), 'pid': proc.pid,
+                                      'start_ticks': get_process_start_ticks(proc.pid),
+                                      'log': log.name if log else None, 'exit_file': exit_file})
+            save_run_registry(running_processes)
+        except Exception as e: print(f"   [ERROR] Launch failed: {e}")
+        finally:
+            if log: log.close() # the child has its own copy
+    else:
+        print(f"   [DRY-RUN] {job['id']} launched.")
+        update_runtime_stats(job['id'], job['initial_runtime_min'] * 60)
+
+def evaluate_jobs(jobs, state, snapshot, active_groups, running_processes):
+    """Checks jobs in 'order' (one per group) and launches the eligible ones
+    that pass admission control."""
+    running_ids = [p['id'] for p in running_processes]
+    plan = build_global_plan(SCRIPTS_CONFIG, state, snapshot, running_processes) if USE_GLOBAL_PLAN else {}
+    prepare_dag(snapshot, state)
+    starting = []
+    for job in sorted(jobs, key=lambda x: x.get('order', 99)):
+        print(f"\n> Checking {job['id']}...")
+        if job['id'] in running_ids:
+            print(f"   [BLOCK] Still running.")
+            metric_count("jobs", job=job['id'], result="running")
+            continue
+        group = job.get('group')
+        if group and group in active_groups:
+            print(f"   [BLOCK] Group '{group}' is busy.")
+            metric_count("jobs", job=job['id'], result="group_busy")
+            continue
+
+        with metric_timer("decision", job=job['id']):
+            start = decide_start(job, state, snapshot, plan, running_ids)
+        if not start:
+            metric_count("jobs", job=job['id'], result="waiting")
+            ADMISSION_QUEUE.discard(job['id'])
+            continue
+        if group: active_groups.append(group)
+        starting.append(job)
+
+    admitted, queued = admit_jobs(starting, state, snapshot, running_processes)
+    for job in queued:
+        metric_count("jobs", job=job['id'], result="queued")
+        ADMISSION_QUEUE.add(job['id'])
+    for job in admitted:
+        metric_count("jobs", job=job['id'], result="launched")
+        ADMISSION_QUEUE.discard(job['id'])
+        launch_job(job, running_processes)
+
+def reap_finished(running_processes):
+    """Records runtimes of finished children (own and adopted). Returns the finished entries."""
+    finished = []
+    for p in running_processes[:]:
+        if p['proc'] is not None: done = p['proc'].poll() is not None
+        else: done = not is_run_alive(p)
+        if not done:
+            if p.get('log'): rotate_job_log(p['log'], live=True)
+            continue
+        p['finished_at'] = time.time()
+        marker = read_exit_marker(p)
+        rc = p['proc'].returncode if p['proc'] is not None else (marker[0] if marker else None)
+        running_processes.remove(p)
+        finished.append(p)
+        finish_run(p)
+        if p['proc'] is None and not marker:
+            print(f"   [WARN] {p['id']} (pid {p['pid']}) ended without an exit marker (killed?). Runtime not recorded.")
+            continue
+        if p['proc'] is None: p['finished_at'] = marker[1]
+        dur = int(p['finished_at'] - p['start'])
+        print(f"   [DONE] {p['id']} finished in {dur}s" + (f" (exit status {rc})." if rc else "."))
+        metric_gauge("child_runtime_seconds", dur, job=p['id'])
+        update_runtime_stats(p['id'], dur, epoch_to_local(p['finished_at']) if p['proc'] is None else None)
+    if finished: save_run_registry(running_processes)
+    return finished
+
+# ==============================================================================
+# 4a. RUN REGISTRY (JOBS SURVIVE EXECUTOR RESTARTS)
+# ==============================================================================
+# Every launched job is recorded in RUN_DIR/registry.json: pid, launch time,
+# /proc start time (stat field 22, so a recycled pid is never mistaken for
+# the job), group and weights. Jobs run in their own session, their output
+# goes to RUN_DIR/<id>.log (rotated at JOB_LOG_MAX_BYTES, copy + truncate
+# while the job writes) and the job's shell leaves '<exit status> <epoch>' in
+# RUN_DIR/<id>.exit when it ends. A new executor re-adopts live jobs (they
+# keep blocking themselves and their group, a pidfd wakes the supervisor on
+# their exit) and records jobs that ended meanwhile from their exit marker.
+
+def get_run_file(job_id, suffix):
+    name = "".join(c if c.isalnum() or c in "-_." else "_" for c in job_id)
+    return os.path.join(RUN_DIR, name + suffix)
+
+def rotate_job_log(fpath, live=False):
+    """<id>.log -> .1 -> ... -> .JOB_LOG_BACKUPS. A live log is copied and truncated (the job keeps its fd)."""
+    try:
+        if os.path.getsize(fpath) <= JOB_LOG_MAX_BYTES: return
+        for i in range(JOB_LOG_BACKUPS - 1, 0, -1):
+            if os.path.exists(f"{fpath}.{i}"): os.replace(f"{fpath}.{i}", f"{fpath}.{i + 1}")
+        if JOB_LOG_BACKUPS and live: shutil.copyfile(fpath, f"{fpath}.1")
+        elif JOB_LOG_BACKUPS: os.replace(fpath, f"{fpath}.1")
+        if live or not JOB_LOG_BACKUPS: os.truncate(fpath, 0)
+    except OSError as e: log_debug(f"Log rotation of {fpath} failed: {e}")
+
+def prepare_run_files(job):
+    """-> (open log file or None, exit marker path or None). Without RUN_DIR the job runs untracked, like before."""
+    try:
+        os.makedirs(RUN_DIR, exist_ok=True)
+        exit_file = get_run_file(job['id'], ".exit")
+        if os.path.exists(exit_file): os.remove(exit_file) # marker of an earlier run
+    except OSError as e:
+        print(f"   [WARN] {RUN_DIR} not usable ({e}). Job runs untracked.")
+        return None, None
+    if not CAPTURE_JOB_OUTPUT: return None, exit_file
+    fpath = get_run_file(job['id'], ".log")
+    rotate_job_log(fpath)
+    try:
+        log = open(fpath, 'ab') # O_APPEND: copy + truncate rotation keeps working
+        log.write(f"\n=== {format_local_iso(get_current_time())} {job['id']} started ===\n".encode())
+        log.flush()
+        return log, exit_file
+    except OSError as e:
+        print(f"   [WARN] Job log {fpath} not writable ({e}). Output goes to stdout.")
+        return None, exit_file
+
+def load_run_registry():
+    try:
+        with open(os.path.join(RUN_DIR, "registry.json")) as f: return json.load(f)
+    except (OSError, ValueError): return {}
+
+def save_run_registry(running_processes):
+    runs = {p['id']: {k: p.get(k) for k in ("pid", "start_ticks", "start", "group", "weights", "log", "exit_file")}
+            for p in running_processes if p.get('pid')}
+    try: write_file_atomic(os.path.join(RUN_DIR, "registry.json"), json.dumps(runs, indent=4).encode())
+    except Exception as e: print(f"   [ERROR] Run registry not written: {e}")
+
+def is_run_alive(p):
+    return p.get('start_ticks') is not None and get_process_start_ticks(p['pid']) == p['start_ticks']
+
+def read_exit_marker(p):
+    """-> (exit status, end epoch) from the job's exit marker, None if there is none."""
+    if not p.get('exit_file'): return None
+    try:
+        with open(p['exit_file']) as f: rc, end = f.read().split()
+        return int(rc), float(end)
+    except (OSError, ValueError): return None
+
+def finish_run(p):
+    if p.get('pidfd') is not None: os.close(p['pidfd'])
+    if p.get('exit_file'):
+        try: os.remove(p['exit_file'])
+        except OSError: pass
+
+def adopt_runs(running_processes):
+    """Startup: live jobs of an earlier executor -> running_processes, ended ones are recorded."""
+    runs = load_run_registry()
+    for job_id, run in runs.items():
+        if any(p['id'] == job_id for p in running_processes): continue
+        p = dict(run, id=job_id, proc=None, weights=run.get('weights') or {})
+        if is_run_alive(p):
+            try: p['pidfd'] = os.pidfd_open(p['pid'])
+            except (AttributeError, OSError): p['pidfd'] = None # old kernel / Python: ADOPTED_POLL_SEC
+            started = epoch_to_local(p['start']).strftime('%Y-%m-%d %H:%M')
+            print(f"   [ADOPT] {job_id} (pid {p['pid']}) still running since {started}.")
+        running_processes.append(p) # an ended one is recorded by reap_finished right away
+    if runs: reap_finished(running_processes)
+
+# ==============================================================================
+# 4b. CHILD SUPERVISION (SIGCHLD, NO POLL LOOP)
+# ==============================================================================
+# SIGCHLD writes into a self-pipe (signal.set_wakeup_fd), select() on the read
+# end returns the moment a child exits. No 1 s polling, no busy wakeups.
+
+SUPERVISOR_STATS = {"wakeups": 0, "child_events": 0}
+_sigchld_pipe = None
+
+def install_sigchld_wakeup():
+    global _sigchld_pipe
+    if _sigchld_pipe is None:
+        r, w = os.pipe()
+        os.set_blocking(r, False)
+        os.set_blocking(w, False)
+        # A Python level handler is required, otherwise the wakeup fd never fires
+        signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+        signal.set_wakeup_fd(w)
+        _sigchld_pipe = (r, w)
+    return _sigchld_pipe
+
+def wait_for_child_event(timeout, running_processes=()):
+    """Sleeps until a child (or adopted job, section 4a) exits or timeout (sec) passes. True on exit."""
+    SUPERVISOR_STATS['wakeups'] += 1
+    pidfds = [p['pidfd'] for p in running_processes if p.get('pidfd') is not None]
+    if any(p['proc'] is None and p.get('pidfd') is None for p in running_processes):
+        timeout = min(timeout, ADOPTED_POLL_SEC) # adopted without pidfd: no exit event
+    try: r, _ = install_sigchld_wakeup()
+    except ValueError: # not in the main thread -> plain (short) sleep
+        time.sleep(min(timeout, 1))
+        return False
+    ready, _, _ = select.select([r] + pidfds, [], [], max(timeout, 0))
+    if not ready: return False
+    try:
+        while os.read(r, 512): pass
+    except BlockingIOError: pass
+    SUPERVISOR_STATS['child_events'] += 1
+    return True
+
+def get_next_slot_boundary(now):
+    return epoch_to_local((math.floor(local_epoch(now) / SLOT_SEC) + 1) * SLOT_SEC)
+
+def supervise(running_processes, jobs, disk_sample_sec=DISK_SAMPLE_MAX_SEC):
+    """Waits for the launched jobs. Completions are recorded immediately; a
+    freed group or a new slot lets waiting jobs start within the same run.
+    The disk pools keep being watched meanwhile (section 4c)."""
+    jobs_by_id = {job['id']: job for job in jobs}
+    config = get_compiled_config()
+    disk_critical, next_disk_check = [], time.time() + disk_sample_sec
+    while running_processes:
+        next_slot = local_epoch(get_next_slot_boundary(get_current_time()))
+        wait_for_child_event(min(next_slot, next_disk_check) - local_epoch(get_current_time()), running_processes)
+        if time.time() >= next_disk_check:
+            disk_critical, disk_sample_sec = check_disk_pressure()
+            next_disk_check = time.time() + disk_sample_sec
+
+        due = set()
+        for p in reap_finished(running_processes):
+            if p['group']: due |= set(config['groups'].get(p['group'], []))
+            due |= ADMISSION_QUEUE & set(jobs_by_id) # freed budget
+            due |= set(config['successors'].get(p['id'], []))
+        now = get_current_time()
+        if local_epoch(now) >= next_slot:
+            print(f"\n[SUPERVISOR] New slot {now.strftime('%H:%M')}: re-checking waiting jobs.")
+            due |= set(jobs_by_id)
+        due &= set(jobs_by_id)
+        due -= {p['id'] for p in running_processes}
+
+        if due and not disk_critical:
+            snapshot = load_tick_snapshot(now)
+            active_groups = [p['group'] for p in running_processes if p['group']]
+            evaluate_jobs([jobs_by_id[i] for i in due], load_state(), snapshot, active_groups, running_processes)
+
+# ==============================================================================
+# 4c. DISK PRESSURE WATCHER (POOLS, TREND, HYSTERESIS)
+# ==============================================================================
+# Every pool in DISK_POOLS is sampled (statvfs) into a short history; a least
+# squares fill rate over DISK_TREND_WINDOW_SEC extrapolates the time to full.
+# A pool enters emergency mode at high water or when it is predicted full
+# within DISK_LEAD_TIME_SEC, and leaves it only at low water. In emergency
+# mode its command is started detached (not waited for) and not started again
+# while it still runs; the pid + /proc start time survive in DISK_WATCH_FILE,
+# so later cron runs see a running mover too. Normal jobs are only held back
+# while a pool is at or above high water. The daemon and the supervisor sample
+# at an adaptive rate: a quarter of the time to the next threshold. Cron runs
+# that take the fast path leave their samples in DISK_SAMPLE_LOG; with cron
+# alone the trend is thus sampled every 15 min (the daemon reacts sooner).
+
+DISK_MAX_SAMPLES = DISK_TREND_WINDOW_SEC // DISK_SAMPLE_MIN_SEC + 1 # one window at the fastest rate
+_disk_watch = {"pools": None, "saved": 0}
+_movers = {}                    # pool id -> Popen (reaped by poll())
+
+def read_disk_usage_pct(path):
+    try: usage = os.statvfs(path)
+    except OSError: return None
+    if not usage.f_blocks: return None
+    return (1 - usage.f_bavail / usage.f_blocks) * 100
+
+def get_fill_rate(samples):
+    """Least squares slope of [[time, pct], ...] in % per second (None below 2 samples)."""
+    if len(samples) < 2: return None
+    t0 = samples[0][0]
+    mean_t = sum(t - t0 for t, _ in samples) / len(samples)
+    mean_p = sum(p for _, p in samples) / len(samples)
+    var = sum((t - t0 - mean_t) ** 2 for t, _ in samples)
+    if var <= 0: return None
+    return sum((t - t0 - mean_t) * (p - mean_p) for t, p in samples) / var
+
+def get_seconds_until(samples, target_pct):
+    """Extrapolated time until the pool reaches target_pct (None if it is not filling)."""
+    rate = get_fill_rate(samples)
+    if not rate or rate <= 0: return None
+    return max(0.0, (target_pct - samples[-1][1]) / rate)
+
+def get_process_start_ticks(pid):
+    """Start time of a live process (/proc/<pid>/stat field 22); None if gone or a zombie."""
+    try:
+        with open(f"/proc/{pid}/stat") as f: fields = f.read().rsplit(")", 1)[1].split()
+    except (OSError, IndexError): return None
+    if fields[0] == "Z": return None
+    return int(fields[19])
+
+def is_mover_running(pool_id, mover):
+    proc = _movers.get(pool_id)
+    if proc is not None and proc.poll() is not None: del _movers[pool_id] # reap
+    if not mover or not mover.get('pid'): return False
+    return get_process_start_ticks(mover['pid']) == mover.get('start_ticks')
+
+def launch_mover(pool, used_pct):
+    command = pool.get('command') or EMERGENCY_COMMAND
+    print(f"   [ALERT] DISK {pool['id']} at {used_pct:.1f}%! Running Emergency Command.")
+    if DRY_RUN:
+        print(f"   [DRY-RUN] Executed: {command}")
+        return None
+    if not command:
+        print(f"   [WARN] No emergency command configured for {pool['id']}.")
+        return None
+    try: proc = subprocess.Popen(command, shell=True, start_new_session=True)
+    except Exception as e:
+        print(f"   [ERROR] Emergency command failed: {e}")
+        return None
+    _movers[pool['id']] = proc
+    return {"pid": proc.pid, "start_ticks": get_process_start_ticks(proc.pid), "started": time.time()}
+
+def load_disk_watch():
+    if _disk_watch['pools'] is None:
+        try:
+            with open(DISK_WATCH_FILE) as f: _disk_watch['pools'] = json.load(f)
+        except: _disk_watch['pools'] = {}
+        merge_fast_path_samples(_disk_watch['pools'])
+    return _disk_watch['pools']
+
+def merge_fast_path_samples(watch):
+    """Adds the samples of cron fast path runs (section 0) to the pool histories."""
+    if not DISK_SAMPLE_LOG: return
+    merging = DISK_SAMPLE_LOG + ".merge"
+    try:
+        os.rename(DISK_SAMPLE_LOG, merging) # fast path runs from now on start a new log
+        with open(merging) as f: lines = f.read().splitlines()
+        os.remove(merging)
+    except OSError: return
+    pool_ids = {pool['path']: pool['id'] for pool in DISK_POOLS}
+    for line in lines:
+        try: fpath, ts, used = line.split("\t")
+        except ValueError: continue # torn line
+        entry = watch.get(pool_ids.get(fpath))
+        if entry:
+            try: entry['samples'].append([float(ts), float(used)])
+            except ValueError: continue
+    for entry in watch.values(): entry['samples'].sort()
+
+def save_disk_watch(force):
+    """Persists the watch state; unforced at most every DISK_SAMPLE_MAX_SEC (daemon samples often)."""
+    if not force and time.time() - _disk_watch['saved'] < DISK_SAMPLE_MAX_SEC: return
+    try: write_file_atomic(DISK_WATCH_FILE, json.dumps(_disk_watch['pools']).encode())
+    except Exception as e: log_debug(f"Disk watch state not written: {e}")
+    _disk_watch['saved'] = time.time()
+
+def check_disk_pressure():
+    """Samples all pools, switches emergency modes, starts movers. -> (pools at high water, next sample in sec)."""
+    watch = load_disk_watch()
+    now_ts = time.time()
+    critical, next_sample, changed = [], DISK_SAMPLE_MAX_SEC, False
+    for pool in DISK_POOLS:
+        used = read_disk_usage_pct(pool['path'])
+        if used is None: continue
+        entry = watch.setdefault(pool['id'], {"samples": [], "active": False, "mover": None, "last_launch": None})
+        entry['samples'] = [s for s in entry['samples'] if now_ts - s[0] <= DISK_TREND_WINDOW_SEC][-(DISK_MAX_SAMPLES - 1):] + [[round(now_ts, 3), round(used, 3)]]
+        high, low = pool.get('high_pct', DISK_FULL_THRESHOLD), pool.get('low_pct', DISK_FULL_THRESHOLD)
+        to_full = get_seconds_until(entry['samples'], 100)
+        metric_gauge("disk_used_percent", round(used, 3), pool=pool['id'])
+        if used >= high: critical.append(pool['id'])
+
+        # Hysteresis: on at high water or predicted full, off at low water
+        predicted = to_full is not None and to_full <= DISK_LEAD_TIME_SEC
+        if not entry['active'] and (used >= high or predicted):
+            eta = f", full in ~{to_full / 60:.0f} min" if to_full is not None else ""
+            print(f"   [DISK] {pool['id']}: {used:.1f}% used{eta}. Emergency mode on.")
+            entry['active'] = changed = True
+        elif entry['active'] and used <= low and not predicted:
+            print(f"   [DISK] {pool['id']}: {used:.1f}% used (<= {low}%). Emergency mode off.")
+            entry['active'], changed = False, True
+
+        # De-duplication: one mover per pool, a finished one is restarted at most every DISK_RELAUNCH_MIN_SEC
+        if is_mover_running(pool['id'], entry['mover']):
+            log_debug(f"{pool['id']}: Emergency command still running (pid {entry['mover']['pid']}).")
+        elif entry['active']:
+            if entry['last_launch'] is None or now_ts - entry['last_launch'] >= DISK_RELAUNCH_MIN_SEC:
+                entry['mover'], entry['last_launch'], changed = launch_mover(pool, used), now_ts, True
+                metric_count("emergency_runs", pool=pool['id'])
+        elif entry['mover']: entry['mover'], changed = None, True
+
+        to_next = get_seconds_until(entry['samples'], 100 if entry['active'] else high)
+        if to_next is not None: next_sample = min(next_sample, max(DISK_SAMPLE_MIN_SEC, to_next / 4))
+    save_disk_watch(changed)
+    return critical, next_sample
+
+def get_disk_wake_lines():
+    """Fast path lines (section 0): wake-up usage, last sample and lead time per pool."""
+    watch = load_disk_watch()
+    lines = [f"samples\t-\t{DISK_SAMPLE_LOG}"] if DISK_POOLS else []
+    for pool in DISK_POOLS:
+        entry = watch.get(pool['id']) or {}
+        if entry.get('active'): return None # emergency mode: every run checks
+        high = pool.get('high_pct', DISK_FULL_THRESHOLD)
+        last_ts, last = entry['samples'][-1] if entry.get('samples') else (0, 0)
+        lines.append(f"disk\t{min(high, last + DISK_WAKE_MARGIN_PCT)},{last_ts},{last},{DISK_LEAD_TIME_SEC}\t{pool['path']}")
+    return lines
+
 def main():
+    t_start = time.perf_counter()
     prevent_double_execution()
+    install_sigchld_wakeup() # children can exit while the others are still evaluated
+    if load_external_config() is None: sys.exit(1)
     current_ts = get_current_time()
-    day_type = get_day_type(current_ts)
+    with metric_timer("phase", phase="snapshot"): snapshot = load_tick_snapshot(current_ts)
+    day_type = get_day_type(current_ts, snapshot)
     print(f"\n--- EXECUTOR v9.0: {current_ts.strftime('%Y-%m-%d %H:%M:%S')} ({day_type}) ---")
     if DRY_RUN: print("[DEBUG] DRY RUN ACTIVE")
 
-    if is_disk_full():
-        print(f"   [ALERT] DISK CRITICAL! Running Emergency Command.")
-        if not DRY_RUN: subprocess.run(EMERGENCY_COMMAND, shell=True)
-        else: print(f"   [DRY-RUN] Executed: {EMERGENCY_COMMAND}")
+    with metric_timer("phase", phase="disk"): critical, disk_sample_sec = check_disk_pressure()
+    if critical:
+        print(f"[DISK] {', '.join(critical)} at high water: no jobs this run.")
+        write_metrics()
         return 
 
-    state = load_state()
     running_processes = []
-    active_groups = []
-    sorted_scripts = sorted(SCRIPTS_CONFIG, key=lambda x: x.get('order', 99))
-
-    for job in sorted_scripts:
-        print(f"\n> Checking {job['id']}...")
-        group = job.get('group')
-        if group and group in active_groups:
-            print(f"   [BLOCK] Group '{group}' is busy.")
-            continue
-
-        if check_optimization_logic(job, state):
-            if group: active_groups.append(group)
-            if not DRY_RUN:
-                print(f"   >>> LAUNCHING {job['id']}...")
-                try:
-                    proc = subprocess.Popen(job['command'], shell=True)
-                    running_processes.append({'id': job['id'], 'proc': proc, 'start': time.time()})
-                except Exception as e: print(f"   [ERROR] Launch failed: {e}")
-            else:
-                print(f"   [DRY-RUN] {job['id']} launched.")
-                update_runtime_stats(job['id'], job['initial_runtime_min'] * 60)
+    if not DRY_RUN: adopt_runs(running_processes) # jobs of a killed executor keep their group busy
+    active_groups = [p['group'] for p in running_processes if p['group']]
+    with metric_timer("phase", phase="load_state"): state = load_state()
+    with metric_timer("phase", phase="evaluate"):
+        evaluate_jobs(SCRIPTS_CONFIG, state, snapshot, active_groups, running_processes)
+    metric_gauge("decide_seconds", round(time.perf_counter() - t_start, 6))
 
     if running_processes:
         print(f"\n[PARALLEL] Monitoring {len(running_processes)} jobs...")
-        while running_processes:
-            for p in running_processes[:]:
-                if p['proc'].poll() is not None:
-                    dur = int(time.time() - p['start'])
-                    print(f"   [DONE] {p['id']} finished in {dur}s.")
-                    update_runtime_stats(p['id'], dur)
-                    running_processes.remove(p)
-            time.sleep(1)
+        with metric_timer("phase", phase="supervise"): supervise(running_processes, SCRIPTS_CONFIG, disk_sample_sec)
+    with metric_timer("phase", phase="stamp"): write_fast_path_stamp()
+    metric_gauge("run_seconds", round(time.perf_counter() - t_start, 6))
+    write_metrics()
     print("\n--- DONE ---")
 
-if __name__ == "__main__": main()
\ No newline at end of file
+# ==============================================================================
+# 5. DAEMON MODE (EVENT DRIVEN)
+# ==============================================================================
+# Instead of re-evaluating every job every 15 min, each job gets its next
+# "decision time": the next slot boundary (current price changes), cooldown
+# expiry, deadline or the end of a blocked profile hour. The daemon sleeps
+# until the earliest event and only re-evaluates the affected jobs.
+
+def get_next_decision_time(job, state, snapshot):
+    """Earliest time at which the decision for this job can change -> (dt, reason)."""
+    now = snapshot['now']
+    next_slot = get_next_slot_boundary(now)
+
+    # Blocked profile hour: nothing can happen before the first free hour
+    if is_hour_blocked(job, now, snapshot):
+        hour = now.replace(minute=0, second=0, microsecond=0)
+        for h in range(1, 49):
+            t = hour + datetime.timedelta(hours=h)
+            if not is_hour_blocked(job, t, snapshot): return t, "profile"
+        return next_slot, "slot"
+
+    last_run = get_last_run_epoch(state.get(job['id']))
+    if last_run is not None:
+        now_epoch = snapshot['now_epoch']
+        cooldown_end = last_run + job['min_interval_hours'] * 3600
+        if now_epoch < cooldown_end: return epoch_to_local(cooldown_end), "cooldown"
+        deadline = last_run + job['max_interval_hours'] * 3600
+        if now_epoch < deadline < local_epoch(next_slot): return epoch_to_local(deadline), "deadline"
+    return next_slot, "slot"
+
+def write_fast_path_stamp():
+    """Stamp for the fast path (section 0): earliest possible action + the inputs it depends on."""
+    if not USE_FAST_PATH and FAST_PATH_STAMP_FILE: # executor_cron.py must not act on an old stamp
+        try: os.remove(FAST_PATH_STAMP_FILE)
+        except OSError: pass
+    if not USE_FAST_PATH or OVERRIDE_NOW or SIMULATED_CLOCK: return
+    now = get_current_time()
+    snapshot = load_tick_snapshot(now)
+    state = load_state()
+    # Local midnight at the latest: the plan window and day type move on
+    next_epoch = local_epoch(datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time()))
+    for job in SCRIPTS_CONFIG:
+        when, _ = get_next_decision_time(job, state, snapshot)
+        next_epoch = min(next_epoch, local_epoch(when))
+    files = [os.path.abspath(__file__), STATE_FILE, STATE_FILE + ".journal", CONFIG_FILE, FORECAST_FILE]
+    files += [f(d) for d in get_plan_dates(now) for f in (get_plan_file, get_plan_bin_file)]
+    disk_lines = get_disk_wake_lines()
+    if disk_lines is None: next_epoch, disk_lines = 0, [] # a pool in emergency mode: no fast path
+    label = epoch_to_local(next_epoch).strftime('%Y-%m-%d %H:%M')
+    lines = [f"{next_epoch}\t{label}"] + [f"file\t{get_file_key(p)}\t{p}" for p in files if p] + disk_lines
+    try: write_file_atomic(FAST_PATH_STAMP_FILE, ("\n".join(lines) + "\n").encode())
+    except Exception as e: print(f"   [ERROR] Could not write fast path stamp: {e}")
+    log_debug(f"Next possible action: {label}")
+
+def run_daemon():
+    prevent_double_execution()
+    install_sigchld_wakeup()
+    try: sys.stdout.reconfigure(line_buffering=True)
+    except: pass
+    print(f"\n--- EXECUTOR v9.0 DAEMON: started {get_current_time().strftime('%Y-%m-%d %H:%M:%S')} ---")
+    if DRY_RUN: print("[DEBUG] DRY RUN ACTIVE")
+
+    config = load_external_config()
+    if config is None: sys.exit(1)
+    jobs_by_id = {job['id']: job for job in SCRIPTS_CONFIG}
+    queue = []              # heap of (when_epoch, seq, job_id, reason)
+    scheduled = {}          # job_id -> when (older heap entries are stale)
+    seq = itertools.count()
+    running_processes = []
+    if not DRY_RUN: adopt_runs(running_processes)
+    due = set(jobs_by_id)   # first pass: everything
+    files_key = None
+    next_disk_check = None
+    disk_critical = []
+
+    while True:
+        new_config = load_external_config()
+        if new_config is not None and new_config is not config:
+            print(f"\n[DAEMON] Job config changed. Re-evaluating all jobs.")
+            config = new_config
+            jobs_by_id = {job['id']: job for job in SCRIPTS_CONFIG}
+            scheduled.clear()
+            due |= set(jobs_by_id)
+
+        now = get_current_time()
+        snapshot = load_tick_snapshot(now)
+        if snapshot['files_key'] != files_key:
+            if files_key is not None: print(f"\n[DAEMON] New plans detected. Re-evaluating all jobs.")
+            files_key = snapshot['files_key']
+            due |= set(jobs_by_id)
+
+        # Completions free their group -> re-evaluate the group members now
+        for p in reap_finished(running_processes):
+            due.add(p['id'])
+            if p['group']: due |= set(config['groups'].get(p['group'], []))
+            due |= ADMISSION_QUEUE & set(jobs_by_id) # freed budget
+            due |= set(config['successors'].get(p['id'], []))
+
+        now_epoch = snapshot['now_epoch']
+        while queue and queue[0][0] <= now_epoch:
+            when, _, job_id, reason = heapq.heappop(queue)
+            if scheduled.get(job_id) != when: continue
+            del scheduled[job_id]
+            log_debug(f"Event '{reason}' for {job_id}.")
+            due.add(job_id)
+
+        if next_disk_check is None or now_epoch >= next_disk_check:
+            disk_critical, disk_sample_sec = check_disk_pressure()
+            next_disk_check = now_epoch + disk_sample_sec
+            if disk_critical: print(f"\n[DISK] {', '.join(disk_critical)} at high water: jobs wait.")
+
+        if due and not disk_critical:
+            print(f"\n[DAEMON] {now.strftime('%Y-%m-%d %H:%M:%S')}: Checking {', '.join(sorted(due))}")
+            state = load_state()
+            active_groups = [p['group'] for p in running_processes if p['group']]
+            with metric_timer("phase", phase="evaluate"):
+                evaluate_jobs([jobs_by_id[i] for i in due if i in jobs_by_id], state, snapshot, active_groups, running_processes)
+            metric_gauge("running_jobs", len(running_processes))
+            write_metrics()
+
+            state = load_state()
+            running_ids = [p['id'] for p in running_processes]
+            for job_id in due:
+                if job_id not in jobs_by_id or job_id in running_ids: continue
+                when, reason = get_next_decision_time(jobs_by_id[job_id], state, snapshot)
+                scheduled[job_id] = local_epoch(when)
+                heapq.heappush(queue, (scheduled[job_id], next(seq), job_id, reason))
+                log_debug(f"{job_id}: next decision {when.strftime('%Y-%m-%d %H:%M:%S')} ({reason}).")
+            due = set()
+
+        # Sleep until the earliest event (or a child exit)
+        wake = next_disk_check
+        if queue and queue[0][0] < wake: wake = queue[0][0]
+        sleep_sec = wake - local_epoch(get_current_time())
+        wait_for_child_event(min(max(sleep_sec, 0.05), DAEMON_MAX_SLEEP_SEC), running_processes)
+
+def run_build_decision_table():
+    """Post-planner step: precompute the decision table for all jobs."""
+    if load_external_config() is None: sys.exit(1)
+    now = get_current_time()
+    snapshot = load_tick_snapshot(now)
+    table = build_decision_table(SCRIPTS_CONFIG, load_state(), snapshot)
+    if table: print(f"[SUCCESS] Decision table for {len(table['jobs'])} jobs saved: {DECISION_TABLE_FILE}")
+    else: print(f"[ERROR] Could not write {DECISION_TABLE_FILE}")
+
+def run_cli(args):
+    if "--daemon" in args: run_profiled(run_daemon)
+    elif "--build-decision-table" in args: run_profiled(run_build_decision_table)
+    else: run_profiled(main)
+
+if __name__ == "__main__": run_cli(sys.argv[1:])
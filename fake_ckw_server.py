@@ -0,0 +1,143 @@
+#!/usr/bin/python3
+"""
+==============================================================================
+ MASTER POWER SCRIPT - FAKE CKW API (Development Tool)
+==============================================================================
+ Context:   Local stand-in for the CKW dynamic price endpoint (tests/benchmarks)
+ Usage:     python3 fake_ckw_server.py --port 8099 --latency 0.5 --fail-rate 0.3
+            CKW_API_URL=http://127.0.0.1:8099/prices python3 power_planner.py
+ Features:  Deterministic prices per day and tariff_type (grid_usage, electricity,
+            feed_in), ETag / 304, keep-alive (HTTP/1.1), latency and failure
+            injection (HTTP 503 or dropped connection)
+==============================================================================
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import random
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ==============================================================================
+# 1. PRICE GENERATOR
+# ==============================================================================
+
+# CHF/kWh per tariff_type: base, midday (solar), night and evening peak deltas
+TARIFF_SHAPES = {
+    "grid_usage":  (0.045, -0.02, -0.015, 0.03),
+    "electricity": (0.12, -0.03, -0.02, 0.04),
+    "feed_in":     (0.08, -0.04, 0.0, 0.02),
+}
+
+def generate_payload(start_ts, end_ts, resolution_min=15, tariff_type="grid_usage"):
+    """CKW shaped answer between two ISO timestamps (offset is kept)."""
+    start = datetime.datetime.fromisoformat(start_ts)
+    end = datetime.datetime.fromisoformat(end_ts)
+    base_price, midday, night, peak = TARIFF_SHAPES[tariff_type]
+    rnd = random.Random(start.date().toordinal())
+    prices = []
+    t = start
+    while t <= end:
+        hour = t.hour + t.minute / 60
+        # Cheap nights and midday (solar), expensive morning/evening peaks
+        base = base_price + midday * (10 <= hour < 16) + night * (hour < 6) + peak * (17 <= hour < 21)
+        value = round(max(0.005, base + rnd.uniform(-0.01, 0.01)), 5)
+        prices.append({
+            "start_timestamp": t.isoformat(),
+            "end_timestamp": (t + datetime.timedelta(minutes=resolution_min)).isoformat(),
+            tariff_type: [{"unit": "CHF_kWh", "value": value}]
+        })
+        t += datetime.timedelta(minutes=resolution_min)
+    return {"publication_timestamp": start.isoformat(), "prices": prices}
+
+# ==============================================================================
+# 2. HTTP SERVER
+# ==============================================================================
+
+class FakeCKWHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive, like the real endpoint
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose: super().log_message(fmt, *args)
+
+    def send_body(self, status, body, headers=None):
+        self.send_response(status)
+        for key, value in (headers or {}).items(): self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.stats['requests'] += 1
+            key = self.path
+            server.seen[key] = server.seen.get(key, 0) + 1
+            attempt = server.seen[key]
+
+        if server.latency: time.sleep(server.latency)
+
+        # Failure injection: first N attempts per URL and/or a random rate
+        if attempt <= server.fail_first or server.rnd.random() < server.fail_rate:
+            with server.lock: server.stats['failures'] += 1
+            if server.rnd.random() < 0.5:
+                self.close_connection = True # drop without an answer
+                return
+            return self.send_body(503, b'{"error": "injected failure"}', {"Content-Type": "application/json"})
+
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        try:
+            payload = generate_payload(query['start_timestamp'][0], query['end_timestamp'][0], server.resolution_min,
+                                       query.get('tariff_type', ["grid_usage"])[0])
+        except (KeyError, ValueError) as e: # missing parameter, bad timestamp or unknown tariff_type
+            return self.send_body(400, json.dumps({"error": str(e)}).encode(), {"Content-Type": "application/json"})
+
+        body = json.dumps(payload).encode()
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if server.etag and self.headers.get("If-None-Match") == etag:
+            with server.lock: server.stats['not_modified'] += 1
+            return self.send_body(304, b"", {"ETag": etag})
+        headers = {"Content-Type": "application/json"}
+        if server.etag: headers["ETag"] = etag
+        self.send_body(200, body, headers)
+
+def start_server(port=0, latency=0.0, fail_rate=0.0, fail_first=0, etag=True, resolution_min=15, verbose=False, seed=0):
+    """Starts the fake API in a background thread. Returns (server, base_url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeCKWHandler)
+    server.daemon_threads = True
+    server.latency, server.fail_rate, server.fail_first = latency, fail_rate, fail_first
+    server.etag, server.resolution_min, server.verbose = etag, resolution_min, verbose
+    server.rnd = random.Random(seed)
+    server.lock = threading.Lock()
+    server.seen = {}
+    server.stats = {"requests": 0, "failures": 0, "not_modified": 0}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/prices"
+
+# ==============================================================================
+# 3. MAIN
+# ==============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the CKW price API.")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.0, help="Delay per request (seconds)")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Probability of an injected failure (0-1)")
+    parser.add_argument("--fail-first", type=int, default=0, help="Fail the first N requests of every URL")
+    parser.add_argument("--no-etag", action="store_true", help="Do not send ETags (no 304 answers)")
+    parser.add_argument("--resolution", type=int, default=15, help="Slot length in minutes")
+    args = parser.parse_args()
+
+    server, url = start_server(args.port, args.latency, args.fail_rate, args.fail_first,
+                               not args.no_etag, args.resolution, verbose=True)
+    print(f"[INFO] Fake CKW API listening. Use: CKW_API_URL={url}")
+    try:
+        while True: time.sleep(3600)
+    except KeyboardInterrupt:
+        print(f"\n[INFO] Stats: {server.stats}")
+
+if __name__ == "__main__": main()
@@ -19,18 +19,82 @@ import urllib.error
 import math
 import os
 import sys
+import struct
+import subprocess
+import http.client
+import hashlib
+import random
+import threading
+import concurrent.futures
+import sqlite3
+import contextlib
 
 # ==============================================================================
 # 1. CONFIGURATION
 # ==============================================================================
 
-# CKW API Endpoint (MuleSoft)
-API_URL = "https://e-ckw-public-data.de-c1.eu1.cloudhub.io/api/v1/netzinformationen/energie/dynamische-preise"
+# CKW API Endpoint (MuleSoft). CKW_API_URL overrides it (e.g. fake_ckw_server.py for tests)
+API_URL = os.environ.get("CKW_API_URL", "https://e-ckw-public-data.de-c1.eu1.cloudhub.io/api/v1/netzinformationen/energie/dynamische-preise")
+
+# Fetching
+FETCH_TIMEOUT_SEC = 20          # Per request (connect + read)
+FETCH_RETRIES = 4               # Extra attempts after the first one
+FETCH_BACKOFF_SEC = 1.0         # Exponential backoff: 1s, 2s, 4s, ... (+ jitter)
+FETCH_BACKOFF_MAX_SEC = 30
+FETCH_WORKERS = 2               # Dates fetched concurrently
+FETCH_CACHE_FRESH_SEC = 3600    # Cached answers younger than this are used without a request
+
+# Price sources (section 3b). The plan price is the sum of the components (sign * provider price in Rp/kWh),
+# e.g. grid + energy - feed-in. A slot a component does not cover is dropped ("optional": counts 0 instead).
+# HARD_CAP_RP blocks slots by the price of HARD_CAP_COMPONENT alone (the grid tariff it was made for).
+PRICE_PROVIDERS = {
+    "ckw_grid": {"type": "ckw", "tariff_type": "grid_usage", "tariff_name": "home_dynamic"},
+    # "ckw_energy": {"type": "ckw", "tariff_type": "electricity", "tariff_name": "home_dynamic"},
+    # "feed_in":    {"type": "file", "path": "/mnt/user/appdata/power_scheduler/feed_in/%Y-%m-%d.csv", "unit": "Rp_kWh"},
+}
+PRICE_COMPONENTS = [
+    {"provider": "ckw_grid", "sign": 1},
+    # {"provider": "feed_in", "sign": -1, "optional": True},
+]
 
 # Constraints
 HARD_CAP_RP = 6.0         # Threshold: Above 6.0 Rappen = BLOCKED
+HARD_CAP_COMPONENT = "ckw_grid" # Provider whose own price the cap applies to ("" = the composite plan price).
+                                # Tiers always rank the composite price of the slots below the cap.
+LOCAL_TIMEZONE = "Europe/Zurich"   # Source times without a UTC offset are local time here ("" = system local time)
 STORAGE_PATH = "/mnt/user/appdata/power_scheduler/"
 FILENAME_FORMAT = "%Y-%m-%d.json"
+FETCH_CACHE_DIR = os.path.join(STORAGE_PATH, "http_cache")
+PROVIDER_CACHE_DIR = os.path.join(STORAGE_PATH, "provider_cache")   # Normalized series per (provider, date)
+
+# Price archive (history for tuning; the daily JSON cleanup does not touch it)
+ARCHIVE_ENABLED = True
+ARCHIVE_FILE = os.path.join(STORAGE_PATH, "price_archive.sqlite")
+ARCHIVE_FULL_RES_DAYS = 400     # Older slots are downsampled to hourly averages
+ARCHIVE_RETENTION_DAYS = 3650   # Older rows are dropped
+
+# Price forecast (weekday x 15 min slot profile from the archive, used by the executor past the published slots)
+FORECAST_ENABLED = True
+FORECAST_FILE = os.path.join(STORAGE_PATH, "price_forecast.json")
+FORECAST_HISTORY_DAYS = 56      # Training window
+FORECAST_HALF_LIFE_DAYS = 14    # Recency weighting: a day this old counts half
+FORECAST_SHRINK = 2.0           # Pull towards the all-days profile of the slot (a fresh day weighs 1)
+
+# Compact binary timeline (read by the executor without any string parsing)
+WRITE_BINARY_TIMELINE = True
+BINARY_FILENAME_FORMAT = "%Y-%m-%d.bin"
+
+# Post-plan step, e.g. "python3 /mnt/user/scripts/executor_15min.py --build-decision-table"
+POST_PLAN_COMMAND = ""
+
+# Tier Ranking
+TIER_COUNT = 20             # Tiers 1 (cheapest) .. TIER_COUNT (most expensive below cap)
+PERCENTILE_METHOD = "min"   # Rank of equal prices: "min" (classic), "mean" or "max"
+
+# Metrics of the last run: node-exporter textfile and/or one JSON line per run ("" = off)
+METRICS_TEXTFILE = ""       # e.g. "/var/lib/node_exporter/textfile_collector/power_planner.prom"
+METRICS_JSON_LOG = ""       # e.g. os.path.join(STORAGE_PATH, "planner_metrics.jsonl")
+PROFILE_DUMP = os.environ.get("POWER_PROFILE", "")   # cProfile stats file (opt-in)
 
 # ==============================================================================
 # 2. HELPER FUNCTIONS
@@ -74,31 +138,125 @@ def cleanup_old_files():
     
     if os.path.exists(STORAGE_PATH):
         for filename in os.listdir(STORAGE_PATH):
-            if filename.endswith(".json"):
+            if filename.endswith(".json") or filename.endswith(".bin"):
                 try:
-                    # Parse filename YYYY-MM-DD.json
-                    file_date_str = filename.replace(".json", "")
+                    # Parse filename YYYY-MM-DD.json / YYYY-MM-DD.bin
+                    file_date_str = filename.rsplit(".", 1)[0]
                     file_date = datetime.datetime.strptime(file_date_str, "%Y-%m-%d").date()
                     
                     # Strict cleanup: If date is before today -> Delete
                     if file_date < today:
+                        # Keep the prices: archive the plan before it is gone
+                        if ARCHIVE_ENABLED and filename.endswith(".json"):
+                            try:
+                                with open(os.path.join(STORAGE_PATH, filename)) as f:
+                                    archive_schedule(json.load(f))
+                            except Exception as e:
+                                print(f"  [WARN] Could not archive {filename}: {e}")
                         os.remove(os.path.join(STORAGE_PATH, filename))
                         print(f"  - Deleted: {filename}")
                         count += 1
                 except ValueError:
                     continue 
+
+    # Cached HTTP responses (<sha1>_YYYY-MM-DD.json) and normalized provider
+    # series (<provider>_YYYY-MM-DD.json) of past dates
+    for cache_dir in (FETCH_CACHE_DIR, PROVIDER_CACHE_DIR):
+        if not os.path.isdir(cache_dir): continue
+        for filename in os.listdir(cache_dir):
+            try: expired = datetime.date.fromisoformat(filename[-15:-5]) < today
+            except ValueError: expired = cache_dir == FETCH_CACHE_DIR # undated name (older versions): never read again
+            if not expired: continue
+            try: os.remove(os.path.join(cache_dir, filename))
+            except OSError: continue
+            count += 1
     
     if count == 0:
         print("  > System clean. No old files.")
     else:
         print(f"  > Removed {count} old files.")
 
+# ==============================================================================
+# 2b. METRICS (TEXTFILE / JSON LINE / CPROFILE)
+# ==============================================================================
+# Phase timers, counters and gauges, keyed by (name, labels). Reset after
+# every export, so each file/line describes one run (or one daemon pass):
+# timers are exported as power_planner_<name>_seconds, counters as
+# power_planner_<name>_per_run, both typed gauge (a per-run count that
+# repeats is not a Prometheus counter, rate() over it would be 0).
+# The same block lives in executor_15min.py; keep both copies in sync.
+
+METRICS_PREFIX = "power_planner"
+METRICS = {"timers": {}, "counters": {}, "gauges": {}}
+_metrics_lock = threading.Lock() # the planner records from its fetch threads
+
+def metric_add(kind, name, value, labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _metrics_lock: METRICS[kind][key] = METRICS[kind].get(key, 0) + value
+
+@contextlib.contextmanager
+def metric_timer(name, **labels):
+    t0 = time.perf_counter()
+    try: yield
+    finally: metric_add("timers", name, time.perf_counter() - t0, labels)
+
+def metric_count(name, value=1, **labels): metric_add("counters", name, value, labels)
+
+def metric_gauge(name, value, **labels):
+    with _metrics_lock: METRICS["gauges"][(name, tuple(sorted(labels.items())))] = value
+
+def format_metric_name(name, labels):
+    escape = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return name + ("{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels) + "}" if labels else "")
+
+def write_metrics():
+    """Exports and resets the collected metrics (textfile atomically via rename, JSON appended)."""
+    metric_gauge("last_run_timestamp_seconds", round(time.time(), 3))
+    if METRICS_TEXTFILE:
+        lines, typed = [], set()
+        for kind, suffix, prom_type in (("timers", "_seconds", "gauge"), ("counters", "_per_run", "gauge"), ("gauges", "", "gauge")):
+            for (name, labels), value in sorted(METRICS[kind].items()):
+                full = f"{METRICS_PREFIX}_{name}{suffix}"
+                if full not in typed:
+                    typed.add(full)
+                    lines.append(f"# TYPE {full} {prom_type}")
+                lines.append(f"{format_metric_name(full, labels)} {round(value, 6)}")
+        try:
+            tmp_path = METRICS_TEXTFILE + ".tmp"
+            with open(tmp_path, 'w') as f: f.write("\n".join(lines) + "\n")
+            os.replace(tmp_path, METRICS_TEXTFILE)
+        except Exception as e: print(f"[ERROR] Could not write metrics: {e}")
+    if METRICS_JSON_LOG:
+        record = {"ts": datetime.datetime.now().isoformat(timespec='seconds'), "script": METRICS_PREFIX}
+        for kind in ("timers", "counters", "gauges"):
+            record[kind] = {format_metric_name(name, labels): round(value, 6) for (name, labels), value in sorted(METRICS[kind].items())}
+        try:
+            with open(METRICS_JSON_LOG, 'a') as f: f.write(json.dumps(record) + "\n")
+        except Exception as e: print(f"[ERROR] Could not write metrics log: {e}")
+    with _metrics_lock:
+        for kind in METRICS.values(): kind.clear()
+
+def run_profiled(func, *args):
+    """Runs func under cProfile when PROFILE_DUMP is set (view: python3 -m pstats FILE)."""
+    if not PROFILE_DUMP: return func(*args)
+    import cProfile
+    profiler = cProfile.Profile()
+    try: return profiler.runcall(func, *args)
+    finally:
+        profiler.dump_stats(PROFILE_DUMP)
+        print(f"[PROFILE] Stats written to {PROFILE_DUMP}")
+
 # ==============================================================================
 # 3. API FETCHING
 # ==============================================================================
 
-def fetch_ckw_data(target_date):
-    """Fetches raw JSON from CKW API using urllib."""
+# One persistent HTTP(S) connection per worker thread, reused across dates and retries
+_http_local = threading.local()
+
+class RetryableFetchError(Exception):
+    pass
+
+def build_ckw_url(target_date, tariff_type="grid_usage", tariff_name="home_dynamic"):
     # Define Time Window: 00:00:00 to 23:59:59
     start_dt = datetime.datetime.combine(target_date, datetime.time(0, 0, 0))
     end_dt = datetime.datetime.combine(target_date, datetime.time(23, 59, 59))
@@ -110,96 +268,427 @@ def fetch_ckw_data(target_date):
     
     # Build Query
     params = {
-        'tariff_type': 'grid_usage',
-        'tariff_name': 'home_dynamic',
+        'tariff_type': tariff_type,
+        'tariff_name': tariff_name,
         'start_timestamp': start_str,
         'end_timestamp': end_str
     }
-    
-    query_string = urllib.parse.urlencode(params)
-    full_url = f"{API_URL}?{query_string}"
-    
+    return f"{API_URL}?{urllib.parse.urlencode(params)}"
+
+def get_http_connection(url_parts, reset=False):
+    conn = getattr(_http_local, 'conn', None)
+    if conn is not None and (reset or _http_local.netloc != url_parts.netloc):
+        conn.close()
+        conn = None
+    if conn is None:
+        conn_cls = http.client.HTTPSConnection if url_parts.scheme == "https" else http.client.HTTPConnection
+        conn = conn_cls(url_parts.netloc, timeout=FETCH_TIMEOUT_SEC)
+        _http_local.conn, _http_local.netloc = conn, url_parts.netloc
+    return conn
+
+def get_cache_path(url, target_date):
+    """<sha1 of url>_YYYY-MM-DD.json: the date lets cleanup_old_files prune past days."""
+    return os.path.join(FETCH_CACHE_DIR, f"{hashlib.sha1(url.encode()).hexdigest()}_{target_date}.json")
+
+def load_cached_response(url, target_date):
+    try:
+        with open(get_cache_path(url, target_date)) as f: return json.load(f)
+    except Exception: return None
+
+def save_cached_response(url, target_date, entry):
+    try:
+        os.makedirs(FETCH_CACHE_DIR, exist_ok=True)
+        tmp_path = get_cache_path(url, target_date) + ".tmp"
+        with open(tmp_path, 'w') as f: json.dump(entry, f)
+        os.replace(tmp_path, get_cache_path(url, target_date))
+    except Exception as e:
+        print(f"[WARN] Could not write fetch cache: {e}")
+
+def http_get(url, cached):
+    """One GET over the thread's keep-alive connection. Returns (status, body, headers)."""
+    parts = urllib.parse.urlsplit(url)
+    headers = {"Accept": "application/json", "Connection": "keep-alive"}
+    if cached and cached.get('etag'): headers["If-None-Match"] = cached['etag']
+    if cached and cached.get('last_modified'): headers["If-Modified-Since"] = cached['last_modified']
+    target = parts.path + ("?" + parts.query if parts.query else "")
+
+    for attempt in range(2): # second attempt: server closed the idle keep-alive connection
+        conn = get_http_connection(parts, reset=attempt > 0)
+        try:
+            conn.request("GET", target, headers=headers)
+            response = conn.getresponse()
+            return response.status, response.read(), response
+        except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError) as e:
+            if attempt: raise RetryableFetchError(f"Connection lost: {e}")
+        except (OSError, http.client.HTTPException) as e:
+            get_http_connection(parts, reset=True)
+            raise RetryableFetchError(str(e))
+
+def fetch_ckw_data(target_date):
+    """Fetches raw JSON (grid usage) from the CKW API."""
+    entry = fetch_ckw_entry(build_ckw_url(target_date), target_date)
+    return entry['data'] if entry else None
+
+def fetch_ckw_entry(full_url, target_date):
+    """Fetches one CKW URL -> cache entry {'data', 'sha256', ...} or None.
+    Keep-alive connection, timeout, bounded exponential backoff and a local
+    response cache (fresh entries skip the request, ETag/Last-Modified -> 304)."""
+    cached = load_cached_response(full_url, target_date)
+
+    if cached and time.time() - cached.get('fetched_at', 0) < FETCH_CACHE_FRESH_SEC:
+        print(f"[INFO] Using cached data for: {target_date}")
+        metric_count("fetch_cache", result="fresh")
+        return cached
+
     print(f"[INFO] Fetching Data for: {target_date}")
     # print(f"[DEBUG] URL: {full_url}") # Uncomment if debugging needed
 
-    try:
-        req = urllib.request.Request(full_url)
-        with urllib.request.urlopen(req) as response:
-            if response.status != 200:
-                print(f"[ERROR] HTTP Error {response.status}")
+    for attempt in range(FETCH_RETRIES + 1):
+        try:
+            with metric_timer("phase", phase="http"):
+                status, body, response = http_get(full_url, cached)
+            metric_count("http_responses", status=status)
+            if status == 304 and cached:
+                print(f"[INFO] {target_date}: Not modified (cache).")
+                metric_count("fetch_cache", result="not_modified")
+                cached['fetched_at'] = time.time()
+                save_cached_response(full_url, target_date, cached)
+                return cached
+            if status == 429 or status >= 500:
+                raise RetryableFetchError(f"HTTP Error {status}")
+            if status != 200:
+                print(f"[ERROR] HTTP Error {status}")
                 return None
-            return json.loads(response.read().decode())
-    except Exception as e:
-        print(f"[ERROR] API Request Failed: {e}")
-        return None
+
+            with metric_timer("phase", phase="json_parse"): data = json.loads(body.decode())
+            metric_count("http_bytes", len(body))
+            digest = hashlib.sha256(body).hexdigest()
+            if cached and cached.get('sha256') == digest:
+                print(f"[INFO] {target_date}: Unchanged since last fetch.")
+            entry = {
+                "url": full_url,
+                "etag": response.getheader("ETag"),
+                "last_modified": response.getheader("Last-Modified"),
+                "sha256": digest,
+                "fetched_at": time.time(),
+                "data": data
+            }
+            save_cached_response(full_url, target_date, entry)
+            return entry
+        except RetryableFetchError as e:
+            metric_count("fetch_errors", kind="retryable")
+            if attempt >= FETCH_RETRIES:
+                print(f"[ERROR] API Request Failed after {attempt + 1} attempts: {e}")
+                break
+            delay = min(FETCH_BACKOFF_SEC * (2 ** attempt), FETCH_BACKOFF_MAX_SEC) * random.uniform(0.8, 1.2)
+            print(f"[WARN] {target_date}: {e}. Retry {attempt + 1}/{FETCH_RETRIES} in {delay:.1f}s.")
+            metric_count("fetch_retries")
+            with metric_timer("phase", phase="backoff"): time.sleep(delay)
+        except Exception as e:
+            print(f"[ERROR] API Request Failed: {e}")
+            break
+
+    # Network is down but we still have an older answer: better than no plan
+    if cached:
+        print(f"[WARN] {target_date}: Using stale cached data.")
+        metric_count("fetch_cache", result="stale")
+        return cached
+    return None
 
 # ==============================================================================
-# 4. PROCESSING LOGIC
+# 3b. PRICE PROVIDERS (NORMALIZED, CACHED PER PROVIDER AND DATE)
 # ==============================================================================
+# A provider turns one source into a normalized slot series of a date:
+#   {"epochs": [UTC start], "offsets": [UTC offset min], "values": [Rp/kWh], "resolution_sec": n}
+# PROVIDER_TYPES maps a type to fetch(conf, date, cached) -> (source_key, raw)
+# (raw None = unchanged, reuse the cached series; None = failed) and
+# parse(conf, raw, date) -> series. Series are cached on disk per (provider,
+# date) together with their source key (content hash / file mtime), so an
+# unchanged source is neither fetched nor parsed again. The plan price is the
+# composite of PRICE_COMPONENTS, summed in one merge pass per component on the
+# slots of the first one (coarser series cover several finer slots).
 
-def process_schedule(raw_data, target_date):
-    """Parses CKW JSON and calculates 1-20 Tiers."""
+_series_memo = {}   # (provider, date) -> series, shared by the fetch threads of one run
+
+try:
+    import zoneinfo
+    LOCAL_TZ = zoneinfo.ZoneInfo(LOCAL_TIMEZONE) if LOCAL_TIMEZONE else None
+except Exception: LOCAL_TZ = None # no tz database -> system local time
+
+_slot_tz = {}       # UTC offset (min) -> tzinfo, for the timeline keys
+_slot_starts = {}   # source timestamp -> (epoch, offset, date); the same slots come back every run
+_slot_keys = {}     # (epoch, offset) -> source timestamp, so the timeline keeps the source spelling
+
+def format_slot_key(epoch, offset_min):
+    """Timeline key: local ISO time with its UTC offset (like the CKW 'start_timestamp')."""
+    key = _slot_keys.get((epoch, offset_min))
+    if key: return key
+    tz = _slot_tz.get(offset_min) or _slot_tz.setdefault(offset_min, datetime.timezone(datetime.timedelta(minutes=offset_min)))
+    return datetime.datetime.fromtimestamp(epoch, tz).isoformat()
+
+def parse_slot_start(ts):
+    """ISO time -> (UTC epoch, offset min, local date). Times without an offset are
+    LOCAL_TIMEZONE (like the executor's parse_iso_key); the timeline keeps their spelling."""
+    start = _slot_starts.get(ts)
+    if start: return start
+    dt = datetime.datetime.fromisoformat(ts)
+    if dt.tzinfo is None: dt = dt.replace(tzinfo=LOCAL_TZ) if LOCAL_TZ else dt.astimezone()
+    offset = dt.utcoffset()
+    if len(_slot_starts) > 100000: _slot_starts.clear(); _slot_keys.clear()
+    start = _slot_starts[ts] = (int(dt.timestamp()), int(offset.total_seconds() // 60), dt.date())
+    _slot_keys[start[:2]] = ts
+    return start
+
+def make_series(slots):
+    """[(epoch, offset min, Rp)] -> normalized series (sorted by epoch, the last value per start wins)."""
+    by_epoch = {t: (off, value) for t, off, value in slots}
+    epochs = sorted(by_epoch)
+    steps = [b - a for a, b in zip(epochs, epochs[1:])]
+    return {"epochs": epochs, "offsets": [by_epoch[t][0] for t in epochs], "values": [by_epoch[t][1] for t in epochs],
+            "resolution_sec": min(steps) if steps else 900}
+
+def parse_ckw_slots(conf, raw_data, target_date=None):
+    """CKW shaped JSON: item -> <field> -> [ { value: CHF/kWh } ] -> [(epoch, offset, Rp)].
+    A slot without a value counts 0. With target_date only slots of that local date."""
     if not raw_data or 'prices' not in raw_data:
         print("[ERROR] Invalid JSON format (missing 'prices').")
         return None
-
-    valid_slots = []
-    
-    # 1. Parse Prices
+    field = conf.get('field', conf.get('tariff_type', 'grid_usage'))
+    slots = []
     for item in raw_data['prices']:
         try:
-            # CKW Structure: item -> grid_usage -> [ { value: X } ]
-            usage_list = item.get('grid_usage', [])
+            usage_list = item.get(field, [])
             price_val = 0.0
-            
-            if usage_list and len(usage_list) > 0:
-                raw_val = usage_list[0].get('value')
-                if raw_val is not None:
-                    # Convert CHF to Rappen (e.g. 0.05 CHF -> 5.0 Rp)
-                    price_val = float(raw_val) * 100
-            
+            if usage_list and usage_list[0].get('value') is not None:
+                price_val = float(usage_list[0]['value']) * 100 # CHF -> Rappen
             ts = item.get('start_timestamp')
-            
-            if ts:
-                valid_slots.append({'ts': ts, 'price': price_val})
-                
-        except Exception as e:
+            start = ts and parse_slot_start(ts)
+            if start and (target_date is None or start[2] == target_date): slots.append((start[0], start[1], price_val))
+        except Exception: continue
+    return slots
+
+def parse_ckw_series(conf, raw_data, target_date):
+    slots = parse_ckw_slots(conf, raw_data)
+    return make_series(slots) if slots is not None else None
+
+def fetch_ckw_source(conf, target_date, cached):
+    if cached and time.time() - cached.get('fetched_at', 0) < FETCH_CACHE_FRESH_SEC: return cached['source'], None
+    entry = fetch_ckw_entry(build_ckw_url(target_date, conf.get('tariff_type', 'grid_usage'), conf.get('tariff_name', 'home_dynamic')), target_date)
+    return (entry.get('sha256'), entry['data']) if entry else None
+
+def parse_file_series(conf, text, target_date):
+    """CSV lines 'start_timestamp,value' (ISO, without offset = LOCAL_TIMEZONE; ';' works too, header optional)
+    or a CKW shaped JSON answer. Only slots of the target date (local) are kept."""
+    if text.lstrip().startswith("{"):
+        slots = parse_ckw_slots(conf, json.loads(text), target_date)
+        return make_series(slots) if slots is not None else None
+    scale = 100 if conf.get('unit') == "CHF_kWh" else 1
+    slots, skipped = [], 0
+    for line in text.splitlines():
+        cells = [c.strip() for c in line.replace(";", ",").split(",")]
+        if len(cells) < 2 or not cells[0] or cells[0].startswith("#"): continue
+        try:
+            start = parse_slot_start(cells[0])
+            value = float(cells[1]) * scale
+        except ValueError:
+            skipped += 1 # header or broken line
+            continue
+        if start[2] == target_date: slots.append((start[0], start[1], value))
+    if skipped > 1: print(f"[WARN] {conf['path']}: {skipped} lines skipped (no ISO time / number).")
+    return make_series(slots)
+
+def fetch_file_source(conf, target_date, cached):
+    fpath = target_date.strftime(conf['path'])
+    try: st = os.stat(fpath)
+    except OSError as e:
+        print(f"[ERROR] Price file: {e}")
+        return None
+    source = f"{fpath}:{st.st_mtime_ns}:{st.st_size}"
+    if cached and cached.get('source') == source: return source, None
+    with open(fpath, encoding="utf-8") as f: return source, f.read()
+
+PROVIDER_TYPES = {
+    "ckw": (fetch_ckw_source, parse_ckw_series),
+    "file": (fetch_file_source, parse_file_series),
+}
+
+def get_series_cache_path(name, target_date):
+    return os.path.join(PROVIDER_CACHE_DIR, f"{name}_{target_date}.json")
+
+def get_provider_series(name, target_date):
+    """Normalized series of one provider and date (memo -> disk cache -> fetch + parse). None if unavailable."""
+    key = (name, target_date)
+    if key in _series_memo: return _series_memo[key]
+    conf = PRICE_PROVIDERS[name]
+    fetch, parse = PROVIDER_TYPES[conf['type']]
+    conf_key = json.dumps(conf, sort_keys=True)
+    try:
+        with open(get_series_cache_path(name, target_date)) as f: cached = json.load(f)
+        if cached.get('conf') != conf_key: cached = None # provider settings changed
+    except Exception: cached = None
+
+    try: result = fetch(conf, target_date, cached)
+    except Exception as e:
+        print(f"[ERROR] {name} {target_date}: {e}")
+        result = None
+    if result is None:
+        if not cached: return None
+        print(f"[WARN] {name} {target_date}: Using the cached series.")
+        metric_count("provider_cache", provider=name, result="stale")
+        series = cached['series']
+    else:
+        source, raw = result
+        if cached and cached['source'] == source:
+            metric_count("provider_cache", provider=name, result="hit")
+            series = cached['series']
+        else:
+            with metric_timer("phase", phase="parse", provider=name): series = parse(conf, raw, target_date)
+            metric_count("provider_cache", provider=name, result="miss")
+            if not series or not series['epochs']: return None
+        if raw is not None or not cached:
+            try:
+                os.makedirs(PROVIDER_CACHE_DIR, exist_ok=True)
+                tmp_path = get_series_cache_path(name, target_date) + f".tmp.{threading.get_ident()}"
+                with open(tmp_path, 'w') as f: json.dump({"provider": name, "date": str(target_date), "conf": conf_key, "source": source,
+                                                          "fetched_at": time.time(), "series": series}, f)
+                os.replace(tmp_path, get_series_cache_path(name, target_date))
+            except Exception as e: print(f"[WARN] Could not write provider cache: {e}")
+    _series_memo[key] = series
+    return series
+
+def build_composite_series(target_date, components=None):
+    """Sum of sign * provider price on the slots of the first component. A slot that a required
+    component does not cover is dropped, an optional component counts 0 there."""
+    components = components or PRICE_COMPONENTS
+    parts = [(c, get_provider_series(c['provider'], target_date)) for c in components]
+    base_conf, base = parts[0]
+    if not base:
+        print(f"[ERROR] No prices from {base_conf['provider']} for {target_date}.")
+        return None
+    values = [base_conf.get('sign', 1) * v for v in base['values']]
+    keep = [True] * len(values)
+    for conf, series in parts[1:]:
+        sign, optional = conf.get('sign', 1), conf.get('optional', False)
+        if not series:
+            if not optional:
+                print(f"[ERROR] No prices from {conf['provider']} for {target_date}.")
+                return None
             continue
+        # Merge pass: both series are sorted by epoch
+        epochs, comp_values, res = series['epochs'], series['values'], series['resolution_sec']
+        j, missing = 0, 0
+        for i, t in enumerate(base['epochs']):
+            while j + 1 < len(epochs) and epochs[j + 1] <= t: j += 1
+            if epochs[j] <= t < epochs[j] + res: values[i] += sign * comp_values[j]
+            elif not optional:
+                keep[i] = False
+                missing += 1
+        if missing: print(f"[WARN] {target_date}: {missing} slots without a {conf['provider']} price dropped.")
+    composite = {"epochs": [t for t, k in zip(base['epochs'], keep) if k], "offsets": [o for o, k in zip(base['offsets'], keep) if k],
+                 "values": [v for v, k in zip(values, keep) if k], "resolution_sec": base['resolution_sec'],
+                 "components": [f"{'+' if c.get('sign', 1) >= 0 else '-'}{c['provider']}" for c in components]}
+    cap_series = dict((c['provider'], series) for c, series in parts).get(HARD_CAP_COMPONENT)
+    if cap_series: composite['cap_values'] = [v for v, k in zip(align_series(cap_series, base['epochs']), keep) if k]
+    elif HARD_CAP_COMPONENT: print(f"[WARN] {target_date}: no {HARD_CAP_COMPONENT} prices, the hard cap applies to the composite price.")
+    return composite
+
+def align_series(series, epochs):
+    """Price of 'series' at every start in 'epochs' (sorted); 0 where it has no slot."""
+    values, res, j = [], series['resolution_sec'], 0
+    for t in epochs:
+        while j + 1 < len(series['epochs']) and series['epochs'][j + 1] <= t: j += 1
+        values.append(series['values'][j] if series['epochs'][j] <= t < series['epochs'][j] + res else 0)
+    return values
+
+def fetch_price_days(dates):
+    """Composite price series per date -> {date: series or None}. All (provider, date) pairs are fetched concurrently."""
+    _series_memo.clear()
+    tasks = [(c['provider'], d) for d in dates for c in PRICE_COMPONENTS]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(FETCH_WORKERS, len(tasks)))) as pool:
+        list(pool.map(lambda task: get_provider_series(*task), tasks))
+    with metric_timer("phase", phase="composite"): return {d: build_composite_series(d) for d in dates}
+
+# ==============================================================================
+# 4. PROCESSING LOGIC
+# ==============================================================================
+
+def rank_prices(prices, method=None, blocked=None):
+    """Percentile (0-100) of every price among all prices <= HARD_CAP_RP
+    (or not in 'blocked', a flag per price, see HARD_CAP_COMPONENT).
+    One sort + one pass over a rank map (O(n log n)). Capped prices -> None."""
+    method = method or PERCENTILE_METHOD
+    if method not in ("min", "mean", "max"):
+        raise ValueError(f"Unknown PERCENTILE_METHOD '{method}'")
+    if blocked is None: blocked = [p > HARD_CAP_RP for p in prices]
+
+    below_cap = sorted(p for p, b in zip(prices, blocked) if not b)
+    total = len(below_cap)
+
+    # Rank map: price -> rank of its first/last occurrence in the sorted list
+    rank_map = {}
+    for idx, price in enumerate(below_cap):
+        if price in rank_map: rank_map[price][1] = idx
+        else: rank_map[price] = [idx, idx]
+
+    percentiles = []
+    for price, is_blocked in zip(prices, blocked):
+        if is_blocked or total == 0:
+            percentiles.append(None)
+            continue
+        if price not in rank_map: # e.g. NaN
+            percentiles.append(100.0)
+            continue
+        first, last = rank_map[price]
+        if method == "min": rank = first
+        elif method == "max": rank = last
+        else: rank = (first + last) / 2
+        percentiles.append((rank / total) * 100)
+    return percentiles
+
+def compute_tiers(prices, tier_count=None, method=None, blocked=None):
+    """Maps every price to a tier (1..tier_count). Above the hard cap -> 99."""
+    tier_count = tier_count or TIER_COUNT
+    tier_width = 100 / tier_count
+    tiers = []
+    for percentile in rank_prices(prices, method, blocked):
+        if percentile is None:
+            tiers.append(99) # Blocked by hard cap (or no valid price at all)
+            continue
+        tier = math.floor(percentile / tier_width) + 1
+        if tier > tier_count: tier = tier_count
+        tiers.append(tier)
+    return tiers
+
+def process_schedule(raw_data, target_date):
+    """Parses CKW JSON (grid usage only) and calculates 1-TIER_COUNT Tiers (default 1-20)."""
+    return build_schedule(parse_ckw_series(PRICE_PROVIDERS.get("ckw_grid", {}), raw_data, target_date), target_date)
+
+def build_schedule(series, target_date):
+    """Normalized (composite) price series -> plan with 1-TIER_COUNT Tiers (default 1-20)."""
+    if series is None: return None
+    valid_slots = [{'ts': format_slot_key(t, o), 'price': v} for t, o, v in zip(series['epochs'], series['offsets'], series['values'])]
 
     if not valid_slots:
         print("[ERROR] No valid price slots extracted.")
         return None
 
-    # 2. Calculate Tiers
-    # Filter valid prices (<= Hard Cap) for percentile calculation
-    prices_below_cap = [s['price'] for s in valid_slots if s['price'] <= HARD_CAP_RP]
-    prices_below_cap.sort()
-    total_valid = len(prices_below_cap)
-    
+    # 2. Calculate Tiers (single sorted pass over all slots), hard cap on the cap component's price
+    prices = [s['price'] for s in valid_slots]
+    blocked = [p > HARD_CAP_RP for p in series.get('cap_values', prices)]
+    with metric_timer("phase", phase="tiers"): tiers = compute_tiers(prices, blocked=blocked)
+    metric_gauge("slots", len(valid_slots), date=target_date)
+    metric_gauge("price_min_rp", min(prices), date=target_date)
+    metric_gauge("price_max_rp", max(prices), date=target_date)
+    metric_gauge("blocked_slots", sum(blocked), date=target_date)
+
     timeline = {}
     
-    for slot in valid_slots:
+    for slot, tier, is_blocked in zip(valid_slots, tiers, blocked):
         price = slot['price']
         ts = slot['ts']
         
         # Determine Status
-        if price > HARD_CAP_RP:
-            status = "BLOCKED"
-            tier = 99
-        else:
-            status = "ALLOWED"
-            # Calculate Dynamic Tier (1-20)
-            if total_valid > 0:
-                try:
-                    rank = prices_below_cap.index(price)
-                    percentile = (rank / total_valid) * 100
-                    # Map 0-100% to Tier 1-20
-                    tier = math.floor(percentile / 5) + 1
-                    if tier > 20: tier = 20
-                except ValueError:
-                    tier = 20 # Should not happen
-            else:
-                tier = 99 # Fallback
+        status = "BLOCKED" if is_blocked else "ALLOWED"
         
         timeline[ts] = {
             "price_rp": round(price, 4),
@@ -216,17 +705,297 @@ def process_schedule(raw_data, target_date):
             "generated_at": datetime.datetime.now().isoformat(),
             "profile_mode": "WEEKEND" if is_offpeak else "STANDARD",
             "calendar_reason": reason,
-            "hard_cap_rp": HARD_CAP_RP
+            "hard_cap_rp": HARD_CAP_RP,
+            "hard_cap_component": HARD_CAP_COMPONENT if 'cap_values' in series else "",
+            "resolution_min": series['resolution_sec'] // 60,
+            "price_components": series.get('components', ["+ckw_grid"])
         },
         "timeline": timeline
     }
 
+# ==============================================================================
+# 4b. BINARY TIMELINE OUTPUT
+# ==============================================================================
+# Layout (little endian, must match executor_15min.py):
+#   Header: magic 'PSTL', version, record size, record count, profile_mode (16 bytes)
+#   Record: UTC epoch start (int64), UTC offset in minutes (int16),
+#           price_rp (float64), tier (uint8), status (uint8: 0=ALLOWED, 1=BLOCKED)
+
+BIN_MAGIC = b"PSTL"
+BIN_VERSION = 1
+BIN_HEADER_FMT = "<4sHHI16s"
+BIN_RECORD_FMT = "<qhdBB"
+BIN_STATUS_CODES = {"ALLOWED": 0, "BLOCKED": 1}
+
+def encode_binary_timeline(schedule):
+    """Packs a processed schedule into the fixed-width record format."""
+    records = []
+    for ts, slot in schedule['timeline'].items():
+        try:
+            dt = datetime.datetime.fromisoformat(ts)
+        except ValueError:
+            continue
+        offset = dt.utcoffset()
+        if offset is None: continue # naive keys cannot be placed on the epoch axis
+        records.append((int(dt.timestamp()), int(offset.total_seconds() // 60), slot))
+    records.sort(key=lambda r: r[0])
+
+    rec_size = struct.calcsize(BIN_RECORD_FMT)
+    profile = schedule['metadata'].get('profile_mode', 'STANDARD').encode('ascii')[:16]
+    out = bytearray(struct.pack(BIN_HEADER_FMT, BIN_MAGIC, BIN_VERSION, rec_size, len(records), profile))
+    for epoch, offset_min, slot in records:
+        out += struct.pack(BIN_RECORD_FMT, epoch, offset_min, slot['price_rp'],
+                           min(slot['tier'], 255), BIN_STATUS_CODES.get(slot['status'], 1))
+    return bytes(out)
+
+def write_binary_timeline(schedule, fpath):
+    """Atomic write (temp + rename) so the executor never sees a half file."""
+    tmp_path = fpath + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(encode_binary_timeline(schedule))
+    os.replace(tmp_path, fpath)
+
+# ==============================================================================
+# 4c. PRICE ARCHIVE (SQLITE, EPOCH INDEXED)
+# ==============================================================================
+# One row per slot, keyed by its UTC start epoch (rowid -> range scans are
+# index lookups). Local weekday / minute-of-day are stored for fast filters.
+# Old slots are downsampled to hourly averages (keeping the worst tier and
+# blocked flag of the hour), very old rows are dropped.
+
+ARCHIVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS slots (
+    epoch INTEGER PRIMARY KEY,      -- UTC start of the slot
+    offset_min INTEGER NOT NULL,    -- UTC offset of the local time
+    weekday INTEGER NOT NULL,       -- local, 0=Monday
+    local_minute INTEGER NOT NULL,  -- local minute of day (0-1439)
+    resolution_min INTEGER NOT NULL,
+    price_rp REAL NOT NULL,
+    tier INTEGER NOT NULL,
+    blocked INTEGER NOT NULL
+);
+"""
+
+def open_archive():
+    new_db = not os.path.exists(ARCHIVE_FILE)
+    conn = sqlite3.connect(ARCHIVE_FILE, timeout=30)
+    if new_db: conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    # Rollback journal, not WAL: the archive usually lives on the /mnt/user FUSE share,
+    # where WAL's shared memory file is unsafe. One writer a day gains nothing from WAL;
+    # an archive created as WAL by an older version is switched back here.
+    conn.execute("PRAGMA journal_mode = DELETE")
+    conn.executescript(ARCHIVE_SCHEMA)
+    return conn
+
+def archive_schedule(schedule):
+    """Upserts all slots of a processed schedule. Returns the number of rows."""
+    rows = []
+    for ts, slot in schedule['timeline'].items():
+        try: epoch, offset, _ = parse_slot_start(ts) # keys without an offset are LOCAL_TIMEZONE
+        except ValueError: continue
+        local = epoch + offset * 60
+        rows.append([epoch, offset, (local // 86400 + 3) % 7, local % 86400 // 60, # 1970-01-01 = Thursday
+                     None, slot['price_rp'], slot['tier'], int(slot['status'] != "ALLOWED")])
+    if not rows: return 0
+    # Resolution: from the plan (series resolution), else the smallest slot spacing (older plans)
+    resolution_min = schedule.get('metadata', {}).get('resolution_min')
+    if not resolution_min:
+        epochs = sorted(row[0] for row in rows)
+        resolution_min = min((b - a for a, b in zip(epochs, epochs[1:])), default=900) // 60 or 15
+    for row in rows: row[4] = resolution_min
+    conn = open_archive()
+    try:
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO slots VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    finally: conn.close()
+    return len(rows)
+
+def compact_archive(now=None):
+    """Downsamples slots older than ARCHIVE_FULL_RES_DAYS to hourly averages and
+    drops rows older than ARCHIVE_RETENTION_DAYS. Keeps the file size bounded."""
+    now = now or time.time()
+    full_res_cutoff = int(now - ARCHIVE_FULL_RES_DAYS * 86400) // 3600 * 3600
+    retention_cutoff = int(now - ARCHIVE_RETENTION_DAYS * 86400)
+    conn = open_archive()
+    try:
+        with conn:
+            dropped = conn.execute("DELETE FROM slots WHERE epoch < ?", (retention_cutoff,)).rowcount
+            hourly = conn.execute("""
+                SELECT (epoch / 3600) * 3600 AS hour, MIN(offset_min), MIN(weekday), MIN(local_minute) / 60 * 60,
+                       AVG(price_rp), MAX(tier), MAX(blocked)
+                FROM slots WHERE epoch < ? AND resolution_min < 60
+                GROUP BY hour""", (full_res_cutoff,)).fetchall()
+            if hourly:
+                conn.execute("DELETE FROM slots WHERE epoch < ? AND resolution_min < 60", (full_res_cutoff,))
+                conn.executemany("INSERT OR REPLACE INTO slots VALUES (?, ?, ?, ?, 60, ?, ?, ?)",
+                                 [(h, off, wd, lm, round(p, 4), tier, blk) for h, off, wd, lm, p, tier, blk in hourly])
+        conn.execute("PRAGMA incremental_vacuum")
+    finally: conn.close()
+    return dropped, len(hourly)
+
+def query_archive(start_date, end_date, weekdays=None, hours=None):
+    """All archived slots with start_date <= local date <= end_date.
+    weekdays: iterable of 0-6 (Monday=0), hours: iterable of local hours.
+    Returns [(epoch, offset_min, weekday, local_minute, resolution_min, price_rp, tier, blocked), ...]."""
+    # Range on the epoch index (+/- 1 day margin for the UTC offset), exact filter on local fields
+    start = int(datetime.datetime.combine(start_date, datetime.time()).replace(tzinfo=datetime.timezone.utc).timestamp()) - 86400
+    end = int(datetime.datetime.combine(end_date + datetime.timedelta(days=1), datetime.time()).replace(tzinfo=datetime.timezone.utc).timestamp()) + 86400
+    sql = "SELECT * FROM slots WHERE epoch >= ? AND epoch < ?"
+    params = [start, end]
+    if weekdays is not None:
+        weekdays = sorted(set(weekdays))
+        sql += f" AND weekday IN ({','.join('?' * len(weekdays))})"
+        params += weekdays
+    if hours is not None:
+        hours = sorted(set(hours))
+        sql += f" AND local_minute / 60 IN ({','.join('?' * len(hours))})"
+        params += hours
+    conn = open_archive()
+    try: rows = conn.execute(sql + " ORDER BY epoch", params).fetchall()
+    finally: conn.close()
+
+    result = []
+    for row in rows:
+        local_date = datetime.datetime.fromtimestamp(row[0] + row[1] * 60, datetime.timezone.utc).date()
+        if start_date <= local_date <= end_date: result.append(row)
+    return result
+
+def parse_int_ranges(text):
+    """'0-4,6' -> [0, 1, 2, 3, 4, 6]"""
+    values = []
+    for part in text.split(","):
+        lo, _, hi = part.partition("-")
+        values.extend(range(int(lo), int(hi or lo) + 1))
+    return values
+
+def archive_query_cli(args):
+    """power_planner.py --archive-query FROM TO [--weekdays 0-4] [--hours 0-5] [--csv]"""
+    import argparse
+    parser = argparse.ArgumentParser(prog="power_planner.py --archive-query")
+    parser.add_argument("start", type=datetime.date.fromisoformat)
+    parser.add_argument("end", type=datetime.date.fromisoformat)
+    parser.add_argument("--weekdays", type=parse_int_ranges, help="e.g. 0-4 (Mon-Fri)")
+    parser.add_argument("--hours", type=parse_int_ranges, help="local hours, e.g. 0-5")
+    parser.add_argument("--csv", action="store_true", help="print all slots as CSV")
+    opts = parser.parse_args(args)
+    if not os.path.exists(ARCHIVE_FILE):
+        print(f"[ERROR] No archive found at {ARCHIVE_FILE}")
+        sys.exit(1)
+
+    rows = query_archive(opts.start, opts.end, opts.weekdays, opts.hours)
+    if opts.csv:
+        print("start_local,resolution_min,price_rp,tier,blocked")
+        for epoch, offset_min, _, _, res, price, tier, blocked in rows:
+            local = datetime.datetime.fromtimestamp(epoch + offset_min * 60, datetime.timezone.utc).replace(tzinfo=None)
+            print(f"{local.isoformat()},{res},{price},{tier},{blocked}")
+        return
+    if not rows:
+        print("[INFO] No archived slots in range.")
+        return
+    prices = [r[5] for r in rows]
+    print(f"[ARCHIVE] {opts.start} .. {opts.end}: {len(rows)} slots")
+    print(f"  > Avg {sum(prices) / len(prices):.3f} Rp | Min {min(prices):.3f} | Max {max(prices):.3f} | Blocked {sum(r[7] for r in rows)}")
+
+# ==============================================================================
+# 4d. PRICE FORECAST (WEEKDAY x SLOT PROFILE)
+# ==============================================================================
+# Recency weighted mean price per (local weekday, 15 min slot), shrunk towards
+# the all-days mean of the slot when a weekday has few samples. 7 x 96 values,
+# written as a small JSON table; the executor reads it once per tick and looks
+# up slots past the last published one in O(1).
+
+FORECAST_VERSION = 1
+SLOTS_PER_DAY = 96
+
+def train_forecast(rows, until_date, history_days=None, half_life_days=None):
+    """Archive rows (see query_archive) of the days before until_date -> forecast dict, None without data."""
+    history_days = history_days or FORECAST_HISTORY_DAYS
+    half_life_days = half_life_days or FORECAST_HALF_LIFE_DAYS
+    wd_sum = [[0.0] * SLOTS_PER_DAY for _ in range(7)]
+    wd_weight = [[0.0] * SLOTS_PER_DAY for _ in range(7)]
+    all_sum, all_weight = [0.0] * SLOTS_PER_DAY, [0.0] * SLOTS_PER_DAY
+    days = set()
+    for epoch, offset_min, weekday, local_minute, resolution_min, price, tier, blocked in rows:
+        local_date = datetime.datetime.fromtimestamp(epoch + offset_min * 60, datetime.timezone.utc).date()
+        age = (until_date - local_date).days
+        if not 0 < age <= history_days: continue
+        days.add(local_date)
+        w = 0.5 ** ((age - 1) / half_life_days)
+        for k in range(max(1, resolution_min // 15)): # hourly rows cover 4 slots
+            slot = local_minute // 15 + k
+            if slot >= SLOTS_PER_DAY: break
+            wd_sum[weekday][slot] += w * price
+            wd_weight[weekday][slot] += w
+            all_sum[slot] += w * price
+            all_weight[slot] += w
+    if not days: return None
+
+    mean = sum(all_sum) / sum(all_weight)
+    slot_mean = [all_sum[s] / all_weight[s] if all_weight[s] else mean for s in range(SLOTS_PER_DAY)]
+    prices = [[round((wd_sum[wd][s] + FORECAST_SHRINK * slot_mean[s]) / (wd_weight[wd][s] + FORECAST_SHRINK), 4)
+               for s in range(SLOTS_PER_DAY)] for wd in range(7)]
+    return {"version": FORECAST_VERSION, "trained_until": str(until_date - datetime.timedelta(days=1)),
+            "days": len(days), "mean_rp": round(mean, 4), "prices": prices}
+
+def build_forecast(until_date):
+    """Forecast from the archived days before until_date."""
+    start = until_date - datetime.timedelta(days=FORECAST_HISTORY_DAYS)
+    return train_forecast(query_archive(start, until_date - datetime.timedelta(days=1)), until_date)
+
+def write_forecast(forecast, fpath=None):
+    fpath = fpath or FORECAST_FILE
+    tmp_path = fpath + ".tmp"
+    with open(tmp_path, 'w') as f: json.dump(forecast, f)
+    os.replace(tmp_path, fpath)
+
+def forecast_report(end_date, test_days=14):
+    """Accuracy on held-out days, each predicted by a model trained only on the
+    days before it. Baselines: flat training mean, same slot 7 days earlier.
+    Returns {name: MAE in Rp} over all evaluated slots (empty without data)."""
+    errors = {"forecast": [], "flat_mean": [], "last_week": []}
+    print(f"{'day':<12} {'slots':>5} {'forecast':>9} {'flat':>9} {'last wk':>9}   (MAE Rp)")
+    for i in range(test_days - 1, -1, -1):
+        d = end_date - datetime.timedelta(days=i)
+        model = build_forecast(d)
+        actual = query_archive(d, d)
+        if not model or not actual: continue
+        week_ago = {}
+        for row in query_archive(d - datetime.timedelta(days=7), d - datetime.timedelta(days=7)):
+            week_ago.setdefault(row[3], row[5])
+        day_errors = {name: [] for name in errors}
+        for epoch, offset_min, weekday, local_minute, resolution_min, price, tier, blocked in actual:
+            day_errors["forecast"].append(abs(model['prices'][weekday][local_minute // 15] - price))
+            day_errors["flat_mean"].append(abs(model['mean_rp'] - price))
+            day_errors["last_week"].append(abs(week_ago.get(local_minute, model['mean_rp']) - price))
+        for name, values in day_errors.items(): errors[name].extend(values)
+        mae = {name: sum(v) / len(v) for name, v in day_errors.items()}
+        print(f"{str(d):<12} {len(actual):>5} {mae['forecast']:>9.3f} {mae['flat_mean']:>9.3f} {mae['last_week']:>9.3f}")
+    if not errors["forecast"]:
+        print("[INFO] Not enough archived days for a report.")
+        return {}
+    total = {name: sum(v) / len(v) for name, v in errors.items()}
+    print(f"{'total':<12} {len(errors['forecast']):>5} {total['forecast']:>9.3f} {total['flat_mean']:>9.3f} {total['last_week']:>9.3f}")
+    return total
+
+def forecast_report_cli(args):
+    """power_planner.py --forecast-report [--end DATE] [--days 14]"""
+    import argparse
+    parser = argparse.ArgumentParser(prog="power_planner.py --forecast-report")
+    parser.add_argument("--end", type=datetime.date.fromisoformat, default=datetime.date.today(), help="last held-out day")
+    parser.add_argument("--days", type=int, default=14, help="number of held-out days")
+    opts = parser.parse_args(args)
+    if not os.path.exists(ARCHIVE_FILE):
+        print(f"[ERROR] No archive found at {ARCHIVE_FILE}")
+        sys.exit(1)
+    forecast_report(opts.end, opts.days)
+
 # ==============================================================================
 # 5. MAIN EXECUTION
 # ==============================================================================
 
 def main():
     print("--- UNRAID POWER PLANNER (v6.3 Final) ---")
+    t_start = time.perf_counter()
     
     # 1. Ensure Directory
     if not os.path.exists(STORAGE_PATH):
@@ -238,7 +1007,7 @@ def main():
             sys.exit(1)
 
     # 2. Cleanup Old Files
-    cleanup_old_files()
+    with metric_timer("phase", phase="cleanup"): cleanup_old_files()
 
     # 3. Define Targets (Today + Tomorrow)
     today = datetime.date.today()
@@ -253,36 +1022,79 @@ def main():
         print(f"[WARN] Plan for TODAY ({today}) is missing. Adding to queue.")
         targets.insert(0, today)
     
-    # 4. Processing Loop
+    # 4. Fetch all targets concurrently (every price component)
+    with metric_timer("phase", phase="fetch_all"): fetched = fetch_price_days(targets)
+
+    # 5. Processing Loop
     for target_date in targets:
-        # Fetch
-        data = fetch_ckw_data(target_date)
+        data = fetched.get(target_date)
         
         if data:
             # Process
-            schedule = process_schedule(data, target_date)
+            with metric_timer("phase", phase="process"): schedule = build_schedule(data, target_date)
             
             if schedule:
                 # Save
                 fpath = os.path.join(STORAGE_PATH, target_date.strftime(FILENAME_FORMAT))
                 try:
-                    with open(fpath, 'w') as f:
-                        json.dump(schedule, f, indent=4)
-                    print(f"[SUCCESS] Schedule saved: {fpath}")
+                    with metric_timer("phase", phase="write"):
+                        with open(fpath, 'w') as f:
+                            json.dump(schedule, f, indent=4)
+                        print(f"[SUCCESS] Schedule saved: {fpath}")
+
+                        if WRITE_BINARY_TIMELINE:
+                            bpath = os.path.join(STORAGE_PATH, target_date.strftime(BINARY_FILENAME_FORMAT))
+                            write_binary_timeline(schedule, bpath)
+                            print(f"[SUCCESS] Binary timeline saved: {bpath}")
+                    metric_count("plans_written")
                     
+                    if ARCHIVE_ENABLED:
+                        try:
+                            with metric_timer("phase", phase="archive"): rows = archive_schedule(schedule)
+                            print(f"[SUCCESS] Archived {rows} slots: {ARCHIVE_FILE}")
+                        except Exception as e: print(f"[ERROR] Could not archive: {e}")
+
                     # Preview
                     meta = schedule['metadata']
                     print(f"  > Profile: {meta['profile_mode']} ({meta['calendar_reason']})")
-                    print(f"  > Hard Cap: {meta['hard_cap_rp']} Rp.")
+                    print(f"  > Hard Cap: {meta['hard_cap_rp']} Rp ({meta['hard_cap_component'] or 'composite price'}).")
                     
                 except Exception as e:
                     print(f"[ERROR] Could not write file: {e}")
             else:
                 print(f"[FAIL] Processing failed for {target_date}")
+                metric_count("plans_failed", stage="process")
         else:
-            print(f"[FAIL] API fetch failed for {target_date}")
+            print(f"[FAIL] No prices for {target_date}")
+            metric_count("plans_failed", stage="fetch")
+
+    # 6. Keep the archive bounded
+    if ARCHIVE_ENABLED:
+        try:
+            with metric_timer("phase", phase="compact"): compact_archive()
+        except Exception as e: print(f"[ERROR] Archive compaction failed: {e}")
+
+        # Forecast for the days after the published ones (trained up to tomorrow)
+        if FORECAST_ENABLED:
+            try:
+                with metric_timer("phase", phase="forecast"): forecast = build_forecast(tomorrow + datetime.timedelta(days=1))
+                if forecast:
+                    write_forecast(forecast)
+                    print(f"[SUCCESS] Forecast from {forecast['days']} days saved: {FORECAST_FILE}")
+            except Exception as e: print(f"[ERROR] Forecast failed: {e}")
+
+    # 7. Post-plan step (e.g. precompute the executor's decision table)
+    if POST_PLAN_COMMAND:
+        print(f"\n[POST] Running: {POST_PLAN_COMMAND}")
+        try:
+            with metric_timer("phase", phase="post_plan"): subprocess.run(POST_PLAN_COMMAND, shell=True, timeout=300)
+        except Exception as e: print(f"[ERROR] Post-plan command failed: {e}")
 
+    metric_gauge("run_seconds", round(time.perf_counter() - t_start, 6))
+    write_metrics()
     print("--- FINISHED ---")
 
 if __name__ == "__main__":
-    main()
+    if sys.argv[1:2] == ["--archive-query"]: archive_query_cli(sys.argv[2:])
+    elif sys.argv[1:2] == ["--forecast-report"]: forecast_report_cli(sys.argv[2:])
+    else: run_profiled(main)
@@ -0,0 +1,413 @@
+#!/usr/bin/python3
+"""
+==============================================================================
+ MASTER POWER SCRIPT - BACKTEST SIMULATOR (Development Tool)
+==============================================================================
+ Context:   Replays price timelines through the REAL executor decision logic
+            (check_optimization_logic / global plan) on a simulated clock.
+ Usage:     python3 simulator.py --synthetic-days 365
+            python3 simulator.py --archive /mnt/user/appdata/power_scheduler/price_archive.sqlite \\
+                                 --from 2025-01-01 --to 2025-12-31
+            python3 simulator.py --synthetic-days 365 --forecast --grid initial_runtime_min=240
+            python3 simulator.py --grid max_tier=3,5,10 --grid START_TOLERANCE_RP=0,0.1,0.3 \\
+                                 --grid Emby_Cache.max_interval_hours=28,36 --workers 4
+ Grid keys: UPPERCASE = executor constant, lowercase = field of every job,
+            <job_id>.<field> = field of one job
+ Output:    Per parameter set and job: runs, total Rp (for a 1 kW load),
+            avg Rp/kWh, deadline misses, start hour distribution.
+ Model:     Cron + supervisor semantics: decisions at every 15 min boundary and
+            when a group member finishes. The next day's plan becomes visible
+            at SIM_PUBLISH_HOUR (planner schedule). Jobs run initial_runtime_min
+            (or sim_runtime_min), scattered by a log-normal factor with
+            sigma sim_runtime_sigma (default 0 = exact, seeded per job).
+==============================================================================
+"""
+
+import argparse
+import bisect
+import contextlib
+import datetime
+import io
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import power_planner as planner
+import executor_15min as executor
+import fake_ckw_server
+
+try: import numpy as np
+except ImportError: np = None
+
+# ==============================================================================
+# 1. CONFIGURATION
+# ==============================================================================
+
+SIM_PUBLISH_HOUR = 13       # Planner run: tomorrow's plan is visible from this hour on
+SIM_TIMEZONE = "Europe/Zurich"
+
+# ==============================================================================
+# 2. PRICE DATA
+# ==============================================================================
+
+def get_sim_tz():
+    try:
+        import zoneinfo
+        return zoneinfo.ZoneInfo(SIM_TIMEZONE)
+    except Exception: return None
+
+def get_utc_offset_min(d, at=datetime.time(12)):
+    """UTC offset (minutes) of the planner's timezone on date d at local time 'at'."""
+    tz = get_sim_tz()
+    if not tz: return 60
+    return int(datetime.datetime.combine(d, at).replace(tzinfo=tz).utcoffset().total_seconds() // 60)
+
+def format_offset(off):
+    return f"{'+' if off >= 0 else '-'}{abs(off) // 60:02d}:{abs(off) % 60:02d}"
+
+def synthetic_entries(start_date, days):
+    """Timeline entries from the fake CKW generator, tiered by the real planner."""
+    entries = []
+    for i in range(days):
+        d = start_date + datetime.timedelta(days=i)
+        # Midnight to 23:45 local time: 92 / 100 slots on DST days, stamped with the local offset
+        payload = fake_ckw_server.generate_payload(f"{d}T00:00:00{format_offset(get_utc_offset_min(d, datetime.time(0)))}",
+                                                   f"{d}T23:45:00{format_offset(get_utc_offset_min(d, datetime.time(23, 45)))}")
+        tz = get_sim_tz()
+        if tz:
+            for price in payload['prices']:
+                price['start_timestamp'] = datetime.datetime.fromisoformat(price['start_timestamp']).astimezone(tz).isoformat()
+        with contextlib.redirect_stdout(io.StringIO()):
+            schedule = planner.process_schedule(payload, d)
+        if schedule: entries.extend(executor.parse_timeline_entries(schedule['timeline']))
+    return entries
+
+def archive_entries(archive_file, start_date, end_date):
+    """Timeline entries from the planner's SQLite archive (hourly rows -> 4 slots)."""
+    planner.ARCHIVE_FILE = archive_file
+    records = []
+    for epoch, offset_min, _, _, resolution_min, price, tier, blocked in planner.query_archive(start_date, end_date):
+        for k in range(max(1, resolution_min // 15)):
+            records.append((epoch + k * executor.SLOT_SEC, offset_min, price, tier, blocked))
+    return executor.entries_from_records(records)
+
+def get_day_types(start_date, end_date):
+    """profile_mode per date, as the planner writes it into the plan metadata."""
+    day_types = {}
+    d = start_date
+    while d <= end_date:
+        day_types[d.strftime('%Y-%m-%d')] = "WEEKEND" if planner.is_lucerne_holiday(d)[0] else "STANDARD"
+        d += datetime.timedelta(days=1)
+    return day_types
+
+def build_forecasts(price_index, first_date, last_date):
+    """Planner forecast (scaled, as the executor loads it) per 'trained until' date,
+    each trained only on the slots before that date."""
+    epochs = price_index['epochs']
+    rows = [(t, off, dt.weekday(), dt.hour * 60 + dt.minute, 15, slot['price_rp'], slot['tier'], 0)
+            for t, off, dt, slot in zip(epochs, price_index['offsets'], price_index['datetimes'], price_index['slots'])]
+    forecasts = {}
+    d = first_date
+    while d <= last_date:
+        midnight = datetime.datetime.combine(d, datetime.time())
+        lo = bisect.bisect_left(epochs, executor.local_epoch(midnight - datetime.timedelta(days=planner.FORECAST_HISTORY_DAYS)))
+        hi = bisect.bisect_left(epochs, executor.local_epoch(midnight))
+        model = planner.train_forecast(rows[lo:hi], d)
+        if model: forecasts[d] = [int(round(p * executor.PRICE_SCALE)) for day in model['prices'] for p in day]
+        d += datetime.timedelta(days=1)
+    return forecasts
+
+def slice_index(price_index, lo_epoch, hi_epoch):
+    """Slots with lo_epoch <= epoch < hi_epoch (same layout as the executor's index)."""
+    i = bisect.bisect_left(price_index['epochs'], lo_epoch)
+    j = bisect.bisect_left(price_index['epochs'], hi_epoch)
+    return {key: price_index[key][i:j] for key in ("epochs", "datetimes", "offsets", "slots", "scaled")}
+
+def get_visible_range(now):
+    """Plan days the executor can see at 'now': today, plus tomorrow after the planner ran."""
+    today = datetime.datetime.combine(now.date(), datetime.time())
+    days = 2 if now.hour >= SIM_PUBLISH_HOUR else 1
+    return executor.local_epoch(today), executor.local_epoch(today + datetime.timedelta(days=days))
+
+def get_actual_cost(price_index, start_dt, runtime_min):
+    """Rp paid by a 1 kW load running runtime_min from start_dt (known prices only)."""
+    epochs, slots = price_index['epochs'], price_index['slots']
+    t = executor.local_epoch(start_dt)
+    end = t + runtime_min * 60
+    cost = 0.0
+    while t < end:
+        i = bisect.bisect_right(epochs, t) - 1
+        if i >= 0 and t < epochs[i] + executor.SLOT_SEC:
+            seg_end = min(end, epochs[i] + executor.SLOT_SEC)
+            cost += slots[i]['price_rp'] * (seg_end - t) / 3600
+        else: # gap in the data: skip to the next known slot
+            seg_end = min(end, epochs[i + 1]) if i + 1 < len(epochs) else end
+        t = seg_end
+    return cost
+
+# ==============================================================================
+# 3. NUMPY WINDOW COSTS (OPTIONAL)
+# ==============================================================================
+# Same semantics as executor.get_window_costs (tolerance match, forecast or
+# penalty for missing slots, exact integer sums), one searchsorted over all
+# starts x steps.
+
+def numpy_window_costs(start_epochs, duration_min, price_index):
+    steps = max(1, int(math.ceil(duration_min / 15)))
+    arrays = price_index.get('_np')
+    if arrays is None:
+        arrays = price_index['_np'] = (np.asarray(price_index['epochs'], dtype=np.float64),
+                                       np.asarray(price_index['scaled'], dtype=np.int64))
+    epochs, scaled = arrays
+    penalty = int(round(executor.MISSING_SLOT_PENALTY_RP * executor.PRICE_SCALE))
+    if not len(epochs): return [penalty / executor.PRICE_SCALE] * len(start_epochs)
+
+    grid = np.asarray(start_epochs, dtype=np.float64)[:, None] + executor.SLOT_SEC * np.arange(steps)
+    idx = np.minimum(np.searchsorted(epochs, grid - executor.MATCH_TOLERANCE_SEC, side='right'), len(epochs) - 1)
+    valid = (epochs[idx] > grid - executor.MATCH_TOLERANCE_SEC) & (epochs[idx] < grid + executor.MATCH_TOLERANCE_SEC)
+    fill = penalty
+    if price_index.get('forecast'):
+        local = grid.astype(np.int64) + np.asarray(price_index['offsets'], dtype=np.int64)[idx] * 60
+        fill = np.asarray(price_index['forecast'], dtype=np.int64)[executor.get_forecast_slot(local)]
+    totals = np.where(valid, scaled[idx], fill).sum(axis=1)
+    return [int(v) / executor.PRICE_SCALE / steps for v in totals]
+
+# ==============================================================================
+# 4. REPLAY
+# ==============================================================================
+
+def simulate(price_index, day_types, jobs, start, end, forecasts=None):
+    """Replays [start, end) (local times) through the executor. Returns {job_id: stats}.
+    The clock runs on UTC epochs, so DST days are 23 h / 25 h long as on the real host.
+    forecasts: {trained until date: scaled forecast} (see build_forecasts), None = flat penalty."""
+    state = {}
+    running = {}     # job_id -> {'start': epoch, 'end': epoch, 'group': str|None}
+    stats = {job['id']: {"runs": 0, "hours": 0.0, "cost_rp": 0.0, "forced": 0, "missed": 0,
+                         "max_late_min": 0, "start_hours": [0] * 24} for job in jobs}
+    jobs = sorted(jobs, key=lambda x: x.get('order', 99))
+    rnd = {job['id']: random.Random(job['id']) for job in jobs}
+    slot = executor.SLOT_SEC
+    visible_key = visible = table = None
+
+    clock = [start]
+    executor.SIMULATED_CLOCK = lambda: clock[0]
+    executor.SCRIPTS_CONFIG = jobs # dependency edges ('after') are read from the config
+    t, t_end = executor.local_epoch(start), executor.local_epoch(end)
+    while t < t_end:
+        now = clock[0] = executor.epoch_to_local(t)
+        for s_id, run in list(running.items()):
+            if run['end'] <= t:
+                executor.record_runtime_sample(state, s_id, run['end'] - run['start'], executor.epoch_to_local(run['end']))
+                del running[s_id]
+
+        key = get_visible_range(now)
+        if key != visible_key:
+            visible_key, visible = key, slice_index(price_index, *key)
+            # The planner trains its forecast up to the last published day
+            visible['forecast'] = (forecasts or {}).get(executor.epoch_to_local(key[1]).date())
+            table = {"version": executor.INDEX_VERSION, "files_key": ["sim"] + list(key), "jobs": {}}
+        snapshot = executor.build_snapshot(now, visible, day_types, table['files_key'])
+        snapshot['decision_table'] = table
+
+        # Same flow as executor.evaluate_jobs(), without launching anything
+        active_groups = [run['group'] for run in running.values() if run['group']]
+        plan = {}
+        if executor.USE_GLOBAL_PLAN:
+            busy = [{'id': s_id, 'group': run['group'], 'start': time.time() - (t - run['start'])}
+                    for s_id, run in running.items()]
+            plan = executor.build_global_plan(jobs, state, snapshot, busy)
+        executor.prepare_dag(snapshot, state)
+        for job in jobs:
+            s_id, group = job['id'], job.get('group')
+            if s_id in running or (group and group in active_groups): continue
+            if not executor.decide_start(job, state, snapshot, plan, list(running)): continue
+
+            runtime_min = job.get('sim_runtime_min', job['initial_runtime_min'])
+            if job.get('sim_runtime_sigma'): runtime_min *= rnd[s_id].lognormvariate(0, job['sim_runtime_sigma'])
+            running[s_id] = {'start': t, 'end': t + runtime_min * 60, 'group': group}
+            if group: active_groups.append(group)
+            st = stats[s_id]
+            st['runs'] += 1
+            st['hours'] += runtime_min / 60
+            st['cost_rp'] += get_actual_cost(price_index, now, runtime_min)
+            st['start_hours'][now.hour] += 1
+            last_run = executor.get_last_run_epoch(state.get(s_id))
+            if last_run is not None:
+                late_min = (t - last_run) / 60 - job['max_interval_hours'] * 60
+                if late_min >= 0: st['forced'] += 1
+                if late_min >= 15: st['missed'] += 1
+                st['max_late_min'] = max(st['max_late_min'], int(late_min))
+
+        # Next event: a completion or the first slot boundary at which any job can decide
+        next_slot = executor.local_epoch(executor.get_next_slot_boundary(now))
+        wake = t_end
+        for job in jobs:
+            if job['id'] in running: continue
+            when, _ = executor.get_next_decision_time(job, state, snapshot)
+            when = max(executor.local_epoch(when), next_slot)
+            if when != next_slot: # ceil to the cron grid
+                when = next_slot + slot * math.ceil((when - next_slot) / slot)
+            wake = min(wake, when)
+        for run in running.values(): wake = min(wake, run['end'])
+        t = max(wake, t + 1)
+
+    executor.SIMULATED_CLOCK = None
+    for st in stats.values():
+        st['cost_rp'] = round(st['cost_rp'], 2)
+        st['avg_rp_kwh'] = round(st['cost_rp'] / st['hours'], 3) if st['hours'] else None
+        st['hours'] = round(st['hours'], 2)
+    return stats
+
+# ==============================================================================
+# 5. PARAMETER GRID
+# ==============================================================================
+
+_worker = {}
+
+def parse_value(text):
+    try: return json.loads(text)
+    except ValueError: return text
+
+def parse_grid(specs):
+    """['max_tier=3,5', 'DRY_RUN=true'] -> list of {key: value} combinations."""
+    axes = []
+    for spec in specs:
+        key, _, values = spec.partition("=")
+        if not key or not values: raise ValueError(f"Bad grid spec '{spec}' (expected key=v1,v2,...)")
+        axes.append([(key.strip(), parse_value(v.strip())) for v in values.split(",")])
+    return [dict(combo) for combo in itertools.product(*axes)]
+
+def check_params(jobs, params):
+    job_ids = {job['id'] for job in jobs}
+    for key in params:
+        if key.isupper() and not hasattr(executor, key): raise ValueError(f"Unknown executor constant '{key}'")
+        if not key.isupper() and "." in key and key.split(".", 1)[0] not in job_ids: raise ValueError(f"Unknown job in '{key}'")
+
+def apply_params(jobs, params):
+    """Executor constants + job fields for one parameter set. Returns the job list."""
+    check_params(jobs, params)
+    jobs = [dict(job) for job in jobs]
+    for key, value in params.items():
+        if key.isupper(): setattr(executor, key, value)
+        elif "." in key:
+            job_id, field = key.split(".", 1)
+            for job in jobs:
+                if job['id'] == job_id: job[field] = value
+        else:
+            for job in jobs: job[key] = value
+    return jobs
+
+def init_worker(price_index, day_types, jobs, start, end, use_numpy, forecasts=None):
+    _worker.update(price_index=price_index, day_types=day_types, jobs=jobs, start=start, end=end, forecasts=forecasts)
+    _worker['defaults'] = {name: getattr(executor, name) for name in dir(executor) if name.isupper()}
+    _worker['tmp'] = tempfile.mkdtemp(prefix="power_sim_")
+    executor.DRY_RUN = False # no [DEBUG] output
+    executor.PLANNER_PATH = _worker['tmp']
+    executor.DECISION_TABLE_FILE = "" # tables stay in memory
+    _worker['defaults'].update(DRY_RUN=False, PLANNER_PATH=executor.PLANNER_PATH,
+                               DECISION_TABLE_FILE=executor.DECISION_TABLE_FILE)
+    if use_numpy: executor.get_window_costs = numpy_window_costs
+
+def run_params(params):
+    """Worker: one simulation for one parameter set."""
+    for name, value in _worker['defaults'].items(): setattr(executor, name, value)
+    jobs = apply_params(_worker['jobs'], params)
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        stats = simulate(_worker['price_index'], _worker['day_types'], jobs, _worker['start'], _worker['end'], _worker['forecasts'])
+    return {"params": params, "elapsed_sec": round(time.perf_counter() - t0, 3), "jobs": stats}
+
+def run_grid(price_index, day_types, jobs, start, end, combos, workers=1, use_numpy=False, forecasts=None):
+    init_args = (price_index, day_types, jobs, start, end, use_numpy, forecasts)
+    if workers <= 1 or len(combos) <= 1:
+        init_worker(*init_args)
+        return [run_params(p) for p in combos]
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=init_args) as pool:
+        return list(pool.map(run_params, combos))
+
+# ==============================================================================
+# 6. MAIN
+# ==============================================================================
+
+def format_hours(start_hours):
+    """Compact start hour histogram: 'h:count' for every hour with starts."""
+    return " ".join(f"{h}:{c}" for h, c in enumerate(start_hours) if c) or "-"
+
+def print_report(results):
+    for result in results:
+        params = ", ".join(f"{k}={v}" for k, v in result['params'].items()) or "(current config)"
+        print(f"\n> {params}   [{result['elapsed_sec']:.2f} s]")
+        print(f"  {'job':<20} {'runs':>5} {'total Rp':>9} {'Rp/kWh':>7} {'forced':>6} {'missed':>6} {'max late':>8}  start hours")
+        for job_id, st in result['jobs'].items():
+            avg = f"{st['avg_rp_kwh']:.2f}" if st['avg_rp_kwh'] is not None else "-"
+            print(f"  {job_id:<20} {st['runs']:>5} {st['cost_rp']:>9.2f} {avg:>7} {st['forced']:>6} {st['missed']:>6} "
+                  f"{st['max_late_min']:>6}m  {format_hours(st['start_hours'])}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest executor parameters on archived or synthetic prices.")
+    parser.add_argument("--archive", help="Planner SQLite archive (default: synthetic prices)")
+    parser.add_argument("--from", dest="date_from", help="First day YYYY-MM-DD")
+    parser.add_argument("--to", dest="date_to", help="Last day YYYY-MM-DD")
+    parser.add_argument("--synthetic-days", type=int, default=30, help="Days of synthetic prices (no --archive)")
+    parser.add_argument("--jobs", help="JSON file with a SCRIPTS_CONFIG style job list (default: executor config)")
+    parser.add_argument("--grid", action="append", default=[], help="key=v1,v2,... (repeatable)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--numpy", action="store_true", help="NumPy window costs")
+    parser.add_argument("--forecast", action="store_true", help="Planner forecast for unpublished slots, trained on the replayed history")
+    parser.add_argument("--json", dest="json_out", help="Write all results to this file")
+    args = parser.parse_args()
+
+    if args.numpy and np is None:
+        print("[ERROR] --numpy needs NumPy (pip install numpy).")
+        sys.exit(1)
+    try: combos = parse_grid(args.grid)
+    except ValueError as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
+
+    t0 = time.perf_counter()
+    if args.archive:
+        if not os.path.exists(args.archive):
+            print(f"[ERROR] Archive not found: {args.archive}")
+            sys.exit(1)
+        today = datetime.date.today()
+        date_to = datetime.date.fromisoformat(args.date_to) if args.date_to else today
+        date_from = datetime.date.fromisoformat(args.date_from) if args.date_from else date_to - datetime.timedelta(days=29)
+        entries = archive_entries(args.archive, date_from, date_to)
+    else:
+        date_from = datetime.date.fromisoformat(args.date_from) if args.date_from else datetime.date(2025, 1, 1)
+        date_to = date_from + datetime.timedelta(days=args.synthetic_days - 1)
+        entries = synthetic_entries(date_from, args.synthetic_days)
+    if not entries:
+        print("[ERROR] No price data in the selected range.")
+        sys.exit(1)
+    price_index = executor.build_price_index_from_entries(entries)
+    day_types = get_day_types(date_from, date_to)
+    jobs = json.load(open(args.jobs)) if args.jobs else executor.SCRIPTS_CONFIG
+    forecasts = build_forecasts(price_index, date_from, date_to + datetime.timedelta(days=2)) if args.forecast else None
+    start = datetime.datetime.combine(date_from, datetime.time())
+    end = datetime.datetime.combine(date_to + datetime.timedelta(days=1), datetime.time())
+    print(f"[INFO] {len(entries)} slots ({date_from} .. {date_to}) loaded in {time.perf_counter() - t0:.2f} s. "
+          f"{len(combos)} parameter set(s), {len(jobs)} job(s).")
+
+    try:
+        for params in combos: check_params(jobs, params) # fail before forking
+        t0 = time.perf_counter()
+        results = run_grid(price_index, day_types, jobs, start, end, combos, args.workers, args.numpy, forecasts)
+    except ValueError as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
+    print_report(results)
+    print(f"\n[INFO] {len(results)} simulation(s) in {time.perf_counter() - t0:.2f} s.")
+
+    if args.json_out:
+        with open(args.json_out, 'w') as f: json.dump(results, f, indent=2)
+        print(f"[INFO] Results written to {args.json_out}")
+
+if __name__ == "__main__": main()